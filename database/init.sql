@@ -182,6 +182,46 @@ CREATE TABLE invoices (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Claves de idempotencia de la creación de facturas
+CREATE TABLE invoice_idempotency_keys (
+    idempotency_key VARCHAR(255) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    invoice_id UUID NOT NULL,
+    response JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Rollups de facturación (estadísticas precalculadas, se actualizan al crear cada factura)
+CREATE TABLE billing_daily_rollups (
+    day DATE PRIMARY KEY,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    subtotal DECIMAL(14,2) NOT NULL DEFAULT 0,
+    tax DECIMAL(14,2) NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE billing_monthly_rollups (
+    month DATE PRIMARY KEY,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    subtotal DECIMAL(14,2) NOT NULL DEFAULT 0,
+    tax DECIMAL(14,2) NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE billing_medication_rollups (
+    month DATE NOT NULL,
+    medication_key VARCHAR(300) NOT NULL,
+    medication_id UUID,
+    item_name VARCHAR(255) NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, medication_key)
+);
+
 -- Tabla de notificaciones (actualizada)
 CREATE TABLE notifications (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -219,6 +259,7 @@ CREATE INDEX idx_stock_movements_medication ON stock_movements(medication_id);
 CREATE INDEX idx_stock_movements_date ON stock_movements(created_at);
 CREATE INDEX idx_prescriptions_record ON prescriptions(medical_record_id);
 CREATE INDEX idx_exam_results_record ON exam_results(medical_record_id);
+CREATE INDEX idx_invoices_client ON invoices(client_id);
 
 -- Triggers para updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
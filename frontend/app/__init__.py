@@ -1,6 +1,5 @@
 # frontend/app/__init__.py - VERSIÓN CORREGIDA
 from flask import Flask
-from flask_session import Session
 import sys
 import os
 
@@ -15,7 +14,15 @@ sys.path.insert(0, project_dir)
 
 # Importaciones locales
 from .routes import frontend_bp
-from .services import APIClient
+from .services import APIClient, AsyncAPIClient
+from .services.auth_claims import AuthClaims
+from .services.db_pool import ConnectionPool
+from .services.event_stream import EventBroker
+from .services.invoice_export import ExportJobs
+from .services.invoice_pdf import InvoicePdfCache
+from .services.photo_replication import PhotoReplication
+from .services.static_assets import StaticAssets
+from .services.session_store import init_session
 
 
 def create_app():
@@ -67,12 +74,18 @@ def create_app():
     # =============== CONFIGURAR UPLOADS (UNA SOLA VEZ) ===============
     setup_upload_config(app)
 
-    # Inicializar Flask-Session
+    # Inicializar almacén de sesiones (redis / memory / filesystem)
     try:
-        Session(app)
-        print("✅ Flask-Session inicializado correctamente")
+        backend = init_session(app)
+        print(f"✅ Sesiones inicializadas correctamente ({backend})")
     except Exception as e:
-        print(f"⚠️ Error inicializando Flask-Session: {e}")
+        print(f"⚠️ Error inicializando sesiones: {e}")
+
+    # Claims de autenticación en cookie cifrada (SESSION_MODE = 'claims')
+    try:
+        AuthClaims(app)
+    except Exception as e:
+        print(f"⚠️ Error inicializando claims de autenticación: {e}")
 
     # Inicializar el cliente API
     api_client = APIClient()
@@ -80,10 +93,45 @@ def create_app():
 
     # Hacer el cliente API disponible globalmente
     app.api_client = api_client
+    app.async_api_client = AsyncAPIClient(api_client)
+
+    # Réplica en segundo plano de las fotos subidas hacia el Medical Service
+    try:
+        PhotoReplication(app)
+    except Exception as e:
+        print(f"⚠️ Error inicializando la réplica de fotos: {e}")
+
+    # Assets estáticos con hash, minificados y precomprimidos (url_for('static', ...) los usa solo)
+    try:
+        StaticAssets(app)
+    except Exception as e:
+        print(f"⚠️ Error inicializando assets estáticos: {e}")
+
+    # Eventos en tiempo real (SSE) para los dashboards, alimentados por Redis pub/sub
+    EventBroker(app)
+
+    # Pool de conexiones PostgreSQL de la facturación (una conexión por petición como mucho)
+    ConnectionPool(app)
+
+    # PDFs de facturas generados con reportlab y cacheados en disco
+    try:
+        InvoicePdfCache(app)
+    except Exception as e:
+        print(f"⚠️ Error inicializando la caché de PDFs de facturas: {e}")
+
+    # Exportaciones XLSX grandes en segundo plano
+    try:
+        ExportJobs(app)
+    except Exception as e:
+        print(f"⚠️ Error inicializando las exportaciones en segundo plano: {e}")
 
     # Registrar blueprints
     app.register_blueprint(frontend_bp)
 
+    # Compresión gzip/brotli de las respuestas según Accept-Encoding (utils compartido)
+    from utils.compression import init_compression
+    init_compression(app)
+
     print(f"✅ Frontend configurado - Entorno: {env}")
     try:
         from .routes.frontend_routes import initialize_app_resources
@@ -108,19 +156,24 @@ def setup_upload_config(app):
         # Actualizar configuración con ruta absoluta
         app.config['UPLOAD_FOLDER'] = upload_folder
 
-        # Crear directorios necesarios
+        # Crear directorios necesarios (las rutas /uploads sirven desde static/uploads
+        # y no vuelven a comprobarlos en cada petición)
+        static_uploads = os.path.join(app.static_folder, 'uploads')
         directories_to_create = [
             upload_folder,
             os.path.join(upload_folder, 'pets'),
             os.path.join(upload_folder, 'exams'),
-            os.path.join(upload_folder, 'flask_session')
+            os.path.join(upload_folder, 'flask_session'),
+            os.path.join(static_uploads, 'pets'),
+            os.path.join(static_uploads, 'exams'),
+            os.path.join(static_uploads, 'photos')
         ]
 
         for directory in directories_to_create:
             os.makedirs(directory, exist_ok=True)
 
         print(f"✅ Upload folder configurado: {upload_folder}")
-        print(f"✅ Subdirectorios creados: pets, exams, flask_session")
+        print(f"✅ Subdirectorios creados: pets, exams, flask_session, static/uploads/photos")
 
     except Exception as e:
         print(f"❌ Error configurando uploads: {e}")
@@ -1,13 +1,17 @@
 # frontend/app/routes/frontend_routes.py - VERSIÓN CORREGIDA
+import base64
+import hashlib
 import io
-from datetime import datetime, time
+import json
+from datetime import datetime, time, timedelta
 
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from functools import wraps
 import requests
-from flask import send_from_directory
+from flask import send_file, send_from_directory
 import os
+import tempfile
 import psycopg2
 import psycopg2.extras
 import uuid
@@ -16,62 +20,95 @@ from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
-from frontend.config import role_required
-from flask import Response
+from frontend.config import role_required, current_auth_token, current_auth_user
+from flask import Response, stream_with_context
+from werkzeug.local import LocalProxy
+from ..services.db_pool import PoolTimeout
+from ..services.invoice_export import EXPORT_CHUNK_SIZE, INVOICE_SORT_KEY, XLSX_MIMETYPE, write_invoices_xlsx
+from ..services.fan_out import fan_out
+from ..services.user_directory import get_user_directory
+from ..services.response_cache import UpstreamUnavailable, get_response_cache, last_known_good
+from ..services.photo_index import ABSENT, LOCAL, REMOTE, get_photo_index
+from utils.photo_pipeline import (
+    is_content_addressed, photo_not_modified, schedule_derivatives, select_variant, send_stored_photo, store_photo
+)
+from werkzeug.exceptions import NotFound
 
 frontend_bp = Blueprint('frontend', __name__)
 
+# Cliente HTTP compartido (pool keep-alive por microservicio); toda llamada saliente pasa por aquí
+upstream = LocalProxy(lambda: current_app.api_client)
+
+
+@frontend_bp.after_request
+def expire_response_cache(response):
+    """Tras una escritura del usuario, sus lecturas cacheadas (last_known_good) se revalidan"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        user = current_auth_user()
+        if user:
+            get_response_cache().expire(user.get('id'))
+    return response
+
 
 @frontend_bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """Servir archivos subidos (fotos de mascotas, documentos, etc.)"""
     try:
-        # CORRECCIÓN 1: Usar directorio estático del frontend
+        # Los directorios de uploads se crean una sola vez al arrancar (setup_upload_config)
         uploads_dir = os.path.join(current_app.static_folder, 'uploads')
 
-        # Si el directorio no existe, crearlo
-        if not os.path.exists(uploads_dir):
-            os.makedirs(uploads_dir, exist_ok=True)
-            os.makedirs(os.path.join(uploads_dir, 'pets'), exist_ok=True)
-            os.makedirs(os.path.join(uploads_dir, 'exams'), exist_ok=True)
+        # Fotos por contenido (/uploads/photos/ab/<sha256>.jpg): el nombre es el ETag
+        name = os.path.basename(filename)
+        if is_content_addressed(name):
+            not_modified = photo_not_modified(name)
+            if not_modified:
+                return not_modified
 
-        # CORRECCIÓN 2: Verificar si el archivo existe localmente primero
-        local_file_path = os.path.join(uploads_dir, filename)
-        if os.path.exists(local_file_path):
+        # Servir el archivo local si existe (sin comprobarlo antes en disco)
+        try:
+            if is_content_addressed(name):
+                return send_stored_photo(uploads_dir, name)
             return send_from_directory(uploads_dir, filename)
+        except NotFound:
+            pass
 
-        # CORRECCIÓN 3: Si no existe localmente, hacer proxy desde Medical Service
+        # Si no existe localmente, hacer proxy desde Medical Service
         return proxy_file_from_medical_service(filename)
 
     except Exception as e:
         print(f"❌ Error sirviendo archivo {filename}: {e}")
-        # CORRECCIÓN 4: Retornar imagen placeholder en lugar de 404
+        # Retornar imagen placeholder en lugar de 404
         return redirect(url_for('static', filename='images/placeholder-pet.png'))
 
 
 @frontend_bp.route('/uploads/pets/<pet_id>/<filename>')
 def pet_photo(pet_id, filename):
-    """Servir fotos específicas de mascotas"""
+    """Servir fotos específicas de mascotas (original o miniatura con ?size=thumb|medium)"""
     try:
-        # CORRECCIÓN 5: Verificar múltiples ubicaciones
-        uploads_dir = os.path.join(current_app.static_folder, 'uploads')
-        pets_dir = os.path.join(uploads_dir, 'pets', pet_id)
+        # Miniatura pedida con ?size=thumb|medium (&format=webp|jpeg)
+        variant = select_variant(filename, request.args.get('size'), request.args.get('format'),
+                                 request.headers.get('Accept', ''))
 
-        # Crear directorio si no existe
-        os.makedirs(pets_dir, exist_ok=True)
+        if is_content_addressed(filename):
+            # Visitas repetidas: 304 sin tocar el disco ni el Medical Service
+            not_modified = photo_not_modified(variant[0] if variant else filename)
+            if not_modified:
+                return not_modified
 
-        local_file_path = os.path.join(pets_dir, filename)
+        # El índice dice dónde está la foto: local, en el Medical Service o en ningún sitio
+        photo_index = get_photo_index()
+        location = photo_index.get(pet_id, filename)
 
-        # Si existe localmente, servirlo
-        if os.path.exists(local_file_path):
-            return send_from_directory(pets_dir, filename)
+        if location == ABSENT:
+            return redirect(url_for('static', filename='images/placeholder-pet.png'))
 
-        # CORRECCIÓN 6: Intentar desde el directorio raíz de uploads
-        root_file_path = os.path.join(uploads_dir, filename)
-        if os.path.exists(root_file_path):
-            return send_from_directory(uploads_dir, filename)
+        if location != REMOTE:
+            response = send_local_pet_photo(pet_id, filename, variant)
+            if response is not None:
+                photo_index.mark(pet_id, filename, LOCAL)
+                return response
 
-        # CORRECCIÓN 7: Hacer proxy desde Medical Service con mejor manejo de errores
+        # Hacer proxy desde Medical Service
         try:
             return proxy_pet_photo_from_medical_service(pet_id, filename)
         except:
@@ -83,6 +120,53 @@ def pet_photo(pet_id, filename):
         return redirect(url_for('static', filename='images/placeholder-pet.png'))
 
 
+def send_local_pet_photo(pet_id, filename, variant):
+    """Servir la foto desde static/uploads del frontend, o None si no está aquí"""
+    uploads_dir = os.path.join(current_app.static_folder, 'uploads')
+
+    if is_content_addressed(filename):
+        try:
+            return send_stored_photo(uploads_dir, filename, variant)
+        except NotFound:
+            return None
+
+    # Fotos anteriores al almacén por contenido: pets/<pet_id>/<nombre>
+    pets_dir = os.path.join(uploads_dir, 'pets', pet_id)
+    local_file_path = os.path.join(pets_dir, filename)
+
+    if variant:
+        variant_name, mimetype = variant
+        try:
+            response = send_from_directory(pets_dir, variant_name, mimetype=mimetype)
+            response.vary.add('Accept')
+            return response
+        except NotFound:
+            if os.path.exists(local_file_path):
+                # Derivados aún no generados: servir el original
+                schedule_derivatives(local_file_path)
+
+    for directory in (pets_dir, uploads_dir):
+        try:
+            return send_from_directory(directory, filename)
+        except NotFound:
+            continue
+
+    return None
+
+
+def proxied_cache_headers(response):
+    """Cabeceras de caché de un archivo del Medical Service (inmutable si la foto va por contenido)"""
+    headers = {'Cache-Control': response.headers.get('cache-control', 'public, max-age=3600')}
+    # iter_content entrega el cuerpo descomprimido: la longitud de origen solo vale sin Content-Encoding
+    # (y no existe si el origen respondió con Transfer-Encoding: chunked)
+    if not response.headers.get('content-encoding') and response.headers.get('content-length'):
+        headers['Content-Length'] = response.headers['content-length']
+    for name in ('ETag', 'Vary'):
+        if response.headers.get(name):
+            headers[name] = response.headers[name]
+    return headers
+
+
 def proxy_file_from_medical_service(filename):
     """Hacer proxy de archivo genérico desde Medical Service"""
     try:
@@ -91,19 +175,20 @@ def proxy_file_from_medical_service(filename):
         # CORRECCIÓN 8: URL más específica para archivos
         medical_url = f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/uploads/{filename}"
 
-        response = requests.get(medical_url, timeout=10, stream=True)
+        response = upstream.get(medical_url, timeout=10, stream=True)
 
         if response.status_code == 200:
             from flask import Response
-            return Response(
+            proxied = Response(
                 response.iter_content(chunk_size=8192),
                 mimetype=response.headers.get('content-type', 'application/octet-stream'),
-                headers={
-                    'Content-Length': response.headers.get('content-length'),
-                    'Cache-Control': 'public, max-age=3600'
-                }
+                headers=proxied_cache_headers(response)
             )
+            # Devolver la conexión al pool aunque el navegador corte la descarga
+            proxied.call_on_close(response.close)
+            return proxied
         else:
+            response.close()
             raise Exception(f"HTTP {response.status_code}")
 
     except Exception as e:
@@ -112,36 +197,32 @@ def proxy_file_from_medical_service(filename):
 
 
 def proxy_pet_photo_from_medical_service(pet_id, filename):
-    """Hacer proxy de la foto desde el Medical Service"""
+    """
+    Hacer proxy de la foto desde el Medical Service (una sola ruta de consulta).
+    Un 404 se recuerda en el índice de fotos como ausente durante PHOTO_INDEX_NEGATIVE_TTL.
+    """
+    photo_index = get_photo_index()
     try:
-        import requests
+        url = f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/medical/pets/{pet_id}/photo/{filename}"
 
-        # CORRECCIÓN 9: Múltiples rutas para intentar
-        possible_urls = [
-            f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/uploads/pets/{pet_id}/{filename}",
-            f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/medical/pets/{pet_id}/photo/{filename}",
-            f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/uploads/{filename}"
-        ]
-
-        for url in possible_urls:
-            try:
-                response = requests.get(url, timeout=5, stream=True)
+        # Reenviar ?size / ?format para que el Medical Service sirva el derivado
+        response = upstream.get(url, params=request.args, timeout=5, stream=True,
+                                headers={'Accept': request.headers.get('Accept', 'image/*')})
 
-                if response.status_code == 200:
-                    from flask import Response
-                    return Response(
-                        response.iter_content(chunk_size=8192),
-                        mimetype=response.headers.get('content-type', 'image/jpeg'),
-                        headers={
-                            'Content-Length': response.headers.get('content-length'),
-                            'Cache-Control': 'public, max-age=3600'
-                        }
-                    )
-            except:
-                continue
+        if response.status_code == 200:
+            photo_index.mark(pet_id, filename, REMOTE)
+            proxied = Response(
+                response.iter_content(chunk_size=8192),
+                mimetype=response.headers.get('content-type', 'image/jpeg'),
+                headers=proxied_cache_headers(response)
+            )
+            proxied.call_on_close(response.close)
+            return proxied
 
-        # Si ninguna URL funciona, lanzar excepción
-        raise Exception("No se pudo obtener la imagen desde ninguna ruta")
+        response.close()
+        if response.status_code == 404:
+            photo_index.mark(pet_id, filename, ABSENT)
+        raise Exception(f"HTTP {response.status_code}")
 
     except Exception as e:
         print(f"❌ Error haciendo proxy de foto {pet_id}/{filename}: {e}")
@@ -165,28 +246,35 @@ def api_check_pet_photo(pet_id):
                     return jsonify({
                         'success': True,
                         'has_photo': True,
-                        'photo_url': url_for('frontend.pet_photo', pet_id=pet_id, filename=file)
+                        'photo_url': url_for('frontend.pet_photo', pet_id=pet_id, filename=file),
+                        'location': LOCAL
                     })
 
         # Si no hay foto local, verificar en Medical Service
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         medical_url = f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/medical/pets/{pet_id}"
 
-        response = requests.get(medical_url, headers=headers, timeout=5)
+        response = upstream.get(medical_url, headers=headers, timeout=5)
 
         if response.status_code == 200:
             data = response.json()
-            if data.get('success') and data.get('pet', {}).get('photo_url'):
-                return jsonify({
-                    'success': True,
-                    'has_photo': True,
-                    'photo_url': data['pet']['photo_url']
-                })
+            photo_url = data.get('pet', {}).get('photo_url') if data.get('success') else None
+            if photo_url:
+                # Si ya se sabe que el archivo no existe, no mandar al navegador a buscarlo
+                location = get_photo_index().get(pet_id, photo_url.split('?')[0].rsplit('/', 1)[-1])
+                if location != ABSENT:
+                    return jsonify({
+                        'success': True,
+                        'has_photo': True,
+                        'photo_url': photo_url,
+                        'location': location
+                    })
 
         return jsonify({
             'success': True,
             'has_photo': False,
-            'photo_url': None
+            'photo_url': None,
+            'location': ABSENT
         })
 
     except Exception as e:
@@ -305,7 +393,7 @@ def login_required(f):
     """Decorador para rutas que requieren autenticación"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user' not in session:
+        if not current_auth_user():
             flash('Debes iniciar sesión para acceder a esta página.', 'warning')
             return redirect(url_for('frontend.login'))
         return f(*args, **kwargs)
@@ -317,11 +405,12 @@ def role_required(required_roles):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user' not in session:
+            user = current_auth_user()
+            if not user:
                 flash('Debes iniciar sesión para acceder a esta página.', 'warning')
                 return redirect(url_for('frontend.login'))
 
-            user_role = session['user'].get('role')
+            user_role = user.get('role')
             if user_role not in required_roles:
                 flash('No tienes permisos para acceder a esta página.', 'error')
                 return redirect(url_for('frontend.dashboard'))
@@ -349,7 +438,7 @@ def login():
         try:
             # Llamar al auth service
             auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/login"
-            response = requests.post(auth_url, json={
+            response = upstream.post(auth_url, json={
                 'email': email,
                 'password': password
             }, timeout=10)
@@ -394,7 +483,7 @@ def register():
 
         try:
             auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/register"
-            response = requests.post(auth_url, json=user_data, timeout=10)
+            response = upstream.post(auth_url, json=user_data, timeout=10)
 
             if response.status_code == 201:
                 flash('¡Registro exitoso! Ahora puedes iniciar sesión.', 'success')
@@ -423,7 +512,7 @@ def logout():
 @login_required
 def dashboard():
     """Dashboard principal - redirige según el rol"""
-    user_role = session['user'].get('role')
+    user_role = current_auth_user().get('role')
     print(f"🔄 Dashboard redirect para rol: {user_role}")
 
     if user_role == 'admin':
@@ -453,31 +542,34 @@ def admin_dashboard():
     setup_upload_directories()
 
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
-        # Obtener resumen del inventario
-        inventory_summary = {}
-        try:
+        def fetch_inventory_summary():
             inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/summary"
-            inventory_response = requests.get(inventory_url, headers=headers, timeout=10)
+            inventory_response = upstream.get(inventory_url, headers=headers, timeout=10)
             if inventory_response.status_code == 200:
                 inventory_data = inventory_response.json()
                 if inventory_data.get('success'):
-                    inventory_summary = inventory_data.get('summary', {})
-        except Exception as e:
-            print(f"⚠️ Error obteniendo inventario: {e}")
+                    return inventory_data.get('summary', {})
+            return {}
 
-        # Obtener estadísticas de citas
-        appointments_today = []
-        try:
+        def fetch_appointments_today():
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/today"
-            appointments_response = requests.get(appointments_url, headers=headers, timeout=10)
+            appointments_response = upstream.get(appointments_url, headers=headers, timeout=10)
             if appointments_response.status_code == 200:
                 appointments_data = appointments_response.json()
                 if appointments_data.get('success'):
-                    appointments_today = appointments_data.get('appointments', [])
-        except Exception as e:
-            print(f"⚠️ Error obteniendo citas: {e}")
+                    return appointments_data.get('appointments', [])
+            return []
+
+        # Obtener resumen del inventario y citas de hoy en paralelo
+        results = fan_out({
+            'inventory_summary': fetch_inventory_summary,
+            'appointments_today': fetch_appointments_today
+        }, defaults={'inventory_summary': {}, 'appointments_today': []})
+
+        inventory_summary = results['inventory_summary']
+        appointments_today = results['appointments_today']
 
         # Preparar datos para el template
         user = session.get('user', {})
@@ -574,36 +666,55 @@ def user_info():
     })
 
 
+@frontend_bp.route('/api/events/stream')
+@role_required(['client', 'veterinarian', 'admin'])
+def events_stream():
+    """Canal Server-Sent Events con los cambios de citas y notificaciones del usuario"""
+    broker = current_app.extensions.get('event_broker')
+    if broker is None or not broker.enabled:
+        # 204 hace que EventSource no reconecte: el navegador sigue consultando periódicamente
+        return '', 204
+
+    user = current_auth_user()
+    response = Response(broker.stream(user.get('id'), user.get('role')), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache, no-transform'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @frontend_bp.route('/api/dashboard-data')
 @login_required
 def dashboard_data():
     """Datos para el dashboard (AJAX)"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
-        # Datos del inventario
-        inventory_data = {}
-        try:
+        def fetch_inventory_summary():
             inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/summary"
-            inventory_response = requests.get(inventory_url, headers=headers, timeout=5)
+            inventory_response = upstream.get(inventory_url, headers=headers, timeout=5)
             if inventory_response.status_code == 200:
                 inv_json = inventory_response.json()
                 if inv_json.get('success'):
-                    inventory_data = inv_json.get('summary', {})
-        except:
-            pass
+                    return inv_json.get('summary', {})
+            return {}
 
-        # Citas de hoy
-        appointments_count = 0
-        try:
+        def fetch_appointments_count():
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/today"
-            appointments_response = requests.get(appointments_url, headers=headers, timeout=5)
+            appointments_response = upstream.get(appointments_url, headers=headers, timeout=5)
             if appointments_response.status_code == 200:
                 app_json = appointments_response.json()
                 if app_json.get('success'):
-                    appointments_count = len(app_json.get('appointments', []))
-        except:
-            pass
+                    return len(app_json.get('appointments', []))
+            return 0
+
+        # Datos del inventario y citas de hoy en paralelo
+        results = fan_out({
+            'inventory': fetch_inventory_summary,
+            'appointments_count': fetch_appointments_count
+        }, deadline=5, defaults={'inventory': {}, 'appointments_count': 0})
+
+        inventory_data = results['inventory']
+        appointments_count = results['appointments_count']
 
         return jsonify({
             'success': True,
@@ -629,11 +740,11 @@ def dashboard_data():
 def api_get_users():
     """API endpoint para obtener usuarios (para AJAX del frontend)"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener usuarios desde Auth Service
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users"
-        response = requests.get(auth_url, headers=headers, timeout=10)
+        response = upstream.get(auth_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -668,14 +779,15 @@ def api_get_users():
 def api_create_user():
     """Crear nuevo usuario"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Crear usuario en Auth Service
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/register"
-        response = requests.post(auth_url, json=data, headers=headers, timeout=10)
+        response = upstream.post(auth_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 201:
+            get_user_directory().invalidate()
             return jsonify(response.json())
         else:
             error_data = response.json() if response.headers.get('content-type', '').startswith(
@@ -704,14 +816,15 @@ def api_create_user():
 def api_update_user(user_id):
     """Actualizar usuario específico"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Actualizar usuario en Auth Service
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{user_id}"
-        response = requests.put(auth_url, json=data, headers=headers, timeout=10)
+        response = upstream.put(auth_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
+            get_user_directory().invalidate()
             return jsonify(response.json())
         else:
             error_data = response.json() if response.headers.get('content-type', '').startswith(
@@ -740,13 +853,14 @@ def api_update_user(user_id):
 def api_toggle_user_status(user_id):
     """Activar/Desactivar usuario"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Cambiar estado en Auth Service
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{user_id}/toggle-status"
-        response = requests.put(auth_url, headers=headers, timeout=10)
+        response = upstream.put(auth_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
+            get_user_directory().invalidate()
             return jsonify(response.json())
         else:
             error_data = response.json() if response.headers.get('content-type', '').startswith(
@@ -775,10 +889,10 @@ def api_toggle_user_status(user_id):
 def api_delete_user(user_id):
     """Eliminar usuario definitivamente"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Verificar que no sea el usuario actual
-        current_user = session.get('user', {})
+        current_user = current_auth_user() or {}
         if current_user.get('id') == user_id:
             return jsonify({
                 'success': False,
@@ -787,9 +901,10 @@ def api_delete_user(user_id):
 
         # Eliminar usuario en Auth Service
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{user_id}"
-        response = requests.delete(auth_url, headers=headers, timeout=10)
+        response = upstream.delete(auth_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
+            get_user_directory().invalidate()
             return jsonify(response.json())
         elif response.status_code == 400:
             # Error de validación (como intentar eliminar propia cuenta)
@@ -846,11 +961,11 @@ def admin_schedules():
 def api_get_schedules():
     """API endpoint para obtener horarios (para AJAX del frontend)"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener horarios desde Auth Service
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/schedules"
-        response = requests.get(auth_url, headers=headers, timeout=10)
+        response = upstream.get(auth_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -885,7 +1000,7 @@ def api_get_schedules():
 def api_update_user_schedule(user_id):
     """Actualizar horario de un usuario específico - VERSIÓN CORREGIDA FINAL"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         print(f"📝 Frontend: Actualizando horario para usuario: {user_id}")
@@ -899,7 +1014,7 @@ def api_update_user_schedule(user_id):
 
         try:
             print(f"📡 Enviando a Auth Service: {auth_url}")
-            response = requests.put(auth_url, json=data, headers=headers, timeout=10)
+            response = upstream.put(auth_url, json=data, headers=headers, timeout=10)
             print(f"📡 Respuesta Auth Service: {response.status_code}")
 
             if response.status_code == 200:
@@ -929,7 +1044,7 @@ def api_update_user_schedule(user_id):
         # Intentar obtener rol del usuario
         try:
             user_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{user_id}"
-            user_response = requests.get(user_url, headers=headers, timeout=5)
+            user_response = upstream.get(user_url, headers=headers, timeout=5)
 
             if user_response.status_code == 200:
                 user_info = user_response.json()
@@ -948,7 +1063,7 @@ def api_update_user_schedule(user_id):
 
             try:
                 sync_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/schedules/staff/{user_id}"
-                sync_response = requests.put(sync_url, json=data, headers=headers, timeout=10)
+                sync_response = upstream.put(sync_url, json=data, headers=headers, timeout=10)
 
                 if sync_response.status_code == 200:
                     sync_data = sync_response.json()
@@ -972,7 +1087,7 @@ def api_update_user_schedule(user_id):
         print("🔍 Verificando sincronización...")
         try:
             verify_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/schedules/veterinarians-v2"
-            verify_response = requests.get(verify_url, headers=headers, timeout=5)
+            verify_response = upstream.get(verify_url, headers=headers, timeout=5)
 
             if verify_response.status_code == 200:
                 verify_data = verify_response.json()
@@ -1006,7 +1121,7 @@ def api_update_user_schedule(user_id):
 def api_verify_user_schedule(user_id):
     """Verificar horarios de un usuario en ambos servicios"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         result = {
             'user_id': user_id,
@@ -1017,7 +1132,7 @@ def api_verify_user_schedule(user_id):
         # Verificar en Auth Service
         try:
             auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/schedules"
-            auth_response = requests.get(auth_url, headers=headers, timeout=5)
+            auth_response = upstream.get(auth_url, headers=headers, timeout=5)
 
             if auth_response.status_code == 200:
                 auth_data = auth_response.json()
@@ -1036,7 +1151,7 @@ def api_verify_user_schedule(user_id):
         # Verificar en Appointment Service
         try:
             appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/schedules/{user_id}"
-            appointment_response = requests.get(appointment_url, headers=headers, timeout=5)
+            appointment_response = upstream.get(appointment_url, headers=headers, timeout=5)
 
             if appointment_response.status_code == 200:
                 appointment_data = appointment_response.json()
@@ -1117,11 +1232,11 @@ def initialize_app_resources(app):
 def api_get_pets():
     """API endpoint para obtener mascotas (para AJAX del frontend)"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener todas las mascotas desde Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -1132,17 +1247,7 @@ def api_get_pets():
 
                 # Obtener usuarios para mapear propietarios
                 try:
-                    auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users"
-                    users_response = requests.get(auth_url, headers=headers, timeout=5)
-                    users_data = []
-
-                    if users_response.status_code == 200:
-                        users_json = users_response.json()
-                        if users_json.get('success'):
-                            users_data = users_json.get('users', [])
-
-                    # Crear mapa de usuarios
-                    users_map = {user['id']: user for user in users_data}
+                    users_map = get_user_directory().get_users_map(headers)
 
                     # Enriquecer datos de mascotas
                     for pet in pets:
@@ -1198,7 +1303,7 @@ def api_get_pets():
 def api_create_pet():
     """Crear nueva mascota"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Validar datos básicos
@@ -1210,7 +1315,7 @@ def api_create_pet():
 
         # Crear mascota en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets"
-        response = requests.post(medical_url, json=data, headers=headers, timeout=10)
+        response = upstream.post(medical_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 201:
             return jsonify(response.json())
@@ -1241,12 +1346,12 @@ def api_create_pet():
 def api_update_pet(pet_id):
     """Actualizar mascota específica"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Actualizar mascota en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        response = requests.put(medical_url, json=data, headers=headers, timeout=10)
+        response = upstream.put(medical_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
             return jsonify(response.json())
@@ -1277,11 +1382,11 @@ def api_update_pet(pet_id):
 def api_delete_pet(pet_id):
     """Eliminar mascota definitivamente"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Eliminar mascota en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        response = requests.delete(medical_url, headers=headers, timeout=10)
+        response = upstream.delete(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             return jsonify(response.json())
@@ -1317,8 +1422,6 @@ def api_delete_pet(pet_id):
 def api_upload_pet_photo(pet_id):
     """Subir foto de mascota - VERSIÓN CORREGIDA"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-
         # Verificar que hay un archivo
         if 'photo' not in request.files:
             return jsonify({
@@ -1355,41 +1458,23 @@ def api_upload_pet_photo(pet_id):
             }), 400
 
         # CORRECCIÓN 14: Guardar localmente primero, luego enviar al Medical Service
+        # Nombre = hash del contenido (deduplicado); las miniaturas se generan en segundo plano
         uploads_dir = os.path.join(current_app.static_folder, 'uploads')
-        pets_dir = os.path.join(uploads_dir, 'pets', pet_id)
-        os.makedirs(pets_dir, exist_ok=True)
+        unique_filename, local_file_path = store_photo(file, uploads_dir)
+        photo_index = get_photo_index()
+        photo_index.forget(pet_id)
+        photo_index.mark(pet_id, unique_filename, LOCAL)
 
-        # Generar nombre único
-        import uuid
-        from werkzeug.utils import secure_filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        secure_name = secure_filename(file.filename)
-        unique_filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{secure_name}"
-
-        local_file_path = os.path.join(pets_dir, unique_filename)
-
-        # Guardar archivo localmente
-        file.save(local_file_path)
-
-        # CORRECCIÓN 15: También enviar al Medical Service para consistencia
+        # CORRECCIÓN 15: Replicar en el Medical Service en segundo plano (cola en disco con
+        # reintentos); la respuesta no espera a la segunda subida
         try:
-            file.seek(0)  # Reset file pointer
-            files = {'file': (unique_filename, file.stream, file.content_type)}
-            medical_url = f"{current_app.config.get('MEDICAL_SERVICE_URL', 'http://localhost:5004')}/medical/pets/{pet_id}/photo"
-
-            medical_response = requests.post(
-                medical_url,
-                files=files,
-                headers={'Authorization': headers['Authorization']},
-                timeout=10
+            current_app.extensions['photo_replication'].enqueue(
+                pet_id, local_file_path, unique_filename, file.content_type
             )
-
-            if medical_response.status_code == 200:
-                medical_data = medical_response.json()
-                print(f"✅ Foto también guardada en Medical Service: {medical_data}")
-
-        except Exception as medical_error:
-            print(f"⚠️ Error enviando a Medical Service (pero archivo guardado localmente): {medical_error}")
+            replication = 'queued'
+        except Exception as replication_error:
+            print(f"⚠️ Error encolando réplica al Medical Service (pero archivo guardado localmente): {replication_error}")
+            replication = 'failed'
 
         # Retornar URL local
         photo_url = url_for('frontend.pet_photo', pet_id=pet_id, filename=unique_filename)
@@ -1398,7 +1483,8 @@ def api_upload_pet_photo(pet_id):
             'success': True,
             'message': 'Foto subida exitosamente',
             'photo_url': photo_url,
-            'filename': unique_filename
+            'filename': unique_filename,
+            'replication': replication
         })
 
     except Exception as e:
@@ -1414,11 +1500,11 @@ def api_upload_pet_photo(pet_id):
 def api_get_pet_medical_records(pet_id):
     """Obtener historia clínica de una mascota"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener registros médicos desde Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -1456,7 +1542,7 @@ def api_get_pet_medical_records(pet_id):
 def api_search_pets():
     """Buscar mascotas"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         search_term = request.args.get('q', '')
 
         if not search_term:
@@ -1467,7 +1553,7 @@ def api_search_pets():
 
         # Buscar mascotas en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/search?q={search_term}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             return jsonify(response.json())
@@ -1500,11 +1586,11 @@ def api_search_pets():
 def api_get_pets_stats():
     """Obtener estadísticas de mascotas"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener todas las mascotas para calcular estadísticas
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -1608,11 +1694,11 @@ def api_get_pets_stats():
 def api_get_pets_by_owner(owner_id):
     """Obtener mascotas de un propietario específico"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener mascotas del propietario desde Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{owner_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             return jsonify(response.json())
@@ -1645,11 +1731,11 @@ def api_get_pets_by_owner(owner_id):
 def api_get_pet_report(pet_id):
     """Generar reporte individual de mascota"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener datos completos de la mascota
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/summary/pet/{pet_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -1715,90 +1801,82 @@ def admin_medical_records():
 def api_get_medical_records():
     """API endpoint para obtener todas las historias clínicas"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-
-        # PASO 1: Obtener todas las mascotas
-        print("📡 Obteniendo mascotas...")
-        pets_data = []
-
-        try:
-            pets_response = requests.get(
-                f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets",
-                headers=headers,
-                timeout=10
-            )
-
-            if pets_response.status_code == 200:
-                pets_json = pets_response.json()
-                if pets_json.get('success'):
-                    pets_data = pets_json.get('pets', [])
-                    print(f"✅ {len(pets_data)} mascotas obtenidas")
-        except Exception as e:
-            print(f"⚠️ Error obteniendo mascotas: {e}")
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
-        # PASO 2: Obtener historias clínicas para cada mascota
+        # PASO 1: Obtener las historias clínicas de todas las mascotas en una sola llamada
+        print("📡 Obteniendo historias clínicas...")
         all_records = []
+        pagination = None
 
-        for pet in pets_data:
-            try:
-                records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet['id']}"
-                records_response = requests.get(records_url, headers=headers, timeout=10)
+        # Con ?page= se devuelve solo esa página; sin él (la vista de admin, que no pagina)
+        # se recorren todas las páginas de /records/by-pets
+        single_page = 'page' in request.args
+        params = {
+            'page': request.args.get('page', 1, type=int),
+            'per_page': request.args.get('per_page', 1000, type=int)
+        }
+        if request.args.get('pet_ids'):
+            params['pet_ids'] = request.args.get('pet_ids')
 
-                if records_response.status_code == 200:
-                    records_data = records_response.json()
-                    if records_data.get('success') and records_data.get('medical_records'):
-                        # Enriquecer cada registro con datos de la mascota
-                        for record in records_data['medical_records']:
-                            record.update({
-                                'pet_name': pet['name'],
-                                'pet_species': pet['species'],
-                                'pet_breed': pet.get('breed', ''),
-                                'owner_name': pet.get('owner_name', 'Propietario desconocido'),
-                                'owner_id': pet['owner_id']
-                            })
-                        all_records.extend(records_data['medical_records'])
+        try:
+            while True:
+                records_response = upstream.get(
+                    f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/by-pets",
+                    params=params,
+                    headers=headers,
+                    timeout=10
+                )
+                if records_response.status_code != 200:
+                    break
+                records_data = records_response.json()
+                if not records_data.get('success'):
+                    break
 
-            except Exception as e:
-                print(f"⚠️ Error obteniendo historias de mascota {pet['id']}: {e}")
-                continue
+                all_records.extend(records_data.get('medical_records', []))
+                pagination = records_data.get('pagination')
+                if single_page or not pagination or params['page'] >= pagination.get('pages', 0):
+                    break
+                params['page'] += 1
 
-        # PASO 3: Enriquecer con datos de veterinarios
-        try:
-            print("📡 Obteniendo veterinarios...")
-            users_response = requests.get(
-                f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                headers=headers,
-                timeout=10
-            )
+            print(f"✅ {len(all_records)} historias clínicas obtenidas")
+        except Exception as e:
+            print(f"⚠️ Error obteniendo historias clínicas: {e}")
 
-            if users_response.status_code == 200:
-                users_data = users_response.json()
-                if users_data.get('success'):
-                    veterinarians = {
-                        user['id']: f"{user['first_name']} {user['last_name']}"
-                        for user in users_data['users']
-                        if user['role'] == 'veterinarian'
-                    }
+        # PASO 2: Enriquecer con datos de veterinarios y propietarios
+        users_map = {}
+        try:
+            users_map = get_user_directory().get_users_map(headers)
+            if users_map:
+                veterinarians = {
+                    user['id']: f"{user['first_name']} {user['last_name']}"
+                    for user in users_map.values()
+                    if user['role'] == 'veterinarian'
+                }
 
-                    # Agregar nombres de veterinarios a los registros
-                    for record in all_records:
-                        vet_id = record.get('veterinarian_id')
-                        record['veterinarian_name'] = veterinarians.get(vet_id, 'Veterinario desconocido')
+                # Agregar nombres de veterinarios a los registros
+                for record in all_records:
+                    vet_id = record.get('veterinarian_id')
+                    record['veterinarian_name'] = veterinarians.get(vet_id, 'Veterinario desconocido')
 
-                    print(f"✅ {len(veterinarians)} veterinarios procesados")
+                print(f"✅ {len(veterinarians)} veterinarios procesados")
 
         except Exception as e:
             print(f"⚠️ Error obteniendo veterinarios: {e}")
 
-        # PASO 4: Ordenar por fecha más reciente
-        all_records.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        # Nombre del propietario de cada mascota (owner_id viene en el registro)
+        for record in all_records:
+            owner = users_map.get(record.get('owner_id'))
+            owner_name = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip() if owner else ''
+            record['owner_name'] = owner_name or 'Propietario desconocido'
 
+        # Medical Service ya devuelve los registros ordenados por fecha más reciente
         print(f"✅ Total de historias clínicas obtenidas: {len(all_records)}")
 
         return jsonify({
             'success': True,
             'medical_records': all_records,
-            'total': len(all_records)
+            'total': pagination['total'] if pagination else len(all_records),
+            'pagination': pagination if single_page else None
         })
 
     except Exception as e:
@@ -1816,7 +1894,7 @@ def api_get_medical_records():
 def api_create_medical_record():
     """Crear nueva historia clínica"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         print(f"📡 Creando historia clínica con datos: {data}")
@@ -1843,7 +1921,7 @@ def api_create_medical_record():
 
         # Crear historia clínica en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records"
-        response = requests.post(medical_url, json=data, headers=headers, timeout=15)
+        response = upstream.post(medical_url, json=data, headers=headers, timeout=15)
 
         print(f"📡 Respuesta Medical Service: {response.status_code}")
 
@@ -1855,7 +1933,7 @@ def api_create_medical_record():
                 # Enriquecer respuesta con datos adicionales
                 try:
                     # Obtener datos de la mascota
-                    pet_response = requests.get(
+                    pet_response = upstream.get(
                         f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{record.get('pet_id')}",
                         headers=headers,
                         timeout=5
@@ -1872,21 +1950,9 @@ def api_create_medical_record():
                             })
 
                     # Obtener datos del veterinario
-                    users_response = requests.get(
-                        f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                        headers=headers,
-                        timeout=5
-                    )
-
-                    if users_response.status_code == 200:
-                        users_data = users_response.json()
-                        if users_data.get('success'):
-                            vet = next(
-                                (u for u in users_data['users'] if u['id'] == record.get('veterinarian_id')),
-                                None
-                            )
-                            if vet:
-                                record['veterinarian_name'] = f"{vet['first_name']} {vet['last_name']}"
+                    vet = get_user_directory().get_user(record.get('veterinarian_id'), headers)
+                    if vet:
+                        record['veterinarian_name'] = f"{vet['first_name']} {vet['last_name']}"
 
                 except Exception as e:
                     print(f"⚠️ Error enriqueciendo datos: {e}")
@@ -1934,11 +2000,11 @@ def api_create_medical_record():
 def api_get_medical_record(record_id):
     """Obtener historia clínica específica"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener historia clínica del Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/{record_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -1948,7 +2014,7 @@ def api_get_medical_record(record_id):
                 # Enriquecer con datos adicionales
                 try:
                     # Datos de la mascota
-                    pet_response = requests.get(
+                    pet_response = upstream.get(
                         f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{record.get('pet_id')}",
                         headers=headers,
                         timeout=5
@@ -1965,21 +2031,9 @@ def api_get_medical_record(record_id):
                             })
 
                     # Datos del veterinario
-                    users_response = requests.get(
-                        f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                        headers=headers,
-                        timeout=5
-                    )
-
-                    if users_response.status_code == 200:
-                        users_data = users_response.json()
-                        if users_data.get('success'):
-                            vet = next(
-                                (u for u in users_data['users'] if u['id'] == record.get('veterinarian_id')),
-                                None
-                            )
-                            if vet:
-                                record['veterinarian_name'] = f"{vet['first_name']} {vet['last_name']}"
+                    vet = get_user_directory().get_user(record.get('veterinarian_id'), headers)
+                    if vet:
+                        record['veterinarian_name'] = f"{vet['first_name']} {vet['last_name']}"
 
                 except Exception as e:
                     print(f"⚠️ Error enriqueciendo datos: {e}")
@@ -2019,12 +2073,12 @@ def api_get_medical_record(record_id):
 def api_update_medical_record(record_id):
     """Actualizar historia clínica específica"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Actualizar historia clínica en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/{record_id}"
-        response = requests.put(medical_url, json=data, headers=headers, timeout=10)
+        response = upstream.put(medical_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
             response_data = response.json()
@@ -2065,11 +2119,11 @@ def api_update_medical_record(record_id):
 def api_complete_medical_record(record_id):
     """Marcar historia clínica como completada"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Completar historia clínica en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/{record_id}/complete"
-        response = requests.put(medical_url, headers=headers, timeout=10)
+        response = upstream.put(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2110,11 +2164,11 @@ def api_complete_medical_record(record_id):
 def api_delete_medical_record(record_id):
     """Eliminar historia clínica definitivamente"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Eliminar historia clínica en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/{record_id}"
-        response = requests.delete(medical_url, headers=headers, timeout=10)
+        response = upstream.delete(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2156,7 +2210,7 @@ def api_delete_medical_record(record_id):
 def api_create_prescription():
     """Crear nueva prescripción"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Validar datos básicos
@@ -2170,7 +2224,7 @@ def api_create_prescription():
 
         # Crear prescripción en Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/prescriptions"
-        response = requests.post(medical_url, json=data, headers=headers, timeout=10)
+        response = upstream.post(medical_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 201:
             response_data = response.json()
@@ -2216,12 +2270,12 @@ def api_create_prescription():
 def api_get_medical_records_stats():
     """Obtener estadísticas de historias clínicas"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener todas las historias clínicas usando nuestra propia API
-        records_response = requests.get(
+        records_response = upstream.get(
             'http://localhost:3000/api/admin/medical-records',
-            headers={'Authorization': f"Bearer {session.get('token')}"},
+            headers={'Authorization': f"Bearer {current_auth_token()}"},
             timeout=10
         )
 
@@ -2314,7 +2368,7 @@ def api_get_medical_records_stats():
 @role_required(['admin', 'receptionist', 'veterinarian'])  # ← CORREGIDO
 def appointments():
     """Lista de citas - redirige al admin"""
-    user_role = session['user'].get('role')
+    user_role = current_auth_user().get('role')
 
     if user_role == 'admin':
         return redirect(url_for('frontend.admin_appointments'))
@@ -2328,10 +2382,11 @@ def appointments():
 
 @frontend_bp.route('/api/admin/appointments')
 @role_required(['admin'])
+@last_known_good
 def api_get_appointments():
     """API endpoint para obtener todas las citas"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Parámetros de filtro opcionales
         start_date = request.args.get('start_date')
@@ -2356,7 +2411,7 @@ def api_get_appointments():
             params['client_id'] = client_id
 
         print(f"📡 Llamando a: {appointment_url} con parámetros: {params}")
-        response = requests.get(appointment_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, params=params, timeout=10)
         print(f"📡 Respuesta del Appointment Service: {response.status_code}")
 
         if response.status_code == 200:
@@ -2368,21 +2423,10 @@ def api_get_appointments():
 
                 # Obtener usuarios para mapear veterinarios y clientes
                 try:
-                    users_response = requests.get(
-                        f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                        headers=headers,
-                        timeout=5
-                    )
-                    users_data = []
-                    if users_response.status_code == 200:
-                        users_json = users_response.json()
-                        if users_json.get('success'):
-                            users_data = users_json.get('users', [])
-
-                    users_map = {user['id']: user for user in users_data}
+                    users_map = get_user_directory().get_users_map(headers)
 
                     # Obtener mascotas
-                    pets_response = requests.get(
+                    pets_response = upstream.get(
                         f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets",
                         headers=headers,
                         timeout=5
@@ -2432,27 +2476,15 @@ def api_get_appointments():
                     'total': 0
                 })
         else:
-            # Si falla, retornar datos de ejemplo como fallback
-            print(f"⚠️ Error conectando con Appointment Service: {response.status_code}")
+            # Si falla, se sirve la última respuesta buena (last_known_good)
             print(f"⚠️ URL llamada: {appointment_url}")
-            example_appointments = get_example_appointments_data()
-            return jsonify({
-                'success': True,
-                'appointments': example_appointments,
-                'total': len(example_appointments),
-                'message': 'Usando datos de ejemplo - Servicio no disponible'
-            })
+            raise UpstreamUnavailable(f"Appointment Service respondió {response.status_code}")
 
+    except UpstreamUnavailable:
+        raise
     except requests.RequestException as e:
         print(f"❌ Error conectando con Appointment Service: {e}")
-        # Fallback con datos de ejemplo
-        example_appointments = get_example_appointments_data()
-        return jsonify({
-            'success': True,
-            'appointments': example_appointments,
-            'total': len(example_appointments),
-            'message': 'Usando datos de ejemplo (sin conexión)'
-        })
+        raise UpstreamUnavailable(str(e))
     except Exception as e:
         print(f"❌ Error en api_get_appointments: {e}")
         return jsonify({
@@ -2461,84 +2493,13 @@ def api_get_appointments():
         }), 500
 
 
-def get_example_appointments_data():
-    """Datos de ejemplo para citas cuando no hay conexión con el servicio"""
-    from datetime import datetime, timedelta
-
-    today = datetime.now()
-    tomorrow = today + timedelta(days=1)
-    next_week = today + timedelta(days=7)
-
-    return [
-        {
-            'id': 'apt_001',
-            'pet_id': 'pet_001',
-            'pet_name': 'Max',
-            'pet_species': 'perro',
-            'client_id': 'client_001',
-            'client_name': 'Carlos López',
-            'client_phone': '+1234567893',
-            'client_email': 'carlos@example.com',
-            'veterinarian_id': 'vet_001',
-            'veterinarian_name': 'Dr. Juan Pérez',
-            'appointment_date': today.strftime('%Y-%m-%d'),
-            'appointment_time': '10:00',
-            'status': 'confirmed',
-            'priority': 'normal',
-            'reason': 'Consulta de rutina y vacunación anual',
-            'notes': 'Primera visita del año. Revisar historial de vacunas.',
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat()
-        },
-        {
-            'id': 'apt_002',
-            'pet_id': 'pet_002',
-            'pet_name': 'Luna',
-            'pet_species': 'gato',
-            'client_id': 'client_001',
-            'client_name': 'Carlos López',
-            'client_phone': '+1234567893',
-            'client_email': 'carlos@example.com',
-            'veterinarian_id': 'vet_001',
-            'veterinarian_name': 'Dr. Juan Pérez',
-            'appointment_date': tomorrow.strftime('%Y-%m-%d'),
-            'appointment_time': '14:30',
-            'status': 'scheduled',
-            'priority': 'urgent',
-            'reason': 'Control post-operatorio esterilización',
-            'notes': 'Revisar cicatrización y retirar puntos si es necesario.',
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat()
-        },
-        {
-            'id': 'apt_003',
-            'pet_id': 'pet_003',
-            'pet_name': 'Rocky',
-            'pet_species': 'perro',
-            'client_id': 'client_002',
-            'client_name': 'María González',
-            'client_phone': '+1234567894',
-            'client_email': 'maria@example.com',
-            'veterinarian_id': 'vet_002',
-            'veterinarian_name': 'Dra. Laura Rodríguez',
-            'appointment_date': next_week.strftime('%Y-%m-%d'),
-            'appointment_time': '16:00',
-            'status': 'scheduled',
-            'priority': 'emergency',
-            'reason': 'Dificultad respiratoria - Emergencia',
-            'notes': 'Cliente reporta respiración muy dificultosa desde anoche.',
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat()
-        }
-    ]
-
 
 @frontend_bp.route('/api/admin/appointments', methods=['POST'])
 @role_required(['admin'])
 def api_create_appointment():
     """Crear nueva cita"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Validar datos básicos
@@ -2552,7 +2513,7 @@ def api_create_appointment():
 
         # Crear cita en Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/create"
-        response = requests.post(appointment_url, json=data, headers=headers, timeout=10)
+        response = upstream.post(appointment_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 201:
             response_data = response.json()
@@ -2594,11 +2555,11 @@ def api_create_appointment():
 def api_get_appointment(appointment_id):
     """Obtener cita específica"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener cita del Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/appointments/{appointment_id}"
-        response = requests.get(appointment_url, headers=headers, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2608,37 +2569,28 @@ def api_get_appointment(appointment_id):
                 # Enriquecer con datos adicionales
                 try:
                     # Obtener usuarios para veterinario y cliente
-                    users_response = requests.get(
-                        f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                        headers=headers,
-                        timeout=5
-                    )
-
-                    if users_response.status_code == 200:
-                        users_data = users_response.json()
-                        if users_data.get('success'):
-                            users = {user['id']: user for user in users_data['users']}
-
-                            # Enriquecer veterinario
-                            vet_id = appointment.get('veterinarian_id')
-                            if vet_id and vet_id in users:
-                                vet = users[vet_id]
-                                appointment['veterinarian_name'] = f"{vet['first_name']} {vet['last_name']}"
-
-                            # Enriquecer cliente
-                            client_id = appointment.get('client_id')
-                            if client_id and client_id in users:
-                                client = users[client_id]
-                                appointment.update({
-                                    'client_name': f"{client['first_name']} {client['last_name']}",
-                                    'client_email': client.get('email', ''),
-                                    'client_phone': client.get('phone', '')
-                                })
+                    users = get_user_directory().get_users_map(headers)
+
+                    # Enriquecer veterinario
+                    vet_id = appointment.get('veterinarian_id')
+                    if vet_id and vet_id in users:
+                        vet = users[vet_id]
+                        appointment['veterinarian_name'] = f"{vet['first_name']} {vet['last_name']}"
+
+                    # Enriquecer cliente
+                    client_id = appointment.get('client_id')
+                    if client_id and client_id in users:
+                        client = users[client_id]
+                        appointment.update({
+                            'client_name': f"{client['first_name']} {client['last_name']}",
+                            'client_email': client.get('email', ''),
+                            'client_phone': client.get('phone', '')
+                        })
 
                     # Obtener mascota
                     pet_id = appointment.get('pet_id')
                     if pet_id:
-                        pet_response = requests.get(
+                        pet_response = upstream.get(
                             f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}",
                             headers=headers,
                             timeout=5
@@ -2691,12 +2643,12 @@ def api_get_appointment(appointment_id):
 def api_update_appointment(appointment_id):
     """Actualizar cita específica"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         # Actualizar cita en Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/update/{appointment_id}"
-        response = requests.put(appointment_url, json=data, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
             response_data = response.json()
@@ -2737,11 +2689,11 @@ def api_update_appointment(appointment_id):
 def api_confirm_appointment(appointment_id):
     """Confirmar cita"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Confirmar cita en Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/confirm/{appointment_id}"
-        response = requests.put(appointment_url, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2782,11 +2734,11 @@ def api_confirm_appointment(appointment_id):
 def api_complete_appointment(appointment_id):
     """Completar cita"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Completar cita en Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/complete/{appointment_id}"
-        response = requests.put(appointment_url, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2829,11 +2781,11 @@ def api_complete_appointment(appointment_id):
 def api_cancel_appointment(appointment_id):
     """Cancelar cita"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Cancelar cita en Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/cancel/{appointment_id}"
-        response = requests.put(appointment_url, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2874,11 +2826,11 @@ def api_cancel_appointment(appointment_id):
 def api_delete_appointment(appointment_id):
     """Eliminar cita definitivamente"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Eliminar cita en Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/appointments/{appointment_id}"
-        response = requests.delete(appointment_url, headers=headers, timeout=10)
+        response = upstream.delete(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2918,11 +2870,11 @@ def api_delete_appointment(appointment_id):
 def api_get_today_appointments():
     """Obtener citas de hoy"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener citas de hoy desde Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/today"
-        response = requests.get(appointment_url, headers=headers, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -2959,7 +2911,7 @@ def api_get_today_appointments():
 def api_get_available_slots():
     """Obtener horarios disponibles"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener parámetros
         veterinarian_id = request.args.get('veterinarian_id')
@@ -2978,7 +2930,7 @@ def api_get_available_slots():
             'date': date
         }
 
-        response = requests.get(appointment_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, params=params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3016,11 +2968,11 @@ def api_get_available_slots():
 def api_get_appointments_stats():
     """Obtener estadísticas de citas"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener todas las citas para calcular estadísticas
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments"
-        response = requests.get(appointment_url, headers=headers, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3112,10 +3064,11 @@ def admin_inventory():
 
 @frontend_bp.route('/api/admin/inventory/medications')
 @role_required(['admin'])
+@last_known_good
 def api_get_medications():
     """API endpoint para obtener medicamentos - VERSIÓN DEFINITIVA"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Parámetros de filtro opcionales
         include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
@@ -3135,7 +3088,7 @@ def api_get_medications():
             inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/medications/search"
             params['q'] = search
 
-        response = requests.get(inventory_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, params=params, timeout=10)
 
         print(f"📡 Llamada a Inventory Service: {inventory_url}")
         print(f"📡 Parámetros: {params}")
@@ -3188,26 +3141,14 @@ def api_get_medications():
                     'message': data.get('message', 'Error desconocido')
                 }), 400
         else:
-            # Fallback con datos de ejemplo si el servicio no está disponible
-            print(f"⚠️ Inventory Service no disponible: {response.status_code}")
-            example_medications = get_example_medications_data()
-            return jsonify({
-                'success': True,
-                'medications': example_medications,
-                'total': len(example_medications),
-                'message': 'Usando datos de ejemplo - Servicio no disponible'
-            })
+            # Si falla, se sirve la última respuesta buena (last_known_good)
+            raise UpstreamUnavailable(f"Inventory Service respondió {response.status_code}")
 
+    except UpstreamUnavailable:
+        raise
     except requests.RequestException as e:
         print(f"❌ Error conectando con Inventory Service: {e}")
-        # Fallback con datos de ejemplo
-        example_medications = get_example_medications_data()
-        return jsonify({
-            'success': True,
-            'medications': example_medications,
-            'total': len(example_medications),
-            'message': 'Usando datos de ejemplo (sin conexión)'
-        })
+        raise UpstreamUnavailable(str(e))
     except Exception as e:
         print(f"❌ Error en api_get_medications: {e}")
         return jsonify({
@@ -3221,7 +3162,7 @@ def api_get_medications():
 def api_create_medication():
     """Crear nuevo medicamento"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         print(f"📡 Creando medicamento: {data.get('name')}")
@@ -3237,7 +3178,7 @@ def api_create_medication():
 
         # Crear medicamento en Inventory Service
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/medications"
-        response = requests.post(inventory_url, json=data, headers=headers, timeout=10)
+        response = upstream.post(inventory_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 201:
             response_data = response.json()
@@ -3276,14 +3217,14 @@ def api_create_medication():
 def api_update_medication(medication_id):
     """Actualizar medicamento específico"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         print(f"📡 Actualizando medicamento: {medication_id}")
 
         # Actualizar medicamento en Inventory Service
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/medications/{medication_id}"
-        response = requests.put(inventory_url, json=data, headers=headers, timeout=10)
+        response = upstream.put(inventory_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
             response_data = response.json()
@@ -3327,13 +3268,13 @@ def api_update_medication(medication_id):
 def api_delete_medication(medication_id):
     """Eliminar/desactivar medicamento"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📡 Eliminando medicamento: {medication_id}")
 
         # Desactivar medicamento en Inventory Service
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/medications/{medication_id}/deactivate"
-        response = requests.put(inventory_url, headers=headers, timeout=10)
+        response = upstream.put(inventory_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             print(f"✅ Medicamento desactivado: {medication_id}")
@@ -3371,11 +3312,11 @@ def api_delete_medication(medication_id):
 def api_get_inventory_summary():
     """Obtener resumen del inventario"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener resumen desde Inventory Service
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/summary"
-        response = requests.get(inventory_url, headers=headers, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3408,7 +3349,7 @@ def api_get_inventory_summary():
 def api_update_stock():
     """Actualizar stock de medicamento - VERSIÓN CORREGIDA"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         print(f"📦 Datos recibidos para actualizar stock: {data}")
@@ -3425,7 +3366,7 @@ def api_update_stock():
             reference_id = None
 
         # Limpiar user_id - usar el ID del usuario actual de la sesión
-        user_id = session.get('user', {}).get('id')
+        user_id = (current_auth_user() or {}).get('id')
         if not user_id:
             user_id = None
 
@@ -3481,7 +3422,7 @@ def api_update_stock():
 
         # Hacer petición al Inventory Service
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}{endpoint}"
-        response = requests.post(inventory_url, json=request_data, headers=headers, timeout=10)
+        response = upstream.post(inventory_url, json=request_data, headers=headers, timeout=10)
 
         print(f"📦 Respuesta del Inventory Service: {response.status_code}")
 
@@ -3525,7 +3466,7 @@ def api_update_stock():
 def api_get_stock_movements():
     """Obtener movimientos de stock"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener parámetros de consulta
         medication_id = request.args.get('medication_id')
@@ -3545,7 +3486,7 @@ def api_get_stock_movements():
             params['limit'] = limit
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/movements"
-        response = requests.get(inventory_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, params=params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3573,10 +3514,10 @@ def api_get_stock_movements():
 def api_get_low_stock_alerts():
     """Obtener alertas de stock bajo"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/alerts/low-stock"
-        response = requests.get(inventory_url, headers=headers, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3602,12 +3543,12 @@ def api_get_low_stock_alerts():
 def api_get_expiring_medications():
     """Obtener medicamentos próximos a vencer"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         days = request.args.get('days', 30)
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/alerts/expiring"
         params = {'days': days}
-        response = requests.get(inventory_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, params=params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3633,10 +3574,10 @@ def api_get_expiring_medications():
 def api_get_medication_categories():
     """Obtener categorías de medicamentos"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/categories"
-        response = requests.get(inventory_url, headers=headers, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3666,7 +3607,7 @@ def api_get_medication_categories():
 def api_search_medications():
     """Buscar medicamentos"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         search_term = request.args.get('q', '')
 
         if not search_term:
@@ -3677,7 +3618,7 @@ def api_search_medications():
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/medications/search"
         params = {'q': search_term}
-        response = requests.get(inventory_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, params=params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3699,139 +3640,16 @@ def api_search_medications():
         }), 500
 
 
-# =============== DATOS DE EJEMPLO PARA FALLBACK ===============
-
-def get_example_medications_data():
-    """Datos de ejemplo mejorados para medicamentos cuando no hay conexión"""
-    from datetime import datetime, timedelta
-
-    today = datetime.now()
-    future_date = today + timedelta(days=180)
-    near_expiry = today + timedelta(days=25)
-
-    return [
-        {
-            'id': 'med_001',
-            'name': 'Amoxicilina 500mg',
-            'category': 'Antibiótico',
-            'presentation': 'Comprimidos',
-            'concentration': '500mg',
-            'laboratory': 'Laboratorios Veterinarios S.A.',
-            'supplier': 'Distribuidora Médica',
-            'unit_price': 2500.0,
-            'stock_quantity': 45,
-            'minimum_stock_alert': 20,
-            'expiration_date': future_date.strftime('%Y-%m-%d'),
-            'batch_number': 'AMX2024-001',
-            'description': 'Antibiótico de amplio espectro para infecciones bacterianas',
-            'storage_conditions': 'Conservar en lugar fresco y seco, temperatura ambiente',
-            'is_active': True,
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat(),
-            'stock_status': 'in_stock',
-            'total_value': 112500.0,
-            'days_to_expiration': 180
-        },
-        {
-            'id': 'med_002',
-            'name': 'Meloxicam 2mg/ml',
-            'category': 'Antiinflamatorio',
-            'presentation': 'Inyectable',
-            'concentration': '2mg/ml',
-            'laboratory': 'VetPharma',
-            'supplier': 'Distribuidora Médica',
-            'unit_price': 8500.0,
-            'stock_quantity': 8,
-            'minimum_stock_alert': 15,
-            'expiration_date': near_expiry.strftime('%Y-%m-%d'),
-            'batch_number': 'MLX2024-002',
-            'description': 'Antiinflamatorio no esteroideo para dolor y inflamación',
-            'storage_conditions': 'Refrigerar entre 2-8°C',
-            'is_active': True,
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat(),
-            'stock_status': 'low_stock',
-            'total_value': 68000.0,
-            'days_to_expiration': 25
-        },
-        {
-            'id': 'med_003',
-            'name': 'Vacuna Múltiple DHPP',
-            'category': 'Vacunas',
-            'presentation': 'Vial',
-            'concentration': '1ml/dosis',
-            'laboratory': 'BioVet',
-            'supplier': 'Vacunas Veterinarias',
-            'unit_price': 15000.0,
-            'stock_quantity': 0,
-            'minimum_stock_alert': 10,
-            'expiration_date': near_expiry.strftime('%Y-%m-%d'),
-            'batch_number': 'VAC2024-003',
-            'description': 'Vacuna múltiple para perros (Distemper, Hepatitis, Parvovirus, Parainfluenza)',
-            'storage_conditions': 'Conservar refrigerado 2-8°C, no congelar',
-            'is_active': True,
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat(),
-            'stock_status': 'out_of_stock',
-            'total_value': 0.0,
-            'days_to_expiration': 25
-        },
-        {
-            'id': 'med_004',
-            'name': 'Tramadol 50mg',
-            'category': 'Analgésico',
-            'presentation': 'Comprimidos',
-            'concentration': '50mg',
-            'laboratory': 'PainRelief Vet',
-            'supplier': 'Farmacia Veterinaria Central',
-            'unit_price': 1200.0,
-            'stock_quantity': 120,
-            'minimum_stock_alert': 30,
-            'expiration_date': future_date.strftime('%Y-%m-%d'),
-            'batch_number': 'TRA2024-004',
-            'description': 'Analgésico opioide para dolor moderado a severo',
-            'storage_conditions': 'Conservar en lugar seguro, temperatura ambiente',
-            'is_active': True,
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat(),
-            'stock_status': 'in_stock',
-            'total_value': 144000.0,
-            'days_to_expiration': 180
-        },
-        {
-            'id': 'med_005',
-            'name': 'Ivermectina 1mg/ml',
-            'category': 'Antiparasitario',
-            'presentation': 'Solución oral',
-            'concentration': '1mg/ml',
-            'laboratory': 'Parasit Control',
-            'supplier': 'Antiparasitarios Vet',
-            'unit_price': 3200.0,
-            'stock_quantity': 25,
-            'minimum_stock_alert': 20,
-            'expiration_date': future_date.strftime('%Y-%m-%d'),
-            'batch_number': 'IVE2024-005',
-            'description': 'Antiparasitario interno y externo de amplio espectro',
-            'storage_conditions': 'Proteger de la luz, temperatura ambiente',
-            'is_active': True,
-            'created_at': today.isoformat(),
-            'updated_at': today.isoformat(),
-            'stock_status': 'in_stock',
-            'total_value': 80000.0,
-            'days_to_expiration': 180
-        }
-    ]
-
 @frontend_bp.route('/api/admin/inventory/alerts/check-expiration', methods=['POST'])
 @role_required(['admin'])
 def api_check_expiration_alerts():
     """Verificar y enviar alertas de vencimiento"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json() or {}
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/alerts/check-expiration"
-        response = requests.post(inventory_url, json=data, headers=headers, timeout=10)
+        response = upstream.post(inventory_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
             response_data = response.json()
@@ -3856,11 +3674,11 @@ def api_check_expiration_alerts():
 def api_export_inventory_csv():
     """Exportar inventario a CSV"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Redirigir al Inventory Service para descargar CSV
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/export/csv"
-        response = requests.get(inventory_url, headers=headers, timeout=30)
+        response = upstream.get(inventory_url, headers=headers, timeout=30)
 
         if response.status_code == 200:
             # Reenviar la respuesta CSV al cliente
@@ -3891,10 +3709,10 @@ def api_export_inventory_csv():
 def api_get_inventory_stats():
     """Obtener estadísticas del inventario"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         inventory_url = f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/stats"
-        response = requests.get(inventory_url, headers=headers, timeout=10)
+        response = upstream.get(inventory_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -3931,7 +3749,7 @@ def client_dashboard():
     """Dashboard principal para clientes"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener estadísticas básicas del cliente
         client_stats = {
@@ -3941,35 +3759,43 @@ def client_dashboard():
             'unread_notifications': 0
         }
 
-        # Intentar obtener datos reales de los servicios
-        try:
+        def fetch_pets_count():
             # Contar mascotas del cliente
-            pets_response = requests.get(
+            pets_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}",
                 headers=headers, timeout=5
             )
             if pets_response.status_code == 200:
                 pets_data = pets_response.json()
                 if pets_data.get('success'):
-                    client_stats['my_pets_count'] = len(pets_data.get('pets', []))
-        except:
-            pass
+                    return len(pets_data.get('pets', []))
+            return 0
 
-        try:
-            # Contar citas próximas
-            appointments_response = requests.get(
+        def fetch_upcoming_appointments():
+            # Citas próximas
+            appointments_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}/upcoming",
                 headers=headers, timeout=5
             )
             if appointments_response.status_code == 200:
                 apt_data = appointments_response.json()
                 if apt_data.get('success'):
-                    appointments = apt_data.get('appointments', [])
-                    client_stats['upcoming_appointments_count'] = len(appointments)
-                    client_stats['pending_confirmations'] = len(
-                        [a for a in appointments if a.get('status') == 'scheduled'])
-        except:
-            pass
+                    return apt_data.get('appointments', [])
+            return None
+
+        # Intentar obtener datos reales de los servicios (en paralelo)
+        results = fan_out({
+            'pets_count': fetch_pets_count,
+            'appointments': fetch_upcoming_appointments
+        }, deadline=5, defaults={'pets_count': 0})
+
+        client_stats['my_pets_count'] = results['pets_count']
+
+        appointments = results['appointments']
+        if appointments is not None:
+            client_stats['upcoming_appointments_count'] = len(appointments)
+            client_stats['pending_confirmations'] = len(
+                [a for a in appointments if a.get('status') == 'scheduled'])
 
         template_data = {
             'user': user,
@@ -4073,12 +3899,12 @@ def client_settings():
 def api_client_pet_details(pet_id):
     """API para obtener detalles específicos de una mascota del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener detalles de la mascota
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -4095,7 +3921,7 @@ def api_client_pet_details(pet_id):
                 # Intentar obtener historial médico básico
                 try:
                     records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet_id}"
-                    records_response = requests.get(records_url, headers=headers, timeout=5)
+                    records_response = upstream.get(records_url, headers=headers, timeout=5)
 
                     if records_response.status_code == 200:
                         records_data = records_response.json()
@@ -4148,12 +3974,12 @@ def api_client_pet_details(pet_id):
 def api_client_pets_stats():
     """API para obtener estadísticas de mascotas del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener todas las mascotas del cliente
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         stats = {
             'total_pets': 0,
@@ -4179,7 +4005,7 @@ def api_client_pets_stats():
         # Intentar obtener citas próximas
         try:
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}/upcoming"
-            appointments_response = requests.get(appointments_url, headers=headers, timeout=5)
+            appointments_response = upstream.get(appointments_url, headers=headers, timeout=5)
 
             if appointments_response.status_code == 200:
                 apt_data = appointments_response.json()
@@ -4206,14 +4032,14 @@ def api_client_pets_stats():
 def api_client_upcoming_appointments():
     """API para obtener citas próximas del cliente - VERSIÓN CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📅 Obteniendo citas próximas para cliente: {user['id']}")
 
         # CORRECCIÓN: Usar la nueva ruta específica
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}/upcoming"
-        response = requests.get(appointment_url, headers=headers, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, timeout=10)
 
         print(f"📡 Upcoming appointments response: {response.status_code}")
 
@@ -4225,7 +4051,7 @@ def api_client_upcoming_appointments():
                 # Enriquecer con datos de mascotas
                 try:
                     medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-                    pets_response = requests.get(medical_url, headers=headers, timeout=5)
+                    pets_response = upstream.get(medical_url, headers=headers, timeout=5)
 
                     if pets_response.status_code == 200:
                         pets_data = pets_response.json()
@@ -4276,8 +4102,8 @@ def api_client_upcoming_appointments():
 def api_client_dashboard_stats():
     """API para estadísticas del dashboard del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         stats = {
             'unread_notifications': 0,
@@ -4285,39 +4111,40 @@ def api_client_dashboard_stats():
             'total_pets': 0
         }
 
-        # Intentar obtener notificaciones no leídas
-        try:
+        def fetch_unread_notifications():
             notif_url = f"{current_app.config['NOTIFICATION_SERVICE_URL']}/notifications/user/{user['id']}/unread/count"
-            notif_response = requests.get(notif_url, headers=headers, timeout=5)
+            notif_response = upstream.get(notif_url, headers=headers, timeout=5)
             if notif_response.status_code == 200:
                 notif_data = notif_response.json()
                 if notif_data.get('success'):
-                    stats['unread_notifications'] = notif_data.get('count', 0)
-        except:
-            pass
+                    return notif_data.get('count', 0)
+            return 0
 
-        # Obtener conteo de mascotas
-        try:
+        def fetch_total_pets():
             pets_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-            pets_response = requests.get(pets_url, headers=headers, timeout=5)
+            pets_response = upstream.get(pets_url, headers=headers, timeout=5)
             if pets_response.status_code == 200:
                 pets_data = pets_response.json()
                 if pets_data.get('success'):
-                    stats['total_pets'] = len(pets_data.get('pets', []))
-        except:
-            pass
+                    return len(pets_data.get('pets', []))
+            return 0
 
-        # Obtener citas pendientes
-        try:
+        def fetch_pending_appointments():
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}/upcoming"
-            appointments_response = requests.get(appointments_url, headers=headers, timeout=5)
+            appointments_response = upstream.get(appointments_url, headers=headers, timeout=5)
             if appointments_response.status_code == 200:
                 apt_data = appointments_response.json()
                 if apt_data.get('success'):
                     appointments = apt_data.get('appointments', [])
-                    stats['pending_appointments'] = len([a for a in appointments if a.get('status') == 'scheduled'])
-        except:
-            pass
+                    return len([a for a in appointments if a.get('status') == 'scheduled'])
+            return 0
+
+        # Notificaciones no leídas, mascotas y citas pendientes en paralelo
+        stats.update(fan_out({
+            'unread_notifications': fetch_unread_notifications,
+            'total_pets': fetch_total_pets,
+            'pending_appointments': fetch_pending_appointments
+        }, deadline=5, defaults=dict(stats)))
 
         return jsonify({
             'success': True,
@@ -4333,8 +4160,8 @@ def api_client_dashboard_stats():
 def api_client_create_pet():
     """API para crear nueva mascota del cliente (solo datos, sin foto)"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Convertir FormData a JSON
         data = {}
@@ -4355,7 +4182,7 @@ def api_client_create_pet():
 
         # Enviar como JSON al Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets"
-        response = requests.post(medical_url, json=data, headers=headers, timeout=15)
+        response = upstream.post(medical_url, json=data, headers=headers, timeout=15)
 
         print(f"📡 Respuesta Medical Service: {response.status_code}")
 
@@ -4392,8 +4219,8 @@ def api_client_create_pet():
 def api_client_create_pet():
 
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener datos del formulario
         if request.content_type and 'multipart/form-data' in request.content_type:
@@ -4417,7 +4244,7 @@ def api_client_create_pet():
 
             # PASO 1: Crear la mascota sin foto primero
             medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets"
-            response = requests.post(medical_url, json=data, headers=headers, timeout=15)
+            response = upstream.post(medical_url, json=data, headers=headers, timeout=15)
 
             if response.status_code == 201:
                 result = response.json()
@@ -4433,7 +4260,7 @@ def api_client_create_pet():
                                 # Subir foto por separado
                                 files = {'photo': photo}
                                 photo_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}/photo"
-                                photo_response = requests.post(
+                                photo_response = upstream.post(
                                     photo_url,
                                     files=files,
                                     headers={'Authorization': headers['Authorization']},
@@ -4463,7 +4290,7 @@ def api_client_create_pet():
             data['owner_id'] = user['id']
 
             medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets"
-            response = requests.post(medical_url, json=data, headers=headers, timeout=15)
+            response = upstream.post(medical_url, json=data, headers=headers, timeout=15)
 
         # Manejar errores del Medical Service
         if response.status_code != 201:
@@ -4504,11 +4331,11 @@ def api_client_create_pet():
 def api_client_appointments_upcoming_proxy():
     """Proxy para citas próximas del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         apt_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}/upcoming"
-        response = requests.get(apt_url, headers=headers, timeout=10)
+        response = upstream.get(apt_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             return jsonify(response.json())
@@ -4532,12 +4359,12 @@ def client_pets_edit():
             return redirect(url_for('frontend.client_pets'))
 
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Verificar que la mascota existe y pertenece al usuario
         try:
             medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-            response = requests.get(medical_url, headers=headers, timeout=10)
+            response = upstream.get(medical_url, headers=headers, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -4582,14 +4409,14 @@ def client_pets_edit():
 def api_client_update_pet(pet_id):
     """API para actualizar mascota del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📝 Cliente {user['id']} actualizando mascota {pet_id}")
 
         # PASO 1: Verificar que la mascota pertenece al usuario
         verify_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        verify_response = requests.get(verify_url, headers=headers, timeout=10)
+        verify_response = upstream.get(verify_url, headers=headers, timeout=10)
 
         if verify_response.status_code != 200:
             return jsonify({
@@ -4630,7 +4457,7 @@ def api_client_update_pet(pet_id):
 
             # PASO 3: Actualizar datos básicos primero
             medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-            response = requests.put(medical_url, json=data, headers=headers, timeout=15)
+            response = upstream.put(medical_url, json=data, headers=headers, timeout=15)
 
             if response.status_code == 200:
                 result = response.json()
@@ -4647,7 +4474,7 @@ def api_client_update_pet(pet_id):
                                 # Subir nueva foto
                                 files = {'photo': photo}
                                 photo_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}/photo"
-                                photo_response = requests.post(
+                                photo_response = upstream.post(
                                     photo_url,
                                     files=files,
                                     headers={'Authorization': headers['Authorization']},
@@ -4680,7 +4507,7 @@ def api_client_update_pet(pet_id):
             data['owner_id'] = pet_data['owner_id']
 
             medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-            response = requests.put(medical_url, json=data, headers=headers, timeout=15)
+            response = upstream.put(medical_url, json=data, headers=headers, timeout=15)
 
         # Manejar errores del Medical Service
         if response.status_code != 200:
@@ -4718,14 +4545,14 @@ def api_client_update_pet(pet_id):
 def api_client_delete_pet(pet_id):
     """API para eliminar mascota del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🗑️ Cliente {user['id']} eliminando mascota {pet_id}")
 
         # PASO 1: Verificar que la mascota pertenece al usuario
         verify_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        verify_response = requests.get(verify_url, headers=headers, timeout=10)
+        verify_response = upstream.get(verify_url, headers=headers, timeout=10)
 
         if verify_response.status_code != 200:
             return jsonify({
@@ -4750,7 +4577,7 @@ def api_client_delete_pet(pet_id):
         # PASO 2: Verificar si hay citas futuras
         try:
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/pet/{pet_id}/upcoming"
-            appointments_response = requests.get(appointments_url, headers=headers, timeout=5)
+            appointments_response = upstream.get(appointments_url, headers=headers, timeout=5)
 
             if appointments_response.status_code == 200:
                 apt_data = appointments_response.json()
@@ -4767,7 +4594,7 @@ def api_client_delete_pet(pet_id):
 
         # PASO 3: Eliminar la mascota
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        response = requests.delete(medical_url, headers=headers, timeout=15)
+        response = upstream.delete(medical_url, headers=headers, timeout=15)
 
         if response.status_code == 200:
             result = response.json()
@@ -4811,14 +4638,14 @@ def api_client_delete_pet(pet_id):
 def api_client_update_pet_photo(pet_id):
     """API para actualizar solo la foto de una mascota del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📸 Cliente {user['id']} actualizando foto de mascota {pet_id}")
 
         # Verificar que la mascota pertenece al usuario
         verify_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        verify_response = requests.get(verify_url, headers=headers, timeout=10)
+        verify_response = upstream.get(verify_url, headers=headers, timeout=10)
 
         if verify_response.status_code != 200:
             return jsonify({
@@ -4877,9 +4704,10 @@ def api_client_update_pet_photo(pet_id):
 
         # Subir foto al Medical Service
         try:
-            files = {'photo': photo}
+            # El Medical Service guarda el original y genera las miniaturas en segundo plano
+            files = {'file': (photo.filename, photo.stream, photo.content_type)}
             photo_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}/photo"
-            photo_response = requests.post(
+            photo_response = upstream.post(
                 photo_url,
                 files=files,
                 headers={'Authorization': headers['Authorization']},
@@ -4890,6 +4718,7 @@ def api_client_update_pet_photo(pet_id):
                 photo_result = photo_response.json()
                 if photo_result.get('success'):
                     print(f"✅ Foto actualizada exitosamente para mascota {pet_id}")
+                    get_photo_index().forget(pet_id)
 
                     return jsonify({
                         'success': True,
@@ -4929,11 +4758,11 @@ def api_client_update_pet_photo(pet_id):
 def api_validate_pet_owner(pet_id):
     """Validar que una mascota pertenece al cliente actual"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -4990,14 +4819,14 @@ def api_validate_pet_owner(pet_id):
 def api_client_pets():
     """API para obtener mascotas del cliente - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🐾 Obteniendo mascotas para cliente: {user['id']}")
 
         # CORRECCIÓN: Usar la ruta correcta del Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         print(f"📡 Respuesta Medical Service: {response.status_code}")
 
@@ -5066,7 +4895,7 @@ def api_public_veterinarians():
         headers = {}
 
         # Intentar obtener token si existe (opcional para esta ruta pública)
-        token = session.get('token')
+        token = current_auth_token()
         if token:
             headers['Authorization'] = f"Bearer {token}"
 
@@ -5076,7 +4905,7 @@ def api_public_veterinarians():
         try:
             print("📡 Llamando al Auth Service...")
             auth_url = f"{current_app.config.get('AUTH_SERVICE_URL', 'http://localhost:5001')}/auth/users"
-            response = requests.get(auth_url, headers=headers, timeout=10)
+            response = upstream.get(auth_url, headers=headers, timeout=10)
 
             print(f"📡 Respuesta Auth Service: {response.status_code}")
 
@@ -5098,7 +4927,7 @@ def api_public_veterinarians():
             try:
                 print("📡 Intentando endpoint específico de veterinarios...")
                 auth_url = f"{current_app.config.get('AUTH_SERVICE_URL', 'http://localhost:5001')}/auth/users/veterinarians"
-                response = requests.get(auth_url, headers=headers, timeout=10)
+                response = upstream.get(auth_url, headers=headers, timeout=10)
 
                 if response.status_code == 200:
                     data = response.json()
@@ -5118,7 +4947,7 @@ def api_public_veterinarians():
         try:
             print("📡 Obteniendo horarios desde Appointment Service...")
             appointment_url = f"{current_app.config.get('APPOINTMENT_SERVICE_URL', 'http://localhost:5002')}/appointments/schedules/veterinarians-v2"
-            schedules_response = requests.get(appointment_url, headers=headers, timeout=10)
+            schedules_response = upstream.get(appointment_url, headers=headers, timeout=10)
 
             vet_schedules = {}
             if schedules_response.status_code == 200:
@@ -5214,7 +5043,7 @@ def enrich_veterinarians_with_schedules(veterinarians, headers):
     """Enriquecer veterinarios con sus horarios desde Appointment Service"""
     try:
         schedules_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/schedules/veterinarians-v2"
-        schedules_response = requests.get(schedules_url, headers=headers, timeout=10)
+        schedules_response = upstream.get(schedules_url, headers=headers, timeout=10)
 
         vet_schedules = {}
         if schedules_response.status_code == 200:
@@ -5381,7 +5210,7 @@ def api_public_availability(vet_id, date):
         print(f"🔍 Buscando disponibilidad para veterinario {vet_id} en {date}")
 
         headers = {}
-        token = session.get('token')
+        token = current_auth_token()
         if token:
             headers['Authorization'] = f"Bearer {token}"
 
@@ -5393,7 +5222,7 @@ def api_public_availability(vet_id, date):
                 'date': date
             }
 
-            response = requests.get(appointment_url, headers=headers, params=params, timeout=10)
+            response = upstream.get(appointment_url, headers=headers, params=params, timeout=10)
             print(f"📡 Respuesta Appointment Service: {response.status_code}")
 
             if response.status_code == 200:
@@ -5419,7 +5248,7 @@ def api_public_availability(vet_id, date):
 
             # Obtener horarios del veterinario
             schedules_url = f"{current_app.config.get('APPOINTMENT_SERVICE_URL', 'http://localhost:5002')}/appointments/schedules/veterinarians-v2-v2"
-            schedules_response = requests.get(schedules_url, headers=headers, timeout=10)
+            schedules_response = upstream.get(schedules_url, headers=headers, timeout=10)
 
             if schedules_response.status_code == 200:
                 schedules_data = schedules_response.json()
@@ -5522,7 +5351,7 @@ def generate_time_slots_for_date(start_time, end_time, vet_id, date, headers):
         # Obtener citas existentes para filtrar slots ocupados
         try:
             appointments_url = f"{current_app.config.get('APPOINTMENT_SERVICE_URL', 'http://localhost:5002')}/appointments/veterinarian/{vet_id}/date/{date}"
-            apt_response = requests.get(appointments_url, headers=headers, timeout=5)
+            apt_response = upstream.get(appointments_url, headers=headers, timeout=5)
 
             occupied_times = []
             if apt_response.status_code == 200:
@@ -5606,7 +5435,7 @@ def generate_time_slots_public(start_time, end_time, vet_id, date, headers):
         # Obtener citas existentes para filtrar slots ocupados
         try:
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{vet_id}/date/{date}"
-            apt_response = requests.get(appointments_url, headers=headers, timeout=5)
+            apt_response = upstream.get(appointments_url, headers=headers, timeout=5)
 
             occupied_times = []
             if apt_response.status_code == 200:
@@ -5636,8 +5465,8 @@ def api_public_create_appointment():
         data = request.get_json()
 
         # Verificar autenticación
-        token = session.get('token')
-        user = session.get('user')
+        token = current_auth_token()
+        user = current_auth_user()
 
         if not token or not user:
             return jsonify({
@@ -5674,7 +5503,7 @@ def api_public_create_appointment():
         # MÉTODO 1: Crear cita en Appointment Service
         try:
             appointment_url = f"{current_app.config.get('APPOINTMENT_SERVICE_URL', 'http://localhost:5002')}/appointments/create"
-            response = requests.post(appointment_url, json=appointment_data, headers=headers, timeout=15)
+            response = upstream.post(appointment_url, json=appointment_data, headers=headers, timeout=15)
 
             print(f"📡 Respuesta Appointment Service: {response.status_code}")
 
@@ -5712,7 +5541,7 @@ def api_public_create_appointment():
         # MÉTODO 2: Intentar endpoint alternativo
         try:
             alt_url = f"{current_app.config.get('APPOINTMENT_SERVICE_URL', 'http://localhost:5002')}/appointments/appointments"
-            response = requests.post(alt_url, json=appointment_data, headers=headers, timeout=15)
+            response = upstream.post(alt_url, json=appointment_data, headers=headers, timeout=15)
 
             if response.status_code in [200, 201]:
                 result = response.json()
@@ -5744,14 +5573,14 @@ def api_public_create_appointment():
 def api_client_appointments_get():
     """API para obtener citas del cliente - evita redirección 302"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📅 Obteniendo citas para cliente: {user['id']}")
 
         # Obtener citas del cliente desde Appointment Service
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}"
-        response = requests.get(appointment_url, headers=headers, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, timeout=10)
 
         print(f"📡 Appointments response: {response.status_code}")
 
@@ -5764,7 +5593,7 @@ def api_client_appointments_get():
                     # Enriquecer con datos de mascotas
                     try:
                         pets_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-                        pets_response = requests.get(pets_url, headers=headers, timeout=5)
+                        pets_response = upstream.get(pets_url, headers=headers, timeout=5)
 
                         pets_map = {}
                         if pets_response.status_code == 200:
@@ -5903,7 +5732,7 @@ def process_appointments_response(appointments, headers):
                 if appointment.get('pet_id'):
                     try:
                         pet_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{appointment['pet_id']}"
-                        pet_response = requests.get(pet_url, headers=headers, timeout=3)
+                        pet_response = upstream.get(pet_url, headers=headers, timeout=3)
 
                         if pet_response.status_code == 200:
                             pet_data = pet_response.json()
@@ -5919,7 +5748,7 @@ def process_appointments_response(appointments, headers):
                 if appointment.get('veterinarian_id'):
                     try:
                         # Usar endpoint interno que ya funciona
-                        users_response = requests.get(
+                        users_response = upstream.get(
                             'http://localhost:3000/api/admin/users',
                             headers=headers,
                             timeout=3
@@ -6003,7 +5832,7 @@ def generate_availability_fallback(vet_id, date, headers):
 
         # Obtener horarios del veterinario
         schedules_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/schedules"
-        schedules_response = requests.get(schedules_url, headers=headers, timeout=5)
+        schedules_response = upstream.get(schedules_url, headers=headers, timeout=5)
 
         if schedules_response.status_code == 200:
             schedules_data = schedules_response.json()
@@ -6051,8 +5880,8 @@ def generate_availability_fallback(vet_id, date, headers):
 def api_client_notifications_count():
     """API para contar notificaciones del cliente - CORRECCIÓN FINAL"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🔔 Obteniendo conteo de notificaciones para cliente: {user['id']}")
 
@@ -6065,7 +5894,7 @@ def api_client_notifications_count():
         try:
             # CORRECCIÓN: Usar endpoint correcto
             notif_url = f"{current_app.config['NOTIFICATION_SERVICE_URL']}/notifications/user/{user['id']}/unread/count"
-            notif_response = requests.get(notif_url, headers=headers, timeout=5)
+            notif_response = upstream.get(notif_url, headers=headers, timeout=5)
 
             print(f"📡 Notificaciones response: {notif_response.status_code}")
 
@@ -6083,7 +5912,7 @@ def api_client_notifications_count():
         # Intentar obtener citas pendientes
         try:
             # Usar nuestro propio endpoint que ya funciona
-            appointments_response = requests.get(
+            appointments_response = upstream.get(
                 'http://localhost:3000/api/client/appointments',
                 headers=headers,
                 timeout=5
@@ -6140,8 +5969,8 @@ def admin_billing():
 def api_get_owners():
     """API endpoint para obtener todos los propietarios"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-        response = requests.get(
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
+        response = upstream.get(
             f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/role/client",
             headers=headers,
             timeout=10
@@ -6166,8 +5995,8 @@ def api_get_owners():
 def api_get_owner_pets(owner_id):
     """API endpoint para obtener mascotas de un propietario"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-        response = requests.get(
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
+        response = upstream.get(
             f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{owner_id}",
             headers=headers,
             timeout=10
@@ -6192,8 +6021,8 @@ def api_get_owner_pets(owner_id):
 def api_get_billing_medications():
     """API endpoint para obtener todos los medicamentos disponibles"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-        response = requests.get(
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
+        response = upstream.get(
             f"{current_app.config['INVENTORY_SERVICE_URL']}/inventory/medications",
             headers=headers,
             timeout=10
@@ -6218,8 +6047,8 @@ def api_get_billing_medications():
 def api_get_pet_medical_history(pet_id):
     """API endpoint para obtener historia médica de una mascota"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-        response = requests.get(
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
+        response = upstream.get(
             f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet_id}",
             headers=headers,
             timeout=10
@@ -6245,7 +6074,7 @@ def api_create_invoice():
     """API endpoint para crear una nueva factura"""
     try:
         data = request.get_json()
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Aquí enviarías los datos al microservicio correspondiente
         # Por ejemplo, a un servicio de facturación o al inventario para actualizar stock
@@ -6272,29 +6101,93 @@ def api_create_invoice():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+MONTH_NAMES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+               'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+
+def month_start(value, months_back=0):
+    """Primer día del mes de value, retrocediendo months_back meses"""
+    index = value.year * 12 + value.month - 1 - months_back
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def rollup_row_to_dict(row):
+    return {key: float(value) if isinstance(value, Decimal) else
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in row.items()}
+
+
 @frontend_bp.route('/api/admin/billing/statistics')
 @role_required(['admin', 'receptionist'])
 def api_get_billing_statistics():
-    """API endpoint para obtener estadísticas de facturación"""
+    """Estadísticas de facturación leídas de los rollups diarios/mensuales (sin recorrer facturas)"""
     try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        months = max(1, min(request.args.get('months', 6, type=int), 36))
+        today = datetime.now().date()
+        first_month = month_start(today, months - 1)
+
+        conn = get_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error conectando a la base de datos'}), 500
+
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+        cur.execute("""
+            SELECT COALESCE(SUM(invoice_count), 0) AS invoice_count,
+                   COALESCE(SUM(revenue), 0) AS revenue,
+                   COALESCE(SUM(item_count), 0) AS item_count
+            FROM billing_monthly_rollups
+        """)
+        totals = cur.fetchone()
+
+        cur.execute("""
+            SELECT month, invoice_count, revenue, subtotal, tax, item_count
+            FROM billing_monthly_rollups
+            WHERE month >= %s
+            ORDER BY month
+        """, (first_month,))
+        by_month = {row['month']: row for row in cur.fetchall()}
 
-        # Aquí harías las consultas reales a tus microservicios
-        # para obtener estadísticas reales
+        cur.execute("SELECT invoice_count, revenue, tax, item_count FROM billing_daily_rollups WHERE day = %s", (today,))
+        today_row = cur.fetchone()
 
+        cur.execute("""
+            SELECT MAX(item_name) AS name, medication_id,
+                   SUM(quantity) AS quantity, SUM(revenue) AS revenue
+            FROM billing_medication_rollups
+            WHERE month >= %s
+            GROUP BY medication_key, medication_id
+            ORDER BY SUM(quantity) DESC
+            LIMIT 5
+        """, (first_month,))
+        top_medications = [rollup_row_to_dict(row) for row in cur.fetchall()]
+        cur.close()
+
+        # Meses sin facturas también aparecen (en 0) para que la gráfica sea continua
+        monthly_revenue = []
+        for offset in range(months - 1, -1, -1):
+            month = month_start(today, offset)
+            row = by_month.get(month) or {}
+            monthly_revenue.append({
+                'month': MONTH_NAMES[month.month - 1],
+                'period': month.strftime('%Y-%m'),
+                'revenue': float(row.get('revenue', 0)),
+                'tax': float(row.get('tax', 0)),
+                'invoices': row.get('invoice_count', 0),
+                'items': row.get('item_count', 0)
+            })
+
+        total_invoices = int(totals['invoice_count'])
+        total_revenue = float(totals['revenue'])
         stats = {
-            'total_revenue': 15750.50,
-            'total_invoices': 125,
-            'avg_invoice': 126.00,
-            'total_medications': 347,
-            'monthly_revenue': [
-                {'month': 'Enero', 'revenue': 2500},
-                {'month': 'Febrero', 'revenue': 2800},
-                {'month': 'Marzo', 'revenue': 3200},
-                {'month': 'Abril', 'revenue': 2900},
-                {'month': 'Mayo', 'revenue': 3300},
-                {'month': 'Junio', 'revenue': 1000}  # Mes actual parcial
-            ]
+            'total_revenue': total_revenue,
+            'total_invoices': total_invoices,
+            'avg_invoice': round(total_revenue / total_invoices, 2) if total_invoices else 0,
+            'total_medications': int(totals['item_count']),
+            'today': rollup_row_to_dict(today_row) if today_row else
+                     {'invoice_count': 0, 'revenue': 0, 'tax': 0, 'item_count': 0},
+            'monthly_revenue': monthly_revenue,
+            'top_medications': top_medications
         }
 
         return jsonify({
@@ -6310,45 +6203,55 @@ def api_get_billing_statistics():
 @frontend_bp.route('/api/admin/billing/history')
 @role_required(['admin', 'receptionist'])
 def api_get_billing_history():
-    """API endpoint para obtener historial de facturación"""
-    try:
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
-
-        # Parámetros de búsqueda y paginación
-        search = request.args.get('search', '')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-
-        # Aquí harías la consulta real a tu microservicio
-        # Por ahora simularemos datos
-
-        history = [
-            {
-                'id': 'INV-001',
-                'date': '2024-06-10',
-                'owner_name': 'Juan Pérez',
-                'pet_name': 'Max',
-                'total': 125.50,
-                'status': 'paid'
-            },
-            {
-                'id': 'INV-002',
-                'date': '2024-06-11',
-                'owner_name': 'María García',
-                'pet_name': 'Luna',
-                'total': 87.25,
-                'status': 'paid'
-            }
-            # ... más datos
-        ]
-
-        return jsonify({
-            'success': True,
-            'invoices': history,
-            'total': len(history),
-            'page': page,
-            'per_page': per_page
-        })
+    """
+    Historial de ingresos por día o por mes desde los rollups:
+    ?granularity=day|month&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    """
+    try:
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('day', 'month'):
+            return jsonify({'success': False, 'message': "granularity debe ser 'day' o 'month'"}), 400
+
+        today = datetime.now().date()
+        try:
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+                if request.args.get('end_date') else today
+            start = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+                if request.args.get('start_date') else \
+                (end - timedelta(days=29) if granularity == 'day' else month_start(end, 11))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Las fechas deben tener el formato YYYY-MM-DD'}), 400
+
+        conn = get_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Error conectando a la base de datos'}), 500
+
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        if granularity == 'day':
+            cur.execute("""
+                SELECT day AS period, invoice_count, revenue, subtotal, tax, item_count
+                FROM billing_daily_rollups
+                WHERE day BETWEEN %s AND %s
+                ORDER BY day
+            """, (start, end))
+        else:
+            cur.execute("""
+                SELECT month AS period, invoice_count, revenue, subtotal, tax, item_count
+                FROM billing_monthly_rollups
+                WHERE month BETWEEN %s AND %s
+                ORDER BY month
+            """, (month_start(start), end))
+        history = [rollup_row_to_dict(row) for row in cur.fetchall()]
+        cur.close()
+
+        return jsonify({
+            'success': True,
+            'granularity': granularity,
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'history': history,
+            'total': len(history)
+        })
 
     except Exception as e:
         print(f"❌ Error en api_get_billing_history: {e}")
@@ -6356,29 +6259,13 @@ def api_get_billing_history():
 
 # =============== FUNCIÓN DE CONEXIÓN ===============
 def get_db():
-    """Conexión a PostgreSQL - VERSIÓN MEJORADA"""
-    try:
-        # Obtener configuración de la base de datos
-        host = os.environ.get('POSTGRES_HOST', 'localhost')
-        port = os.environ.get('POSTGRES_PORT', '5432')
-        database = os.environ.get('POSTGRES_DB', 'veterinary-system')
-        user = os.environ.get('POSTGRES_USER', 'postgres')
-        password = os.environ.get('POSTGRES_PASSWORD', 'bocato0731')
-
-        print(f"🔌 Intentando conectar a PostgreSQL: {user}@{host}:{port}/{database}")
-
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password,
-            connect_timeout=10
-        )
-
-        print("✅ Conexión a PostgreSQL exitosa")
-        return conn
+    """Conexión a PostgreSQL del pool para la petición actual (se devuelve sola al terminar)"""
+    try:
+        return current_app.extensions['db_pool'].connection()
 
+    except PoolTimeout as e:
+        print(f"❌ Pool de PostgreSQL agotado: {e}")
+        return None
     except psycopg2.OperationalError as e:
         print(f"❌ Error operacional PostgreSQL: {e}")
         return None
@@ -6387,6 +6274,16 @@ def get_db():
         return None
 
 
+@frontend_bp.route('/api/admin/system/db-pool')
+@role_required(['admin'])
+def api_db_pool_stats():
+    """Métricas del pool de conexiones PostgreSQL"""
+    return jsonify({
+        'success': True,
+        'pool': current_app.extensions['db_pool'].stats()
+    })
+
+
 # =============== CREAR TABLAS SI NO EXISTEN ===============
 def ensure_billing_tables():
     """Las tablas ya existen - solo verificar conexión"""
@@ -6407,7 +6304,6 @@ def ensure_billing_tables():
         tables = [row[0] for row in cur.fetchall()]
 
         cur.close()
-        conn.close()
 
         if 'invoices' in tables and 'invoice_items' in tables:
             print("✅ Tablas de facturación existen en la base de datos")
@@ -6422,13 +6318,68 @@ def ensure_billing_tables():
 
 
 # =============== OBTENER FACTURAS ===============
+INVOICE_PAGE_SIZE = 100
+INVOICE_MAX_PAGE_SIZE = 500
+
+
+def billing_invoice_filters():
+    """
+    Condiciones SQL para ?client_id=&status=&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+    (fechas incluidas); lanza ValueError si una fecha no tiene ese formato o client_id
+    no es un UUID
+    """
+    conditions, params = [], []
+    if request.args.get('start_date'):
+        conditions.append(f'{INVOICE_SORT_KEY} >= %s')
+        params.append(datetime.strptime(request.args['start_date'], '%Y-%m-%d'))
+    if request.args.get('end_date'):
+        conditions.append(f'{INVOICE_SORT_KEY} < %s')
+        params.append(datetime.strptime(request.args['end_date'], '%Y-%m-%d') + timedelta(days=1))
+    if request.args.get('status'):
+        conditions.append('i.status = %s')
+        params.append(request.args['status'])
+    if request.args.get('client_id'):
+        conditions.append('i.client_id = %s')
+        params.append(str(uuid.UUID(request.args['client_id'])))
+    return conditions, params
+
+
+def sql_where(conditions):
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+
+def encode_invoice_cursor(sort_key, invoice_id):
+    """Cursor opaco con la clave (INVOICE_SORT_KEY, id) de la última factura de la página"""
+    raw = json.dumps([sort_key.isoformat(), str(invoice_id)])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_invoice_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    sort_key, invoice_id = json.loads(raw)
+    return datetime.fromisoformat(sort_key), str(uuid.UUID(invoice_id))
+
+
 @frontend_bp.route('/api/admin/billing/invoices')
 @role_required(['admin'])
 def api_billing_get_invoices():
-    """Obtener facturas desde la base de datos - VERSIÓN CORREGIDA"""
+    """
+    Facturas paginadas por cursor sobre (INVOICE_SORT_KEY, id), de la más reciente a la más
+    antigua: ?limit=&cursor=&client_id=&status=&start_date=&end_date=. La primera página
+    incluye los totales del filtro calculados en la misma consulta.
+    """
     try:
-        print("📊 Obteniendo facturas desde la base de datos...")
+        limit = max(1, min(request.args.get('limit', INVOICE_PAGE_SIZE, type=int), INVOICE_MAX_PAGE_SIZE))
+        filters, filter_params = billing_invoice_filters()
+        cursor = request.args.get('cursor')
+        after = decode_invoice_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({
+            'success': False,
+            'message': 'Parámetros de paginación o filtros inválidos'
+        }), 400
 
+    try:
         conn = get_db()
         if not conn:
             return jsonify({
@@ -6438,8 +6389,14 @@ def api_billing_get_invoices():
 
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        # Consulta usando SOLO las columnas que existen
-        query = """
+        # Seguir justo después de la última factura vista: usa el índice (INVOICE_SORT_KEY, id)
+        # y cuesta lo mismo en la página 1 que en la 1000 (sin OFFSET)
+        page_conditions, page_params = list(filters), list(filter_params)
+        if after:
+            page_conditions.append(f'({INVOICE_SORT_KEY}, i.id) < (%s, %s)')
+            page_params.extend(after)
+
+        page_query = f"""
             SELECT i.id, i.client_id, i.pet_id, i.appointment_id,
                    i.total_amount, i.subtotal, i.tax_amount, i.medications_cost,
                    i.payment_method, i.status, i.observations, 
@@ -6447,20 +6404,55 @@ def api_billing_get_invoices():
                    COALESCE(u.first_name || ' ' || u.last_name, 'Cliente desconocido') as client_name,
                    COALESCE(u.email, '') as client_email,
                    COALESCE(p.name, 'Mascota desconocida') as pet_name,
-                   COALESCE(p.species, '') as pet_species
+                   COALESCE(p.species, '') as pet_species,
+                   {INVOICE_SORT_KEY} AS sort_key
             FROM invoices i
             LEFT JOIN users u ON i.client_id = u.id
             LEFT JOIN pets p ON i.pet_id = p.id
-            ORDER BY i.invoice_date DESC
-            LIMIT 100
+            {sql_where(page_conditions)}
+            ORDER BY {INVOICE_SORT_KEY} DESC, i.id DESC
+            LIMIT %s
         """
-
-        cur.execute(query)
+        # Una fila de más para saber si hay otra página
+        page_params.append(limit + 1)
+
+        if after is None:
+            cur.execute(f"""
+                WITH page AS ({page_query}),
+                totals AS (
+                    SELECT COUNT(*) AS totals_count,
+                           COALESCE(SUM(i.total_amount), 0) AS totals_amount,
+                           COALESCE(SUM(i.total_amount) FILTER (WHERE i.status = 'paid'), 0) AS totals_paid_amount,
+                           COUNT(*) FILTER (WHERE i.status = 'pending') AS totals_pending_count
+                    FROM invoices i
+                    {sql_where(filters)}
+                )
+                SELECT page.*, totals.*
+                FROM totals LEFT JOIN page ON TRUE
+                ORDER BY page.sort_key DESC, page.id DESC
+            """, page_params + filter_params)
+        else:
+            cur.execute(page_query, page_params)
         rows = cur.fetchall()
+        cur.close()
+
+        totals = None
+        if after is None and rows:
+            first = rows[0]
+            totals = {
+                'count': first['totals_count'],
+                'total_amount': float(first['totals_amount']),
+                'paid_amount': float(first['totals_paid_amount']),
+                'pending_count': first['totals_pending_count']
+            }
 
-        invoices = []
+        invoices, sort_keys = [], []
         for row in rows:
-            invoice = dict(row)
+            if row['id'] is None:
+                continue  # sin facturas: solo llegó la fila de totales
+            sort_keys.append(row['sort_key'])
+            invoice = {key: value for key, value in row.items()
+                       if not key.startswith('totals_') and key != 'sort_key'}
             # Convertir Decimal a float para JSON
             for key, value in invoice.items():
                 if isinstance(value, Decimal):
@@ -6469,16 +6461,24 @@ def api_billing_get_invoices():
                     invoice[key] = value.isoformat()
             invoices.append(invoice)
 
-        cur.close()
-        conn.close()
+        has_more = len(invoices) > limit
+        invoices = invoices[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_invoice_cursor(sort_keys[limit - 1], invoices[-1]['id'])
 
         print(f"✅ {len(invoices)} facturas obtenidas desde la base de datos")
 
-        return jsonify({
+        response = {
             'success': True,
             'invoices': invoices,
-            'total': len(invoices)
-        })
+            'total': len(invoices),
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+        if totals is not None:
+            response['totals'] = totals
+        return jsonify(response)
 
     except Exception as e:
         print(f"❌ Error obteniendo facturas: {e}")
@@ -6491,10 +6491,180 @@ def api_billing_get_invoices():
 
 
 # =============== CREAR FACTURA ===============
+class InsufficientStock(Exception):
+    """Algún medicamento facturado no tiene stock suficiente"""
+
+    def __init__(self, medication_ids):
+        super().__init__(f"Stock insuficiente para: {', '.join(medication_ids)}")
+        self.medication_ids = medication_ids
+
+
+class UnknownMedications(Exception):
+    """Algún medicamento facturado no existe en el inventario"""
+
+    def __init__(self, medication_ids):
+        super().__init__(f"Medicamentos no encontrados: {', '.join(medication_ids)}")
+        self.medication_ids = medication_ids
+
+
+def invoice_medications_error(medications):
+    """Mensaje de error si algún medicamento tiene id, cantidad o precio inválidos (None si todos son válidos)"""
+    for index, med in enumerate(medications, start=1):
+        if not isinstance(med, dict):
+            return f'Medicamento {index}: formato inválido'
+        if med.get('id'):
+            try:
+                uuid.UUID(str(med['id']))
+            except ValueError:
+                return f'Medicamento {index}: id inválido'
+        quantity = med.get('quantity', 1)
+        if isinstance(quantity, str) and quantity.strip().isdigit():
+            quantity = int(quantity)
+        if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) \
+                or not 1 <= quantity < float('inf') or quantity != int(quantity):
+            return f'Medicamento {index}: la cantidad debe ser un entero mayor o igual a 1'
+        try:
+            unit_price = float(med.get('unit_price', 0))
+        except (TypeError, ValueError):
+            return f'Medicamento {index}: el precio unitario debe ser un número'
+        if not 0 <= unit_price < float('inf'):
+            return f'Medicamento {index}: el precio unitario debe ser un número no negativo'
+    return None
+
+
+def invoice_request_hash(data):
+    """Hash de los campos que determinan la factura (para detectar reutilizar una clave con otros datos)"""
+    relevant = {
+        'client_id': data.get('client_id'),
+        'pet_id': data.get('pet_id'),
+        'appointment_id': data.get('appointment_id'),
+        'payment_method': data.get('payment_method', 'cash'),
+        'status': data.get('status', 'paid'),
+        'observations': data.get('observations', ''),
+        'medications': [
+            [med.get('id'), med.get('name'), int(med.get('quantity', 1)), float(med.get('unit_price', 0))]
+            for med in data.get('medications', [])
+        ]
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def decrement_billed_stock(cur, invoice_id, user_id, medications):
+    """
+    Descontar el stock de todos los medicamentos facturados en una sola sentencia y
+    registrar sus movimientos de salida; UnknownMedications si alguno no existe e
+    InsufficientStock si alguno no alcanza (cantidades ya validadas, >= 1)
+    """
+    billed = {}
+    for med in medications:
+        if med.get('id'):
+            billed[str(med['id'])] = billed.get(str(med['id']), 0) + int(med.get('quantity', 1))
+    if not billed:
+        return []
+
+    values = ','.join(cur.mogrify('(%s::uuid, %s::integer)', item).decode('utf-8') for item in billed.items())
+    cur.execute(f"""
+        WITH billed (medication_id, quantity) AS (VALUES {values}),
+        updated AS (
+            UPDATE medications m
+            SET stock_quantity = m.stock_quantity - b.quantity,
+                updated_at = CURRENT_TIMESTAMP
+            FROM billed b
+            WHERE m.id = b.medication_id AND m.stock_quantity >= b.quantity
+            RETURNING m.id, b.quantity, m.stock_quantity + b.quantity AS previous_stock, m.stock_quantity AS new_stock
+        ),
+        movements AS (
+            INSERT INTO stock_movements (
+                id, medication_id, movement_type, quantity, previous_stock, new_stock,
+                reason, reference_id, user_id, created_at
+            )
+            SELECT uuid_generate_v4(), id, 'out', quantity, previous_stock, new_stock,
+                   'Venta (factura)', %s, %s, CURRENT_TIMESTAMP
+            FROM updated
+        )
+        SELECT id, new_stock FROM updated
+    """, (invoice_id, user_id))
+    updated = {str(row[0]): row[1] for row in cur.fetchall()}
+
+    missing = [medication_id for medication_id in billed if medication_id not in updated]
+    if missing:
+        # Separar los que no existen de los que no tienen stock (solo en el camino de error)
+        cur.execute("SELECT id FROM medications WHERE id = ANY(%s::uuid[])", (missing,))
+        existing = {str(row[0]) for row in cur.fetchall()}
+        unknown = [medication_id for medication_id in missing if medication_id not in existing]
+        if unknown:
+            raise UnknownMedications(unknown)
+        raise InsufficientStock(missing)
+    return [{'medication_id': medication_id, 'new_stock': new_stock} for medication_id, new_stock in updated.items()]
+
+
+def apply_invoice_to_rollups(cur, invoice_date, subtotal, tax_amount, total_amount, medications):
+    """
+    Sumar la factura a los rollups del día, del mes y de medicamentos del mes, dentro
+    de la misma transacción que la crea (si se revierte, los rollups también)
+    """
+    item_count = sum(int(med.get('quantity', 1)) for med in medications)
+    cur.execute("""
+        WITH daily AS (
+            INSERT INTO billing_daily_rollups AS r (day, invoice_count, revenue, subtotal, tax, item_count, updated_at)
+            VALUES (%(day)s, 1, %(revenue)s, %(subtotal)s, %(tax)s, %(items)s, CURRENT_TIMESTAMP)
+            ON CONFLICT (day) DO UPDATE SET
+                invoice_count = r.invoice_count + 1,
+                revenue = r.revenue + EXCLUDED.revenue,
+                subtotal = r.subtotal + EXCLUDED.subtotal,
+                tax = r.tax + EXCLUDED.tax,
+                item_count = r.item_count + EXCLUDED.item_count,
+                updated_at = CURRENT_TIMESTAMP
+        )
+        INSERT INTO billing_monthly_rollups AS r (month, invoice_count, revenue, subtotal, tax, item_count, updated_at)
+        VALUES (%(month)s, 1, %(revenue)s, %(subtotal)s, %(tax)s, %(items)s, CURRENT_TIMESTAMP)
+        ON CONFLICT (month) DO UPDATE SET
+            invoice_count = r.invoice_count + 1,
+            revenue = r.revenue + EXCLUDED.revenue,
+            subtotal = r.subtotal + EXCLUDED.subtotal,
+            tax = r.tax + EXCLUDED.tax,
+            item_count = r.item_count + EXCLUDED.item_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, {
+        'day': invoice_date.date(),
+        'month': month_start(invoice_date.date()),
+        'revenue': total_amount,
+        'subtotal': subtotal,
+        'tax': tax_amount,
+        'items': item_count
+    })
+
+    # ON CONFLICT no puede tocar dos veces la misma fila: agrupar antes los repetidos
+    by_medication = {}
+    for med in medications:
+        key = str(med['id']) if med.get('id') else f"name:{(med.get('name') or 'Medicamento').strip().lower()}"
+        quantity = int(med.get('quantity', 1))
+        entry = by_medication.setdefault(key, [med.get('id'), med.get('name', 'Medicamento'), 0, 0.0])
+        entry[2] += quantity
+        entry[3] += quantity * float(med.get('unit_price', 0))
+
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO billing_medication_rollups AS r (month, medication_key, medication_id, item_name, quantity, revenue)
+        VALUES %s
+        ON CONFLICT (month, medication_key) DO UPDATE SET
+            item_name = EXCLUDED.item_name,
+            quantity = r.quantity + EXCLUDED.quantity,
+            revenue = r.revenue + EXCLUDED.revenue
+    """, [
+        (month_start(invoice_date.date()), key, medication_id, name, quantity, revenue)
+        for key, (medication_id, name, quantity, revenue) in by_medication.items()
+    ], page_size=len(by_medication))
+
+
 @frontend_bp.route('/api/admin/billing/invoices', methods=['POST'])
 @role_required(['admin'])
 def api_billing_create_invoice():
-    """Crear factura en la base de datos - VERSIÓN CORREGIDA PARA TU ESQUEMA"""
+    """
+    Crear factura, sus items y el descuento de inventario en una sola transacción.
+    Con la cabecera Idempotency-Key (o 'idempotency_key' en el cuerpo) un reintento
+    devuelve la misma factura en vez de crear otra.
+    """
+    conn = None
     try:
         data = request.get_json()
         print(f"📝 Creando factura con datos: {data}")
@@ -6512,6 +6682,16 @@ def api_billing_create_invoice():
                 'message': 'Debe incluir al menos un medicamento'
             }), 400
 
+        medications_error = invoice_medications_error(data['medications'])
+        if medications_error:
+            return jsonify({
+                'success': False,
+                'message': medications_error
+            }), 400
+
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        request_hash = invoice_request_hash(data)
+
         conn = get_db()
         if not conn:
             return jsonify({
@@ -6530,10 +6710,51 @@ def api_billing_create_invoice():
 
         print(f"💰 Subtotal: {subtotal}, Impuesto: {tax_amount}, Total: {total_amount}")
 
-        # Crear factura usando SOLO las columnas que existen en tu base de datos
         invoice_id = str(uuid.uuid4())
         invoice_date = datetime.now()
 
+        # Reservar la clave: si ya existe, otra petición creó (o está creando) esta factura;
+        # la restricción única hace esperar a la segunda hasta que la primera confirme
+        if idempotency_key:
+            cur.execute("""
+                INSERT INTO invoice_idempotency_keys (idempotency_key, request_hash, invoice_id, created_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING idempotency_key
+            """, (idempotency_key, request_hash, invoice_id, invoice_date))
+
+            if cur.fetchone() is None:
+                conn.rollback()
+                cur.execute("""
+                    SELECT request_hash, response FROM invoice_idempotency_keys
+                    WHERE idempotency_key = %s
+                """, (idempotency_key,))
+                stored = cur.fetchone()
+                cur.close()
+
+                if stored is not None and stored[0] != request_hash:
+                    return jsonify({
+                        'success': False,
+                        'message': 'La clave de idempotencia ya se usó con otros datos de factura'
+                    }), 409
+
+                if stored is None or stored[1] is None:
+                    # Mismos datos, pero el primer intento aún no terminó (o se acaba de revertir):
+                    # el cliente puede repetir la petición con la misma clave
+                    response = jsonify({
+                        'success': False,
+                        'in_progress': True,
+                        'message': 'La factura con esta clave de idempotencia está en proceso, reintente en unos segundos'
+                    })
+                    response.status_code = 409
+                    response.headers['Retry-After'] = '1'
+                    return response
+
+                print(f"♻️ Factura ya creada para la clave {idempotency_key}: {stored[1]['invoice']['id']}")
+                response = jsonify(stored[1])
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
         # COLUMNAS CORRECTAS según tu esquema:
         # id, appointment_id, client_id, total_amount, consultation_fee, medications_cost,
         # exams_cost, payment_status, payment_date, created_at, pet_id, payment_method,
@@ -6563,42 +6784,39 @@ def api_billing_create_invoice():
             invoice_date  # payment_date = now for paid invoices
         ))
 
-        # Crear items de factura usando las columnas correctas
-        for med in medications:
-            item_id = str(uuid.uuid4())
-            quantity = int(med.get('quantity', 1))
-            unit_price = float(med.get('unit_price', 0))
-            total_price = quantity * unit_price
-
-            # COLUMNAS CORRECTAS para invoice_items:
-            # id, invoice_id, medication_id, item_name, item_description,
-            # presentation, concentration, quantity, unit_price, total_price, created_at
-
-            cur.execute("""
-                INSERT INTO invoice_items (
-                    id, invoice_id, medication_id, item_name, item_description,
-                    presentation, concentration, quantity, unit_price, total_price, created_at
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                item_id,
+        # Todos los items en una sola sentencia INSERT ... VALUES (...), (...)
+        # COLUMNAS CORRECTAS para invoice_items:
+        # id, invoice_id, medication_id, item_name, item_description,
+        # presentation, concentration, quantity, unit_price, total_price, created_at
+        item_rows = [
+            (
+                str(uuid.uuid4()),
                 invoice_id,
                 med.get('id'),
                 med.get('name', 'Medicamento'),
                 med.get('description', ''),
                 med.get('presentation', ''),
                 med.get('concentration', ''),
-                quantity,
-                unit_price,
-                total_price,
+                int(med.get('quantity', 1)),
+                float(med.get('unit_price', 0)),
+                int(med.get('quantity', 1)) * float(med.get('unit_price', 0)),
                 invoice_date
-            ))
+            )
+            for med in medications
+        ]
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO invoice_items (
+                id, invoice_id, medication_id, item_name, item_description,
+                presentation, concentration, quantity, unit_price, total_price, created_at
+            )
+            VALUES %s
+        """, item_rows, page_size=len(item_rows))
 
-        conn.commit()
-        cur.close()
-        conn.close()
+        user = current_auth_user() or {}
+        stock = decrement_billed_stock(cur, invoice_id, user.get('id'), medications)
 
-        print(f"✅ Factura creada exitosamente: {invoice_id}")
+        # Estadísticas precalculadas: los dashboards leen unas pocas filas de rollup
+        apply_invoice_to_rollups(cur, invoice_date, subtotal, tax_amount, total_amount, medications)
 
         # Retornar datos de la factura creada
         invoice_data = {
@@ -6614,14 +6832,46 @@ def api_billing_create_invoice():
             'invoice_date': invoice_date.isoformat(),
             'medications': medications
         }
-
-        return jsonify({
+        result = {
             'success': True,
             'message': 'Factura creada exitosamente',
-            'invoice': invoice_data
-        })
+            'invoice': invoice_data,
+            'stock': stock
+        }
+
+        if idempotency_key:
+            cur.execute("""
+                UPDATE invoice_idempotency_keys SET response = %s
+                WHERE idempotency_key = %s
+            """, (psycopg2.extras.Json(result), idempotency_key))
+
+        conn.commit()
+        cur.close()
+
+        print(f"✅ Factura creada exitosamente: {invoice_id}")
+
+        return jsonify(result)
+
+    except UnknownMedications as e:
+        conn.rollback()
+        print(f"⚠️ Factura no creada: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Uno o más medicamentos no existen en el inventario',
+            'medication_ids': e.medication_ids
+        }), 400
+
+    except InsufficientStock as e:
+        conn.rollback()
+        print(f"⚠️ Factura no creada: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Stock insuficiente para uno o más medicamentos',
+            'medication_ids': e.medication_ids
+        }), 409
 
     except Exception as e:
+        # La conexión vuelve al pool con rollback: no queda nada a medias
         print(f"❌ Error creando factura: {e}")
         import traceback
         traceback.print_exc()
@@ -6635,8 +6885,23 @@ def api_billing_create_invoice():
 @frontend_bp.route('/api/admin/billing/invoices/<invoice_id>/pdf')
 @role_required(['admin'])
 def api_billing_generate_pdf(invoice_id):
-    """Generar PDF de factura"""
+    """PDF de factura (cacheado en disco por id y hash del contenido, con ETag)"""
+    try:
+        uuid.UUID(invoice_id)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Factura no encontrada'
+        }), 404
+
     try:
+        pdf_cache = current_app.extensions['invoice_pdf_cache']
+
+        # PDF generado hace poco: ni consulta ni render, solo enviar el archivo (o 304)
+        cached = None if request.args.get('refresh') else pdf_cache.lookup(invoice_id)
+        if cached:
+            return send_invoice_pdf(invoice_id, *cached)
+
         print(f"📄 Generando PDF para factura: {invoice_id}")
 
         conn = get_db()
@@ -6664,6 +6929,8 @@ def api_billing_generate_pdf(invoice_id):
 
         invoice = cur.fetchone()
         if not invoice:
+            cur.close()
+            pdf_cache.invalidate(invoice_id)
             return jsonify({
                 'success': False,
                 'message': 'Factura no encontrada'
@@ -6678,19 +6945,10 @@ def api_billing_generate_pdf(invoice_id):
         items = cur.fetchall()
 
         cur.close()
-        conn.close()
-
-        # Generar contenido HTML para PDF
-        html_content = generate_invoice_pdf_content(dict(invoice), [dict(item) for item in items])
 
-        # Retornar como HTML para que el navegador lo convierta a PDF
-        return Response(
-            html_content,
-            mimetype='text/html',
-            headers={
-                'Content-Disposition': f'inline; filename=factura_{invoice_id}.html'
-            }
-        )
+        # Solo se vuelve a generar si cambió algo de lo que aparece en el PDF
+        content_hash, path = pdf_cache.get_or_render(invoice_id, dict(invoice), [dict(item) for item in items])
+        return send_invoice_pdf(invoice_id, content_hash, path)
 
     except Exception as e:
         print(f"❌ Error generando PDF: {e}")
@@ -6700,368 +6958,212 @@ def api_billing_generate_pdf(invoice_id):
         }), 500
 
 
-def generate_invoice_pdf_content(invoice, items):
-    """Generar contenido HTML para PDF de factura"""
+def send_invoice_pdf(invoice_id, content_hash, path):
+    """Enviar el PDF cacheado; el navegador revalida con If-None-Match (304 sin leer el disco)"""
+    etag = f"{invoice_id}.{content_hash}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = send_file(path, mimetype='application/pdf', download_name=f'factura_{invoice_id}.pdf',
+                             etag=False, conditional=False, max_age=0)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
-    # Calcular totales
-    subtotal = sum(float(item.get('total_price', 0)) for item in items)
-    tax_amount = float(invoice.get('tax_amount', 0))
-    total = float(invoice.get('total_amount', 0))
 
-    items_html = ""
-    for item in items:
-        items_html += f"""
-        <tr>
-            <td>{item.get('item_name', 'Medicamento')}</td>
-            <td style="text-align: center;">{item.get('quantity', 1)}</td>
-            <td style="text-align: right;">${float(item.get('unit_price', 0)):,.2f}</td>
-            <td style="text-align: right;"><strong>${float(item.get('total_price', 0)):,.2f}</strong></td>
-        </tr>
-        """
+# =============== EXPORTAR XLSX / CSV ===============
+@frontend_bp.route('/api/admin/billing/export/excel')
+@role_required(['admin'])
+def api_billing_export_excel():
+    """
+    Exportar facturas a XLSX (?include_items=1 añade la hoja de items) o a CSV (?format=csv).
+    Con más de XLSX_EXPORT_ASYNC_THRESHOLD facturas (o ?background=1) el XLSX se genera en
+    segundo plano y se responde 202 con el trabajo a consultar.
+    """
+    try:
+        conditions, params = billing_invoice_filters()
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Filtros inválidos: las fechas deben tener el formato YYYY-MM-DD y client_id debe ser un UUID'
+        }), 400
+    where = sql_where(conditions)
 
-    return f"""
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Factura #{invoice.get('id', 'N/A')}</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 0;
-                padding: 20px;
-                color: #2D6A4F;
-                line-height: 1.6;
-                background: white;
-            }}
-            .invoice-container {{
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 40px;
-                box-shadow: 0 0 20px rgba(0,0,0,0.1);
-            }}
-            .header {{
-                text-align: center;
-                border-bottom: 3px solid #52B788;
-                padding-bottom: 30px;
-                margin-bottom: 40px;
-            }}
-            .logo {{
-                font-size: 48px;
-                margin-bottom: 10px;
-            }}
-            .clinic-name {{
-                color: #2D6A4F;
-                font-size: 28px;
-                font-weight: bold;
-                margin-bottom: 10px;
-            }}
-            .clinic-info {{
-                color: #52B788;
-                font-size: 14px;
-                margin-bottom: 20px;
-            }}
-            .invoice-title {{
-                font-size: 24px;
-                font-weight: bold;
-                color: #38A3A5;
-                margin-bottom: 10px;
-            }}
-            .invoice-number {{
-                font-size: 18px;
-                color: #2D6A4F;
-            }}
-            .invoice-details {{
-                display: flex;
-                justify-content: space-between;
-                margin-bottom: 40px;
-                gap: 40px;
-            }}
-            .client-info, .invoice-info {{
-                flex: 1;
-            }}
-            .section-title {{
-                font-size: 16px;
-                font-weight: bold;
-                color: #52B788;
-                margin-bottom: 15px;
-                border-bottom: 1px solid #B7E4C7;
-                padding-bottom: 5px;
-            }}
-            .info-row {{
-                margin-bottom: 8px;
-                display: flex;
-            }}
-            .info-label {{
-                font-weight: bold;
-                color: #2D6A4F;
-                min-width: 100px;
-            }}
-            .info-value {{
-                color: #2D6A4F;
-            }}
-            .items-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 30px 0;
-                box-shadow: 0 5px 15px rgba(0,0,0,0.1);
-            }}
-            .items-table th {{
-                background: #52B788;
-                color: white;
-                padding: 15px 10px;
-                text-align: left;
-                font-weight: bold;
-                border-bottom: 2px solid #2D6A4F;
-            }}
-            .items-table td {{
-                padding: 12px 10px;
-                border-bottom: 1px solid #B7E4C7;
-                color: #2D6A4F;
-            }}
-            .items-table tr:nth-child(even) {{
-                background: #F8FDF9;
-            }}
-            .items-table tr:hover {{
-                background: #D8F3DC;
-            }}
-            .totals-section {{
-                margin-top: 40px;
-                border-top: 2px solid #52B788;
-                padding-top: 20px;
-            }}
-            .totals-table {{
-                width: 300px;
-                margin-left: auto;
-                border-collapse: collapse;
-            }}
-            .totals-table td {{
-                padding: 8px 15px;
-                color: #2D6A4F;
-            }}
-            .totals-table .label {{
-                font-weight: bold;
-                text-align: right;
-                border-right: 1px solid #B7E4C7;
-            }}
-            .totals-table .amount {{
-                text-align: right;
-                font-weight: bold;
-            }}
-            .total-row {{
-                background: #52B788;
-                color: white !important;
-                font-size: 18px;
-            }}
-            .total-row td {{
-                color: white !important;
-                padding: 12px 15px;
-            }}
-            .observations {{
-                margin-top: 30px;
-                padding: 20px;
-                background: #D8F3DC;
-                border-radius: 10px;
-                border-left: 5px solid #52B788;
-            }}
-            .observations-title {{
-                font-weight: bold;
-                color: #2D6A4F;
-                margin-bottom: 10px;
-            }}
-            .footer {{
-                margin-top: 50px;
-                text-align: center;
-                color: #52B788;
-                font-size: 12px;
-                border-top: 1px solid #B7E4C7;
-                padding-top: 20px;
-            }}
-            @media print {{
-                body {{ margin: 0; padding: 0; }}
-                .invoice-container {{ box-shadow: none; }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="invoice-container">
-            <!-- HEADER -->
-            <div class="header">
-                <div class="logo">🏥</div>
-                <div class="clinic-name">CLÍNICA VETERINARIA</div>
-                <div class="clinic-info">
-                    NIT: 123.456.789-0 | Tel: (601) 234-5678<br>
-                    Dirección: Calle 123 #45-67, Bogotá, Colombia<br>
-                    Email: info@clinicaveterinaria.com
-                </div>
-                <div class="invoice-title">FACTURA DE VENTA</div>
-                <div class="invoice-number">No. {invoice.get('id', 'N/A')}</div>
-            </div>
+    conn = get_db()
+    if not conn:
+        return jsonify({
+            'success': False,
+            'message': 'Error conectando a la base de datos'
+        }), 500
 
-            <!-- DETALLES DE FACTURA -->
-            <div class="invoice-details">
-                <div class="client-info">
-                    <div class="section-title">👤 INFORMACIÓN DEL CLIENTE</div>
-                    <div class="info-row">
-                        <span class="info-label">Nombre:</span>
-                        <span class="info-value">{invoice.get('client_name', 'Cliente desconocido')}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="info-label">Email:</span>
-                        <span class="info-value">{invoice.get('client_email', 'N/A')}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="info-label">Teléfono:</span>
-                        <span class="info-value">{invoice.get('client_phone', 'N/A')}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="info-label">Mascota:</span>
-                        <span class="info-value">{invoice.get('pet_name', 'N/A')} ({invoice.get('pet_species', '')})</span>
-                    </div>
-                </div>
+    if request.args.get('format') == 'csv':
+        print(f"📊 Exportando facturas a CSV (filtros: {dict(request.args)})...")
+        return export_invoices_csv(conn, where, params)
 
-                <div class="invoice-info">
-                    <div class="section-title">📋 INFORMACIÓN DE FACTURA</div>
-                    <div class="info-row">
-                        <span class="info-label">Fecha:</span>
-                        <span class="info-value">{invoice.get('invoice_date', '')[:10] if invoice.get('invoice_date') else 'N/A'}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="info-label">Hora:</span>
-                        <span class="info-value">{invoice.get('invoice_date', '')[-8:-3] if invoice.get('invoice_date') else 'N/A'}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="info-label">Método Pago:</span>
-                        <span class="info-value">{invoice.get('payment_method', 'N/A').title()}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="info-label">Estado:</span>
-                        <span class="info-value">{invoice.get('status', 'N/A').title()}</span>
-                    </div>
-                </div>
-            </div>
+    include_items = request.args.get('include_items', '').lower() in ('1', 'true', 'yes')
+    print(f"📊 Exportando facturas a XLSX (filtros: {dict(request.args)})...")
 
-            <!-- TABLA DE MEDICAMENTOS -->
-            <table class="items-table">
-                <thead>
-                    <tr>
-                        <th>💊 Medicamento/Servicio</th>
-                        <th style="text-align: center;">Cantidad</th>
-                        <th style="text-align: right;">Precio Unitario</th>
-                        <th style="text-align: right;">Total</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {items_html if items_html else '<tr><td colspan="4" style="text-align: center;">No hay medicamentos registrados</td></tr>'}
-                </tbody>
-            </table>
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM invoices i {where}", params)
+        invoice_count = cur.fetchone()[0]
+        cur.close()
 
-            <!-- TOTALES -->
-            <div class="totals-section">
-                <table class="totals-table">
-                    <tr>
-                        <td class="label">Subtotal:</td>
-                        <td class="amount">${subtotal:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td class="label">IVA (19%):</td>
-                        <td class="amount">${tax_amount:,.2f}</td>
-                    </tr>
-                    <tr class="total-row">
-                        <td class="label">TOTAL:</td>
-                        <td class="amount">${total:,.2f}</td>
-                    </tr>
-                </table>
-            </div>
+        export_jobs = current_app.extensions.get('export_jobs')
+        threshold = current_app.config.get('XLSX_EXPORT_ASYNC_THRESHOLD', 20000)
+        if export_jobs and (invoice_count > threshold or request.args.get('background') == '1'):
+            user = current_auth_user() or {}
+            job = export_jobs.submit(current_app.extensions['db_pool'], user.get('id'), where, params,
+                                     include_items, filters=request.args.to_dict())
+            print(f"⏳ Exportación de {invoice_count} facturas en segundo plano ({job['id']})")
+            return jsonify({
+                'success': True,
+                'message': 'La exportación se está generando',
+                'job': export_job_payload(job)
+            }), 202
+
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            invoices, items = write_invoices_xlsx(conn, where, params, path, include_items)
+        except Exception:
+            os.remove(path)
+            raise
+        print(f"✅ XLSX generado exitosamente ({invoices} facturas, {items} items)")
+
+        response = send_file(path, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                             download_name=f'facturas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+                             etag=False, conditional=False, max_age=0)
+        response.call_on_close(lambda: os.remove(path))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    except Exception as e:
+        print(f"❌ Error exportando XLSX: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Error exportando facturas: {str(e)}'
+        }), 500
+
+
+def export_job_payload(job):
+    payload = {key: job.get(key) for key in ('id', 'status', 'include_items', 'invoices', 'items', 'error')}
+    payload['created_at'] = datetime.fromtimestamp(job['created_at']).isoformat()
+    payload['status_url'] = url_for('frontend.api_billing_export_job_status', job_id=job['id'])
+    if job['status'] == 'done':
+        payload['download_url'] = url_for('frontend.api_billing_export_job_download', job_id=job['id'])
+    return payload
+
+
+def get_own_export_job(job_id):
+    """Trabajo de exportación del usuario actual (None si no existe o es de otro usuario)"""
+    export_jobs = current_app.extensions.get('export_jobs')
+    job = export_jobs.get(job_id) if export_jobs else None
+    user = current_auth_user() or {}
+    if job is None or job.get('user_id') != (str(user['id']) if user.get('id') else None):
+        return None
+    return job
 
-            <!-- OBSERVACIONES -->
-            {f'''
-            <div class="observations">
-                <div class="observations-title">📝 Observaciones:</div>
-                <div>{invoice.get("observations", "")}</div>
-            </div>
-            ''' if invoice.get('observations') else ''}
 
-            <!-- PIE DE PÁGINA -->
-            <div class="footer">
-                <p><strong>¡Gracias por confiar en nosotros para el cuidado de tu mascota!</strong></p>
-                <p>Esta factura fue generada el {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-                <p>Para consultas sobre esta factura, contáctanos al (601) 234-5678</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+@frontend_bp.route('/api/admin/billing/export/jobs/<job_id>')
+@role_required(['admin'])
+def api_billing_export_job_status(job_id):
+    job = get_own_export_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Exportación no encontrada'}), 404
+    return jsonify({'success': True, 'job': export_job_payload(job)})
 
-# =============== EXPORTAR CSV ===============
-@frontend_bp.route('/api/admin/billing/export/excel')
+
+@frontend_bp.route('/api/admin/billing/export/jobs/<job_id>/download')
 @role_required(['admin'])
-def api_billing_export_csv():
-    """Exportar facturas a CSV"""
-    try:
-        print("📊 Exportando facturas a CSV...")
+def api_billing_export_job_download(job_id):
+    job = get_own_export_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Exportación no encontrada'}), 404
+    if job['status'] != 'done':
+        return jsonify({
+            'success': False,
+            'message': 'La exportación todavía no está lista',
+            'job': export_job_payload(job)
+        }), 409
 
-        conn = get_db()
-        if not conn:
-            return jsonify({
-                'success': False,
-                'message': 'Error conectando a la base de datos'
-            }), 500
+    created = datetime.fromtimestamp(job['created_at']).strftime('%Y%m%d_%H%M%S')
+    response = send_file(current_app.extensions['export_jobs'].file_path(job_id), mimetype=XLSX_MIMETYPE,
+                         as_attachment=True, download_name=f'facturas_{created}.xlsx', max_age=0)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
 
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        cur.execute("""
-            SELECT i.id, i.invoice_date, 
-                   COALESCE(u.first_name || ' ' || u.last_name, 'Cliente desconocido') as cliente,
-                   COALESCE(p.name, 'Mascota desconocida') as mascota, 
-                   i.total_amount, i.payment_method, i.status
-            FROM invoices i
-            LEFT JOIN users u ON i.client_id::UUID = u.id
-            LEFT JOIN pets p ON i.pet_id::UUID = p.id
-            ORDER BY i.invoice_date DESC
-        """)
+def export_invoices_csv(conn, where, params):
+    """Facturas en CSV en streaming (cursor del servidor, memoria constante)"""
 
-        output = io.StringIO()
+    def generate():
         import csv
+
+        output = io.StringIO()
         writer = csv.writer(output)
 
         # Escribir encabezados
         writer.writerow(['ID', 'Fecha', 'Cliente', 'Mascota', 'Total', 'Método de Pago', 'Estado'])
+        yield output.getvalue()
 
-        # Escribir datos
-        for row in cur.fetchall():
-            writer.writerow([
-                row['id'],
-                row['invoice_date'].strftime('%Y-%m-%d %H:%M:%S') if row['invoice_date'] else '',
-                row['cliente'],
-                row['mascota'],
-                float(row['total_amount']) if row['total_amount'] else 0,
-                row['payment_method'],
-                row['status']
-            ])
-
-        cur.close()
-        conn.close()
-
-        output.seek(0)
-
-        print("✅ CSV generado exitosamente")
-
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=facturas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            }
-        )
+        # Cursor con nombre: PostgreSQL entrega las filas por bloques en vez de todas de golpe
+        cur = conn.cursor(name=f"invoice_export_{uuid.uuid4().hex}",
+                          cursor_factory=psycopg2.extras.RealDictCursor)
+        exported = 0
+        try:
+            cur.execute(f"""
+                SELECT i.id, i.invoice_date,
+                       COALESCE(u.first_name || ' ' || u.last_name, 'Cliente desconocido') as cliente,
+                       COALESCE(p.name, 'Mascota desconocida') as mascota,
+                       i.total_amount, i.payment_method, i.status
+                FROM invoices i
+                LEFT JOIN users u ON i.client_id::UUID = u.id
+                LEFT JOIN pets p ON i.pet_id::UUID = p.id
+                {where}
+                ORDER BY {INVOICE_SORT_KEY} DESC, i.id DESC
+            """, params)
+
+            while True:
+                rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+
+                output.seek(0)
+                output.truncate()
+                for row in rows:
+                    writer.writerow([
+                        row['id'],
+                        row['invoice_date'].strftime('%Y-%m-%d %H:%M:%S') if row['invoice_date'] else '',
+                        row['cliente'],
+                        row['mascota'],
+                        float(row['total_amount']) if row['total_amount'] else 0,
+                        row['payment_method'],
+                        row['status']
+                    ])
+                exported += len(rows)
+                yield output.getvalue()
+
+            print(f"✅ CSV generado exitosamente ({exported} facturas)")
 
-    except Exception as e:
-        print(f"❌ Error exportando CSV: {e}")
-        return jsonify({
-             'success': False,
-            'message': f'Error exportando CSV: {str(e)}'
-        }), 500
+        except Exception as e:
+            # Las cabeceras ya se enviaron: solo queda cortar la descarga
+            print(f"❌ Error exportando CSV tras {exported} facturas: {e}")
+            raise
+        finally:
+            cur.close()
+
+    # stream_with_context mantiene la conexión de la petición hasta terminar de enviar
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename=facturas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 
 # =============== FUNCIÓN PARA INICIALIZAR SISTEMA DE FACTURACIÓN ===============
@@ -7073,7 +7175,6 @@ def initialize_billing_system():
     conn = get_db()
     if conn:
         print("✅ Conexión a base de datos exitosa")
-        conn.close()
 
         # Crear tablas si no existen
         if ensure_billing_tables():
@@ -7101,14 +7202,14 @@ def client_medical_history():
 def api_client_pet_medical_history(pet_id):
     """API para obtener historia clínica de una mascota del cliente - VERSIÓN COMPLETA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📋 Cliente {user['id']} solicitando historia de mascota: {pet_id}")
 
         # PASO 1: Verificar que la mascota pertenece al cliente
         verify_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        verify_response = requests.get(verify_url, headers=headers, timeout=10)
+        verify_response = upstream.get(verify_url, headers=headers, timeout=10)
 
         if verify_response.status_code != 200:
             return jsonify({
@@ -7134,7 +7235,7 @@ def api_client_pet_medical_history(pet_id):
 
         # PASO 2: Obtener historia clínica desde Medical Service
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         print(f"📡 Respuesta Medical Service: {response.status_code}")
 
@@ -7144,6 +7245,11 @@ def api_client_pet_medical_history(pet_id):
                 medical_records = data.get('medical_records', [])
 
                 # PASO 3: Enriquecer registros con información adicional
+                # Prescripciones de toda la historia en una sola llamada (no una por visita)
+                prescriptions_by_record = get_prescriptions_by_records(
+                    [record.get('id') for record in medical_records], headers
+                )
+
                 enriched_records = []
                 for record in medical_records:
                     try:
@@ -7151,26 +7257,10 @@ def api_client_pet_medical_history(pet_id):
                         vet_id = record.get('veterinarian_id')
                         if vet_id:
                             try:
-                                # Obtener información del veterinario
-                                users_response = requests.get(
-                                    f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                                    headers=headers,
-                                    timeout=5
-                                )
-
-                                if users_response.status_code == 200:
-                                    users_data = users_response.json()
-                                    if users_data.get('success'):
-                                        vet = next(
-                                            (u for u in users_data['users'] if u['id'] == vet_id),
-                                            None
-                                        )
-                                        if vet:
-                                            record['veterinarian_name'] = f"Dr. {vet['first_name']} {vet['last_name']}"
-                                        else:
-                                            record['veterinarian_name'] = 'Dr. Veterinario'
-                                    else:
-                                        record['veterinarian_name'] = 'Dr. Veterinario'
+                                # Obtener información del veterinario (directorio en memoria)
+                                vet = get_user_directory().get_user(vet_id, headers)
+                                if vet:
+                                    record['veterinarian_name'] = f"Dr. {vet['first_name']} {vet['last_name']}"
                                 else:
                                     record['veterinarian_name'] = 'Dr. Veterinario'
                             except Exception as e:
@@ -7179,26 +7269,8 @@ def api_client_pet_medical_history(pet_id):
                         else:
                             record['veterinarian_name'] = 'Dr. Veterinario'
 
-                        # Obtener prescripciones/medicamentos del registro si existen
-                        record_id = record.get('id')
-                        if record_id:
-                            try:
-                                prescriptions_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/prescriptions/record/{record_id}"
-                                prescriptions_response = requests.get(prescriptions_url, headers=headers, timeout=5)
-
-                                if prescriptions_response.status_code == 200:
-                                    prescriptions_data = prescriptions_response.json()
-                                    if prescriptions_data.get('success'):
-                                        record['medications'] = prescriptions_data.get('prescriptions', [])
-                                    else:
-                                        record['medications'] = []
-                                else:
-                                    record['medications'] = []
-                            except Exception as e:
-                                print(f"⚠️ Error obteniendo prescripciones: {e}")
-                                record['medications'] = []
-                        else:
-                            record['medications'] = []
+                        # Prescripciones/medicamentos del registro si existen
+                        record['medications'] = prescriptions_by_record.get(record.get('id'), [])
 
                         # Asegurar formato de fecha
                         if record.get('created_at'):
@@ -7273,14 +7345,14 @@ def api_client_pet_medical_history(pet_id):
 def api_client_medical_history_summary():
     """API para obtener resumen de historia clínica de todas las mascotas del cliente"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📊 Generando resumen médico para cliente: {user['id']}")
 
         # Obtener todas las mascotas del cliente
         pets_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-        pets_response = requests.get(pets_url, headers=headers, timeout=10)
+        pets_response = upstream.get(pets_url, headers=headers, timeout=10)
 
         if pets_response.status_code != 200:
             return jsonify({
@@ -7309,7 +7381,7 @@ def api_client_medical_history_summary():
         for pet in pets:
             try:
                 records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet['id']}"
-                records_response = requests.get(records_url, headers=headers, timeout=5)
+                records_response = upstream.get(records_url, headers=headers, timeout=5)
 
                 pet_records_count = 0
                 last_visit = None
@@ -7383,13 +7455,13 @@ def api_client_export_medical_history(pet_id):
     """API para exportar historia clínica de una mascota en formato PDF"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📄 Exportando historia clínica de mascota: {pet_id}")
 
         # Verificar que la mascota pertenece al cliente
         verify_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        verify_response = requests.get(verify_url, headers=headers, timeout=10)
+        verify_response = upstream.get(verify_url, headers=headers, timeout=10)
 
         if verify_response.status_code != 200:
             return jsonify({
@@ -7408,7 +7480,7 @@ def api_client_export_medical_history(pet_id):
 
         # Obtener historia clínica completa
         medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{pet_id}"
-        response = requests.get(medical_url, headers=headers, timeout=10)
+        response = upstream.get(medical_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -7639,13 +7711,13 @@ def api_client_download_medical_record_pdf(pet_id, record_id):
     """API para descargar un registro médico específico en formato PDF"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📄 Cliente {user['id']} descargando PDF de registro {record_id} de mascota {pet_id}")
 
         # PASO 1: Verificar que la mascota pertenece al cliente
         verify_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}"
-        verify_response = requests.get(verify_url, headers=headers, timeout=10)
+        verify_response = upstream.get(verify_url, headers=headers, timeout=10)
 
         if verify_response.status_code != 200:
             return jsonify({
@@ -7669,7 +7741,7 @@ def api_client_download_medical_record_pdf(pet_id, record_id):
 
         # PASO 2: Obtener el registro médico específico
         record_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/{record_id}"
-        record_response = requests.get(record_url, headers=headers, timeout=10)
+        record_response = upstream.get(record_url, headers=headers, timeout=10)
 
         if record_response.status_code != 200:
             return jsonify({
@@ -7698,31 +7770,13 @@ def api_client_download_medical_record_pdf(pet_id, record_id):
             # Obtener información del veterinario
             vet_id = medical_record.get('veterinarian_id')
             if vet_id:
-                users_response = requests.get(
-                    f"{current_app.config['AUTH_SERVICE_URL']}/auth/users",
-                    headers=headers,
-                    timeout=5
-                )
-                if users_response.status_code == 200:
-                    users_data = users_response.json()
-                    if users_data.get('success'):
-                        vet = next(
-                            (u for u in users_data['users'] if u['id'] == vet_id),
-                            None
-                        )
-                        if vet:
-                            medical_record['veterinarian_name'] = f"Dr. {vet['first_name']} {vet['last_name']}"
+                vet = get_user_directory().get_user(vet_id, headers)
+                if vet:
+                    medical_record['veterinarian_name'] = f"Dr. {vet['first_name']} {vet['last_name']}"
 
             # Obtener medicamentos prescritos
-            try:
-                prescriptions_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/prescriptions/record/{record_id}"
-                prescriptions_response = requests.get(prescriptions_url, headers=headers, timeout=5)
-                if prescriptions_response.status_code == 200:
-                    prescriptions_data = prescriptions_response.json()
-                    if prescriptions_data.get('success'):
-                        medical_record['medications'] = prescriptions_data.get('prescriptions', [])
-            except:
-                medical_record['medications'] = []
+            prescriptions_by_record = get_prescriptions_by_records([record_id], headers)
+            medical_record['medications'] = prescriptions_by_record.get(record_id, [])
 
         except Exception as e:
             print(f"⚠️ Error enriqueciendo datos: {e}")
@@ -8386,7 +8440,7 @@ def client_profile():
     """Página de perfil del cliente - VERSIÓN CORREGIDA PARA USAR ENDPOINT CORRECTO"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🔍 Usuario en sesión: {user}")
 
@@ -8396,7 +8450,7 @@ def client_profile():
         try:
             # CAMBIO PRINCIPAL: Usar /auth/profile en lugar de /auth/users/{id}
             auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/profile"
-            response = requests.get(auth_url, headers=headers, timeout=10)
+            response = upstream.get(auth_url, headers=headers, timeout=10)
 
             print(f"📡 Respuesta Auth Service /profile: {response.status_code}")
 
@@ -8501,7 +8555,7 @@ def get_client_profile_stats(user_id, headers):
     try:
         # Obtener mascotas del cliente
         pets_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user_id}"
-        pets_response = requests.get(pets_url, headers=headers, timeout=5)
+        pets_response = upstream.get(pets_url, headers=headers, timeout=5)
 
         if pets_response.status_code == 200:
             pets_data = pets_response.json()
@@ -8515,7 +8569,7 @@ def get_client_profile_stats(user_id, headers):
     try:
         # Obtener citas del cliente
         appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user_id}"
-        appointments_response = requests.get(appointments_url, headers=headers, timeout=5)
+        appointments_response = upstream.get(appointments_url, headers=headers, timeout=5)
 
         if appointments_response.status_code == 200:
             appointments_data = appointments_response.json()
@@ -8557,7 +8611,7 @@ def get_client_profile_stats(user_id, headers):
 
     try:
         # Calcular días como cliente
-        user_response = requests.get(
+        user_response = upstream.get(
             f"{current_app.config['AUTH_SERVICE_URL']}/auth/profile",
             headers=headers,
             timeout=5
@@ -8587,7 +8641,7 @@ def api_client_update_profile():
     """API para actualizar perfil del cliente - VERSIÓN CORREGIDA"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         print(f"📝 Cliente {user['id']} actualizando perfil")
@@ -8615,7 +8669,7 @@ def api_client_update_profile():
 
         # USAR ENDPOINT CORRECTO: /auth/profile
         auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/profile"
-        response = requests.put(auth_url, json=update_data, headers=headers, timeout=15)
+        response = upstream.put(auth_url, json=update_data, headers=headers, timeout=15)
 
         print(f"📡 Respuesta Auth Service: {response.status_code}")
 
@@ -8716,7 +8770,7 @@ def api_client_profile_stats():
     """API para obtener estadísticas del perfil del cliente - VERSIÓN MEJORADA"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📊 Obteniendo estadísticas para cliente: {user['id']}")
 
@@ -8733,7 +8787,7 @@ def api_client_profile_stats():
         try:
             print("🐾 Obteniendo mascotas...")
             pets_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/owner/{user['id']}"
-            pets_response = requests.get(pets_url, headers=headers, timeout=10)
+            pets_response = upstream.get(pets_url, headers=headers, timeout=10)
 
             print(f"📡 Respuesta mascotas: {pets_response.status_code}")
 
@@ -8759,7 +8813,7 @@ def api_client_profile_stats():
         try:
             print("📅 Obteniendo citas...")
             appointments_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/client/{user['id']}"
-            appointments_response = requests.get(appointments_url, headers=headers, timeout=10)
+            appointments_response = upstream.get(appointments_url, headers=headers, timeout=10)
 
             print(f"📡 Respuesta citas: {appointments_response.status_code}")
 
@@ -8853,9 +8907,9 @@ def api_client_validate_profile():
         # Verificar si el email ya existe (si es diferente al actual)
         if data.get('email') and data['email'].lower() != current_user.get('email', '').lower():
             try:
-                headers = {'Authorization': f"Bearer {session.get('token')}"}
+                headers = {'Authorization': f"Bearer {current_auth_token()}"}
                 check_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/check-email"
-                check_response = requests.post(check_url,
+                check_response = upstream.post(check_url,
                                                json={'email': data['email']},
                                                headers=headers,
                                                timeout=5)
@@ -8894,7 +8948,7 @@ def veterinarian_dashboard():
     """Dashboard principal para veterinarios"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener estadísticas básicas
         dashboard_stats = {
@@ -8907,7 +8961,7 @@ def veterinarian_dashboard():
         # Intentar obtener datos reales
         try:
             # Citas de hoy
-            appointments_response = requests.get(
+            appointments_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today",
                 headers=headers, timeout=5
             )
@@ -8917,14 +8971,14 @@ def veterinarian_dashboard():
                     dashboard_stats['today_appointments_count'] = len(apt_data.get('appointments', []))
 
             # Pacientes totales
-            patients_response = requests.get(
+            patients_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/patients",
                 headers=headers, timeout=5
             )
             if patients_response.status_code == 200:
                 patients_data = patients_response.json()
                 if patients_data.get('success'):
-                    dashboard_stats['total_patients'] = len(patients_data.get('patients', []))
+                    dashboard_stats['total_patients'] = patients_data.get('total', len(patients_data.get('patients', [])))
 
         except Exception as e:
             print(f"⚠️ Error obteniendo estadísticas del veterinario: {e}")
@@ -8951,12 +9005,12 @@ def veterinarian_schedule():
     """Página de horario del veterinario"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener horarios del veterinario desde la API
         schedule_data = []
         try:
-            schedule_response = requests.get(
+            schedule_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/schedules/{user['id']}",
                 headers=headers, timeout=5
             )
@@ -8975,7 +9029,7 @@ def veterinarian_schedule():
 
         try:
             # Citas de hoy
-            today_response = requests.get(
+            today_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today",
                 headers=headers, timeout=5
             )
@@ -8985,7 +9039,7 @@ def veterinarian_schedule():
                     stats['today_appointments'] = len(today_data.get('appointments', []))
 
             # Citas de la semana
-            week_response = requests.get(
+            week_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/week",
                 headers=headers, timeout=5
             )
@@ -9023,13 +9077,13 @@ def veterinarian_calendar():
     """Página de calendario del veterinario"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener citas del veterinario para el calendario
         appointments_data = []
         try:
             # Obtener citas del mes actual
-            appointments_response = requests.get(
+            appointments_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/month",
                 headers=headers, timeout=5
             )
@@ -9063,7 +9117,7 @@ def get_veterinarian_dashboard_data():
     """API para obtener datos del dashboard del veterinario"""
     try:
         user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         dashboard_data = {
             'success': True,
@@ -9084,7 +9138,7 @@ def get_veterinarian_dashboard_data():
 
         # Obtener citas de hoy
         try:
-            today_response = requests.get(
+            today_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today",
                 headers=headers, timeout=5
             )
@@ -9102,7 +9156,7 @@ def get_veterinarian_dashboard_data():
 
         # Obtener pacientes recientes
         try:
-            patients_response = requests.get(
+            patients_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/recent-patients",
                 headers=headers, timeout=5
             )
@@ -9115,20 +9169,20 @@ def get_veterinarian_dashboard_data():
 
         # Obtener total de pacientes
         try:
-            total_patients_response = requests.get(
+            total_patients_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/patients",
                 headers=headers, timeout=5
             )
             if total_patients_response.status_code == 200:
                 total_data = total_patients_response.json()
                 if total_data.get('success'):
-                    dashboard_data['stats']['total_patients'] = len(total_data.get('patients', []))
+                    dashboard_data['stats']['total_patients'] = total_data.get('total', len(total_data.get('patients', [])))
         except Exception as e:
             print(f"⚠️ Error obteniendo total de pacientes: {e}")
 
         # Obtener historias pendientes
         try:
-            pending_response = requests.get(
+            pending_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/pending-records",
                 headers=headers, timeout=5
             )
@@ -9154,11 +9208,11 @@ def get_veterinarian_dashboard_data():
 def get_veterinarian_schedule_data():
     """API para obtener datos del horario del veterinario"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener horarios del veterinario
-        schedule_response = requests.get(
+        schedule_response = upstream.get(
             f"{current_app.config['APPOINTMENT_SERVICE_URL']}/schedules/{user['id']}",
             headers=headers, timeout=10
         )
@@ -9186,8 +9240,8 @@ def get_veterinarian_schedule_data():
 def get_veterinarian_calendar_data():
     """API para obtener datos del calendario del veterinario"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Obtener parámetros de consulta
         month = request.args.get('month')
@@ -9201,7 +9255,7 @@ def get_veterinarian_calendar_data():
         if year:
             params['year'] = year
 
-        calendar_response = requests.get(url, headers=headers, params=params, timeout=10)
+        calendar_response = upstream.get(url, headers=headers, params=params, timeout=10)
 
         if calendar_response.status_code == 200:
             return jsonify(calendar_response.json())
@@ -9226,8 +9280,8 @@ def get_veterinarian_calendar_data():
 def save_veterinarian_schedule():
     """API para guardar horario del veterinario"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json()
 
         if not data or 'schedules' not in data:
@@ -9248,7 +9302,7 @@ def save_veterinarian_schedule():
                 # Si tiene schedule_id, actualizar; si no, crear nuevo
                 if schedule.get('schedule_id'):
                     # Actualizar horario existente
-                    response = requests.put(
+                    response = upstream.put(
                         f"{current_app.config['APPOINTMENT_SERVICE_URL']}/schedules/{schedule['schedule_id']}",
                         json=schedule,
                         headers=headers,
@@ -9256,7 +9310,7 @@ def save_veterinarian_schedule():
                     )
                 else:
                     # Crear nuevo horario
-                    response = requests.post(
+                    response = upstream.post(
                         f"{current_app.config['APPOINTMENT_SERVICE_URL']}/schedules",
                         json=schedule,
                         headers=headers,
@@ -9532,15 +9586,15 @@ def veterinarian_profile():
 def api_veterinarian_schedule():
     """API para obtener horario del veterinario - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📅 Obteniendo horario para veterinario: {user['id']}")
 
         # MÉTODO 1: Obtener desde Auth Service
         try:
             auth_url = f"{current_app.config['AUTH_SERVICE_URL']}/auth/schedules"
-            response = requests.get(auth_url, headers=headers, timeout=10)
+            response = upstream.get(auth_url, headers=headers, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -9603,8 +9657,8 @@ def api_veterinarian_schedule():
 def api_veterinarian_schedule_stats():
     """API para obtener estadísticas del horario del veterinario - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         stats = {
             'today_appointments': 0,
@@ -9615,7 +9669,7 @@ def api_veterinarian_schedule_stats():
 
         # CITAS DE HOY
         try:
-            today_response = requests.get(
+            today_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today",
                 headers=headers, timeout=5
             )
@@ -9632,7 +9686,7 @@ def api_veterinarian_schedule_stats():
             start_week = datetime.now() - timedelta(days=datetime.now().weekday())
             end_week = start_week + timedelta(days=6)
 
-            week_response = requests.get(
+            week_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}",
                 headers=headers,
                 params={
@@ -9650,7 +9704,7 @@ def api_veterinarian_schedule_stats():
 
         # OBTENER DÍAS LABORALES DESDE HORARIO
         try:
-            schedule_response = requests.get(
+            schedule_response = upstream.get(
                 f"{current_app.config['AUTH_SERVICE_URL']}/auth/schedules",
                 headers=headers, timeout=5
             )
@@ -9687,11 +9741,12 @@ def api_veterinarian_schedule_stats():
 
 @frontend_bp.route('/api/veterinarian/appointments')
 @role_required(['veterinarian'])
+@last_known_good
 def api_veterinarian_appointments():
     """API para obtener citas del veterinario - VERSIÓN CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # Parámetros de filtro
         start_date = request.args.get('start_date')
@@ -9708,13 +9763,17 @@ def api_veterinarian_appointments():
         if end_date:
             params['end_date'] = end_date
 
-        response = requests.get(appointment_url, headers=headers, params=params, timeout=10)
+        response = upstream.get(appointment_url, headers=headers, params=params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
             if data.get('success'):
                 appointments = data.get('appointments', [])
 
+                # Información de todos los clientes en una sola llamada
+                clients = get_users_by_ids([a.get('client_id') for a in appointments], headers,
+                                           ['first_name', 'last_name'])
+
                 # Enriquecer con datos de mascotas y clientes
                 enriched_appointments = []
                 for appointment in appointments:
@@ -9723,7 +9782,7 @@ def api_veterinarian_appointments():
                         pet_id = appointment.get('pet_id')
                         if pet_id:
                             try:
-                                pet_response = requests.get(
+                                pet_response = upstream.get(
                                     f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}",
                                     headers=headers, timeout=5
                                 )
@@ -9738,20 +9797,11 @@ def api_veterinarian_appointments():
                                 appointment['pet_species'] = 'unknown'
 
                         # Obtener datos del cliente
-                        client_id = appointment.get('client_id')
-                        if client_id:
-                            try:
-                                client_response = requests.get(
-                                    f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{client_id}",
-                                    headers=headers, timeout=5
-                                )
-                                if client_response.status_code == 200:
-                                    client_data = client_response.json()
-                                    if client_data.get('success'):
-                                        client = client_data['user']
-                                        appointment['client_name'] = f"{client['first_name']} {client['last_name']}"
-                            except:
-                                appointment['client_name'] = 'Cliente'
+                        client = clients.get(appointment.get('client_id'))
+                        if client:
+                            appointment['client_name'] = f"{client['first_name']} {client['last_name']}"
+                        elif appointment.get('client_id'):
+                            appointment['client_name'] = 'Cliente'
 
                         enriched_appointments.append(appointment)
 
@@ -9770,31 +9820,15 @@ def api_veterinarian_appointments():
                     'appointments': [],
                     'total': 0
                 })
-        elif response.status_code == 404:
-            # El endpoint no existe, usar datos de ejemplo
-            example_appointments = get_example_vet_appointments()
-            return jsonify({
-                'success': True,
-                'appointments': example_appointments,
-                'total': len(example_appointments),
-                'message': 'Usando datos de ejemplo - Endpoint no disponible'
-            })
         else:
-            return jsonify({
-                'success': False,
-                'message': f'Error del Appointment Service: {response.status_code}'
-            }), response.status_code
+            # Si falla, se sirve la última respuesta buena (last_known_good)
+            raise UpstreamUnavailable(f"Appointment Service respondió {response.status_code}")
 
+    except UpstreamUnavailable:
+        raise
     except requests.RequestException as e:
         print(f"❌ Error conectando con Appointment Service: {e}")
-        # Fallback con datos de ejemplo
-        example_appointments = get_example_vet_appointments()
-        return jsonify({
-            'success': True,
-            'appointments': example_appointments,
-            'total': len(example_appointments),
-            'message': 'Sin conexión - usando datos de ejemplo'
-        })
+        raise UpstreamUnavailable(str(e))
     except Exception as e:
         print(f"❌ Error en api_veterinarian_appointments: {e}")
         return jsonify({
@@ -9805,18 +9839,19 @@ def api_veterinarian_appointments():
 
 @frontend_bp.route('/api/veterinarian/appointments/today')
 @role_required(['veterinarian'])
+@last_known_good
 def api_veterinarian_appointments_today():
     """API para obtener citas de hoy del veterinario - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📅 Obteniendo citas de hoy para veterinario: {user['id']}")
 
         # MÉTODO 1: Intentar endpoint específico
         try:
             appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today"
-            response = requests.get(appointment_url, headers=headers, timeout=10)
+            response = upstream.get(appointment_url, headers=headers, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -9849,7 +9884,7 @@ def api_veterinarian_appointments_today():
                 'end_date': today
             }
 
-            response = requests.get(appointment_url, headers=headers, params=params, timeout=10)
+            response = upstream.get(appointment_url, headers=headers, params=params, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -9871,43 +9906,36 @@ def api_veterinarian_appointments_today():
         except:
             pass
 
-        # MÉTODO 3: Fallback con datos de ejemplo
-        example_appointments = get_example_vet_appointments_today()
-        return jsonify({
-            'success': True,
-            'appointments': example_appointments,
-            'total': len(example_appointments),
-            'message': 'Usando datos de ejemplo - Servicio no disponible'
-        })
+        # Ningún método respondió: se sirve la última respuesta buena (last_known_good)
+        raise UpstreamUnavailable('Appointment Service no disponible')
 
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error en api_veterinarian_appointments_today: {e}")
-        # Último fallback
-        example_appointments = get_example_vet_appointments_today()
         return jsonify({
-            'success': True,
-            'appointments': example_appointments,
-            'total': len(example_appointments),
-            'message': 'Error del servidor - usando datos de ejemplo'
-        })
+            'success': False,
+            'message': str(e)
+        }), 500
 
 
 
 
 @frontend_bp.route('/api/veterinarian/patients/recent')
 @role_required(['veterinarian'])
+@last_known_good
 def api_veterinarian_patients_recent():
     """API para obtener pacientes recientes del veterinario - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🐕 Obteniendo pacientes recientes para veterinario: {user['id']}")
 
         # MÉTODO 1: Endpoint específico de veterinario
         try:
-            medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/patients/recent"
-            response = requests.get(medical_url, headers=headers, timeout=10)
+            medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/recent-patients"
+            response = upstream.get(medical_url, headers=headers, params={'limit': 10}, timeout=10)
 
             if response.status_code == 200:
                 data = response.json()
@@ -9917,7 +9945,7 @@ def api_veterinarian_patients_recent():
                     return jsonify({
                         'success': True,
                         'patients': patients,
-                        'total_patients': data.get('total_patients', len(patients))
+                        'total_patients': data.get('total', len(patients))
                     })
         except:
             pass
@@ -9925,7 +9953,7 @@ def api_veterinarian_patients_recent():
         # MÉTODO 2: Obtener desde registros médicos del veterinario
         try:
             records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/veterinarian/{user['id']}/recent"
-            records_response = requests.get(records_url, headers=headers, timeout=10)
+            records_response = upstream.get(records_url, headers=headers, timeout=10)
 
             if records_response.status_code == 200:
                 records_data = records_response.json()
@@ -9943,7 +9971,7 @@ def api_veterinarian_patients_recent():
 
                             # Obtener datos de la mascota
                             try:
-                                pet_response = requests.get(
+                                pet_response = upstream.get(
                                     f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}",
                                     headers=headers, timeout=3
                                 )
@@ -9973,25 +10001,17 @@ def api_veterinarian_patients_recent():
         except:
             pass
 
-        # MÉTODO 3: Fallback con datos de ejemplo
-        example_patients = get_example_vet_patients()
-        return jsonify({
-            'success': True,
-            'patients': example_patients,
-            'total_patients': len(example_patients),
-            'message': 'Usando datos de ejemplo - Servicio no disponible'
-        })
+        # Ningún método respondió: se sirve la última respuesta buena (last_known_good)
+        raise UpstreamUnavailable('Medical Service no disponible')
 
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error en api_veterinarian_patients_recent: {e}")
-        # Último fallback
-        example_patients = get_example_vet_patients()
         return jsonify({
-            'success': True,
-            'patients': example_patients,
-            'total_patients': len(example_patients),
-            'message': 'Error del servidor - usando datos de ejemplo'
-        })
+            'success': False,
+            'message': str(e)
+        }), 500
 
 
 @frontend_bp.route('/api/veterinarian/dashboard/stats')
@@ -9999,8 +10019,8 @@ def api_veterinarian_patients_recent():
 def api_veterinarian_dashboard_stats():
     """API para obtener estadísticas del dashboard del veterinario - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         stats = {
             'pending_records': 0,
@@ -10009,83 +10029,86 @@ def api_veterinarian_dashboard_stats():
             'emergency_count': 0
         }
 
-        # OBTENER REGISTROS MÉDICOS PENDIENTES
-        try:
+        def fetch_pending_records():
             # Intentar endpoint específico
             records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/records/pending"
-            records_response = requests.get(records_url, headers=headers, timeout=5)
+            records_response = upstream.get(records_url, headers=headers, timeout=5)
 
             if records_response.status_code == 200:
                 records_data = records_response.json()
                 if records_data.get('success'):
-                    stats['pending_records'] = records_data.get('count', 0)
+                    return records_data.get('count', 0)
             else:
                 # Fallback: buscar registros en estado 'draft'
                 all_records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/veterinarian/{user['id']}"
-                all_records_response = requests.get(all_records_url, headers=headers, timeout=5)
+                all_records_response = upstream.get(all_records_url, headers=headers, timeout=5)
 
                 if all_records_response.status_code == 200:
                     all_records_data = all_records_response.json()
                     if all_records_data.get('success'):
                         records = all_records_data.get('medical_records', [])
-                        pending = len([r for r in records if r.get('status') == 'draft'])
-                        stats['pending_records'] = pending
-        except:
-            stats['pending_records'] = 2  # Valor por defecto
+                        return len([r for r in records if r.get('status') == 'draft'])
+            return 0
 
-        # OBTENER COMPLETADAS HOY
-        try:
+        def fetch_completed_today():
             from datetime import datetime
             today = datetime.now().strftime('%Y-%m-%d')
 
             today_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/records/completed/today"
-            today_response = requests.get(today_url, headers=headers, timeout=5)
+            today_response = upstream.get(today_url, headers=headers, timeout=5)
 
             if today_response.status_code == 200:
                 today_data = today_response.json()
                 if today_data.get('success'):
-                    stats['completed_today'] = today_data.get('count', 0)
+                    return today_data.get('count', 0)
             else:
                 # Fallback: contar registros completados hoy
                 all_records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/veterinarian/{user['id']}"
-                all_records_response = requests.get(all_records_url, headers=headers, timeout=5)
+                all_records_response = upstream.get(all_records_url, headers=headers, timeout=5)
 
                 if all_records_response.status_code == 200:
                     all_records_data = all_records_response.json()
                     if all_records_data.get('success'):
                         records = all_records_data.get('medical_records', [])
-                        completed_today = len([
+                        return len([
                             r for r in records
                             if r.get('status') == 'completed' and
                                r.get('created_at', '').startswith(today)
                         ])
-                        stats['completed_today'] = completed_today
-        except:
-            stats['completed_today'] = 3  # Valor por defecto
+            return 0
 
-        # OBTENER TOTAL DE PACIENTES
-        try:
+        def fetch_total_patients():
             patients_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/patients"
-            patients_response = requests.get(patients_url, headers=headers, timeout=5)
+            patients_response = upstream.get(patients_url, headers=headers, timeout=5)
 
             if patients_response.status_code == 200:
                 patients_data = patients_response.json()
                 if patients_data.get('success'):
-                    stats['total_patients'] = len(patients_data.get('patients', []))
-        except:
-            stats['total_patients'] = 25  # Valor por defecto
+                    return patients_data.get('total', len(patients_data.get('patients', [])))
+            return 0
 
-        # OBTENER EMERGENCIAS
-        try:
+        def fetch_emergency_count():
             emergency_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/emergency"
-            emergency_response = requests.get(emergency_url, headers=headers, timeout=5)
+            emergency_response = upstream.get(emergency_url, headers=headers, timeout=5)
 
             if emergency_response.status_code == 200:
                 emergency_data = emergency_response.json()
                 if emergency_data.get('success'):
-                    stats['emergency_count'] = len(emergency_data.get('appointments', []))
-        except:
-            stats['emergency_count'] = 0  # Valor por defecto
+                    return len(emergency_data.get('appointments', []))
+            return 0
+
+        # Registros pendientes, completados hoy, pacientes y emergencias en paralelo
+        stats.update(fan_out({
+            'pending_records': fetch_pending_records,
+            'completed_today': fetch_completed_today,
+            'total_patients': fetch_total_patients,
+            'emergency_count': fetch_emergency_count
+        }, deadline=10, defaults={
+            'pending_records': 2,  # Valores por defecto
+            'completed_today': 3,
+            'total_patients': 25,
+            'emergency_count': 0
+        }))
 
         print(f"📊 Estadísticas calculadas para veterinario {user['id']}: {stats}")
 
@@ -10114,8 +10137,8 @@ def api_veterinarian_dashboard_stats():
 def api_veterinarian_notifications_count():
     """API para contar notificaciones del veterinario"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         data = {
             'unread_notifications': 0,
@@ -10126,7 +10149,7 @@ def api_veterinarian_notifications_count():
 
         # Intentar obtener notificaciones
         try:
-            notif_response = requests.get(
+            notif_response = upstream.get(
                 f"{current_app.config['NOTIFICATION_SERVICE_URL']}/notifications/user/{user['id']}/unread/count",
                 headers=headers, timeout=5
             )
@@ -10139,7 +10162,7 @@ def api_veterinarian_notifications_count():
 
         # Citas de hoy
         try:
-            today_response = requests.get(
+            today_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today",
                 headers=headers, timeout=5
             )
@@ -10173,12 +10196,12 @@ def api_veterinarian_notifications_count():
 def api_veterinarian_emergencies_check():
     """API para verificar emergencias del veterinario - CORREGIDA"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         # MÉTODO 1: Verificar endpoint específico de emergencias
         try:
-            emergency_response = requests.get(
+            emergency_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/emergency",
                 headers=headers, timeout=5
             )
@@ -10199,7 +10222,7 @@ def api_veterinarian_emergencies_check():
 
         # MÉTODO 2: Buscar en citas del día con prioridad emergency
         try:
-            today_response = requests.get(
+            today_response = upstream.get(
                 f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/veterinarian/{user['id']}/today",
                 headers=headers, timeout=5
             )
@@ -10297,14 +10320,14 @@ def create_default_schedule():
 def api_veterinarian_start_appointment(appointment_id):
     """API para iniciar una cita"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🩺 Veterinario {user['id']} iniciando cita: {appointment_id}")
 
         # Marcar cita como en progreso
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/{appointment_id}/start"
-        response = requests.put(appointment_url, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -10339,13 +10362,13 @@ def api_veterinarian_start_appointment(appointment_id):
 def api_veterinarian_complete_appointment(appointment_id):
     """API para completar una cita"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"✅ Veterinario {user['id']} completando cita: {appointment_id}")
 
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/{appointment_id}/complete"
-        response = requests.put(appointment_url, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, headers=headers, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -10380,14 +10403,14 @@ def api_veterinarian_complete_appointment(appointment_id):
 def api_veterinarian_cancel_appointment(appointment_id):
     """API para cancelar una cita"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         data = request.get_json() or {}
 
         print(f"❌ Veterinario {user['id']} cancelando cita: {appointment_id}")
 
         appointment_url = f"{current_app.config['APPOINTMENT_SERVICE_URL']}/appointments/{appointment_id}/cancel"
-        response = requests.put(appointment_url, json=data, headers=headers, timeout=10)
+        response = upstream.put(appointment_url, json=data, headers=headers, timeout=10)
 
         if response.status_code == 200:
             response_data = response.json()
@@ -10417,302 +10440,101 @@ def api_veterinarian_cancel_appointment(appointment_id):
         }), 500
 
 
-# =============== FUNCIONES DE DATOS DE EJEMPLO PARA VETERINARIO ===============
-
-def get_example_vet_appointments_today():
-    """Datos de ejemplo específicos para citas de hoy"""
-    appointments = get_example_vet_appointments()
-    today = datetime.now().strftime('%Y-%m-%d')
-
-    return [apt for apt in appointments if apt['appointment_date'] == today]
-
-
-def get_example_vet_patients():
-    """Función para proporcionar datos de ejemplo cuando el servicio no esté disponible"""
-    return [
-        {
-            'id': 1,
-            'name': 'Max',
-            'species': 'dog',
-            'breed': 'Golden Retriever',
-            'age': 5,
-            'weight': 28.5,
-            'owner_id': 101,
-            'owner_name': 'María González',
-            'owner_phone': '+34 123 456 789',
-            'owner_email': 'maria.gonzalez@email.com',
-            'owner_address': 'Calle Real 123, Madrid',
-            'status': 'active',
-            'last_visit': '2024-06-15',
-            'visits_count': 12,
-            'birth_date': '2019-03-10'
-        },
-        {
-            'id': 2,
-            'name': 'Luna',
-            'species': 'cat',
-            'breed': 'Siamés',
-            'age': 3,
-            'weight': 4.2,
-            'owner_id': 102,
-            'owner_name': 'Carlos Rodríguez',
-            'owner_phone': '+34 987 654 321',
-            'owner_email': 'carlos.rodriguez@email.com',
-            'owner_address': 'Avenida Central 456, Barcelona',
-            'status': 'treatment',
-            'last_visit': '2024-06-14',
-            'visits_count': 8,
-            'birth_date': '2021-07-22'
-        },
-        {
-            'id': 3,
-            'name': 'Rocky',
-            'species': 'dog',
-            'breed': 'Pastor Alemán',
-            'age': 7,
-            'weight': 35.0,
-            'owner_id': 103,
-            'owner_name': 'Ana Martínez',
-            'owner_phone': '+34 555 123 456',
-            'owner_email': 'ana.martinez@email.com',
-            'owner_address': 'Plaza Mayor 789, Valencia',
-            'status': 'active',
-            'last_visit': '2024-06-10',
-            'visits_count': 15,
-            'birth_date': '2017-01-15'
-        },
-        {
-            'id': 4,
-            'name': 'Coco',
-            'species': 'bird',
-            'breed': 'Canario',
-            'age': 2,
-            'weight': 0.02,
-            'owner_id': 104,
-            'owner_name': 'Luis García',
-            'owner_phone': '+34 666 789 012',
-            'owner_email': 'luis.garcia@email.com',
-            'owner_address': 'Calle Luna 321, Sevilla',
-            'status': 'active',
-            'last_visit': '2024-06-08',
-            'visits_count': 5,
-            'birth_date': '2022-05-30'
-        },
-        {
-            'id': 5,
-            'name': 'Bella',
-            'species': 'cat',
-            'breed': 'Persa',
-            'age': 4,
-            'weight': 5.1,
-            'owner_id': 105,
-            'owner_name': 'Carmen López',
-            'owner_phone': '+34 777 345 678',
-            'owner_email': 'carmen.lopez@email.com',
-            'owner_address': 'Calle Sol 654, Bilbao',
-            'status': 'emergency',
-            'last_visit': '2024-06-16',
-            'visits_count': 10,
-            'birth_date': '2020-11-12'
-        },
-        {
-            'id': 6,
-            'name': 'Toby',
-            'species': 'rabbit',
-            'breed': 'Enano Holandés',
-            'age': 1,
-            'weight': 1.8,
-            'owner_id': 106,
-            'owner_name': 'Pedro Sánchez',
-            'owner_phone': '+34 888 901 234',
-            'owner_email': 'pedro.sanchez@email.com',
-            'owner_address': 'Avenida Flores 987, Zaragoza',
-            'status': 'active',
-            'last_visit': '2024-06-05',
-            'visits_count': 3,
-            'birth_date': '2023-08-20'
-        }
-    ]
-
-def get_example_vet_appointments():
-    """Datos de ejemplo completos para citas del veterinario"""
-    from datetime import datetime, timedelta
-
-    today = datetime.now()
-    tomorrow = today + timedelta(days=1)
-    next_week = today + timedelta(days=7)
-
-    return [
-        {
-            'id': 'apt_vet_001',
-            'pet_id': 'pet_001',
-            'pet_name': 'Max',
-            'pet_species': 'perro',
-            'client_id': 'client_001',
-            'client_name': 'Carlos López',
-            'appointment_date': today.strftime('%Y-%m-%d'),
-            'appointment_time': '09:00',
-            'status': 'confirmed',
-            'priority': 'normal',
-            'reason': 'Control de rutina y vacunación',
-            'notes': 'Revisar vacunas pendientes'
-        },
-        {
-            'id': 'apt_vet_002',
-            'pet_id': 'pet_002',
-            'pet_name': 'Luna',
-            'pet_species': 'gato',
-            'client_id': 'client_002',
-            'client_name': 'María González',
-            'appointment_date': today.strftime('%Y-%m-%d'),
-            'appointment_time': '10:30',
-            'status': 'scheduled',
-            'priority': 'urgent',
-            'reason': 'Control post-operatorio',
-            'notes': 'Revisar cicatrización de esterilización'
-        },
-        {
-            'id': 'apt_vet_003',
-            'pet_id': 'pet_003',
-            'pet_name': 'Rocky',
-            'pet_species': 'perro',
-            'client_id': 'client_003',
-            'client_name': 'Ana Martínez',
-            'appointment_date': today.strftime('%Y-%m-%d'),
-            'appointment_time': '14:00',
-            'status': 'scheduled',
-            'priority': 'emergency',
-            'reason': 'Dificultad respiratoria - Emergencia',
-            'notes': 'Cliente reporta respiración muy dificultosa desde anoche'
-        },
-        {
-            'id': 'apt_vet_004',
-            'pet_id': 'pet_004',
-            'pet_name': 'Bella',
-            'pet_species': 'gato',
-            'client_id': 'client_004',
-            'client_name': 'Pedro Silva',
-            'appointment_date': tomorrow.strftime('%Y-%m-%d'),
-            'appointment_time': '11:00',
-            'status': 'confirmed',
-            'priority': 'normal',
-            'reason': 'Consulta de control general',
-            'notes': 'Chequeo anual completo'
-        },
-        {
-            'id': 'apt_vet_005',
-            'pet_id': 'pet_005',
-            'pet_name': 'Cooper',
-            'pet_species': 'perro',
-            'client_id': 'client_005',
-            'client_name': 'Laura Ramírez',
-            'appointment_date': next_week.strftime('%Y-%m-%d'),
-            'appointment_time': '15:30',
-            'status': 'scheduled',
-            'priority': 'normal',
-            'reason': 'Vacunación múltiple',
-            'notes': 'Aplicar vacuna DHPP y antirrábica'
-        }
-    ]
-
-
 # Agregar estas rutas al archivo frontend/app/routes/frontend_routes.py
 
 # =============== API ENDPOINTS PARA PACIENTES DEL VETERINARIO ===============
 
 @frontend_bp.route('/api/veterinarian/patients')
 @role_required(['veterinarian'])
+@last_known_good
 def api_veterinarian_patients():
     """API para obtener todos los pacientes del veterinario"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"🐕 Obteniendo todos los pacientes para veterinario: {user['id']}")
 
         # MÉTODO 1: Endpoint específico del veterinario
         try:
             medical_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/veterinarian/{user['id']}/patients"
-            response = requests.get(medical_url, headers=headers, timeout=15)
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    patients = data.get('patients', [])
-
-                    # Enriquecer cada paciente con información adicional
-                    enriched_patients = []
-                    for patient in patients:
-                        try:
-                            # Obtener información del propietario
-                            owner_response = requests.get(
-                                f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{patient['owner_id']}",
-                                headers=headers, timeout=5
-                            )
-                            if owner_response.status_code == 200:
-                                owner_data = owner_response.json()
-                                if owner_data.get('success'):
-                                    owner = owner_data['user']
-                                    patient[
-                                        'owner_name'] = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip()
-                                    patient['owner_phone'] = owner.get('phone', '')
-                                    patient['owner_email'] = owner.get('email', '')
-                                    patient['owner_address'] = owner.get('address', '')
-
-                            # Calcular edad si hay fecha de nacimiento
-                            if patient.get('birth_date'):
-                                try:
-                                    from datetime import datetime
-                                    birth_date = datetime.strptime(patient['birth_date'], '%Y-%m-%d')
-                                    today = datetime.now()
-                                    age = today.year - birth_date.year
-                                    if today.month < birth_date.month or (
-                                            today.month == birth_date.month and today.day < birth_date.day):
-                                        age -= 1
-                                    patient['age'] = age
-                                except:
-                                    pass
-
-                            # Obtener última visita desde registros médicos
+            # Con ?page= se devuelve solo esa página; sin él (la vista del veterinario, que no
+            # pagina) se recorren todas: el servicio limita per_page a 500
+            single_page = 'page' in request.args
+            params = {
+                'page': request.args.get('page', 1, type=int),
+                'per_page': request.args.get('per_page', 500, type=int)
+            }
+            patients = []
+            while True:
+                response = upstream.get(medical_url, headers=headers, params=params, timeout=15)
+                data = response.json() if response.status_code == 200 else {}
+                if not data.get('success'):
+                    # Una página fallida invalida el listado: no se devuelve truncado
+                    data = None
+                    break
+
+                patients.extend(data.get('patients', []))
+                pagination = data.get('pagination')
+                if single_page or not pagination or params['page'] >= pagination.get('pages', 0):
+                    break
+                params['page'] += 1
+
+            if data is not None:
+                # Información de todos los propietarios en una sola llamada
+                owners = get_users_by_ids([patient.get('owner_id') for patient in patients], headers,
+                                          OWNER_FIELDS)
+
+                # Enriquecer cada paciente con información adicional
+                enriched_patients = []
+                for patient in patients:
+                    try:
+                        owner = owners.get(patient.get('owner_id'))
+                        if owner:
+                            patient[
+                                'owner_name'] = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip()
+                            patient['owner_phone'] = owner.get('phone', '')
+                            patient['owner_email'] = owner.get('email', '')
+                            patient['owner_address'] = owner.get('address', '')
+
+                        # Calcular edad si hay fecha de nacimiento
+                        if patient.get('birth_date'):
                             try:
-                                records_response = requests.get(
-                                    f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{patient['id']}/recent",
-                                    headers=headers, timeout=5
-                                )
-                                if records_response.status_code == 200:
-                                    records_data = records_response.json()
-                                    if records_data.get('success') and records_data.get('medical_records'):
-                                        latest_record = records_data['medical_records'][0]
-                                        patient['last_visit'] = latest_record.get('created_at', '').split('T')[0]
-                                        patient['visits_count'] = len(records_data['medical_records'])
-                                    else:
-                                        patient['last_visit'] = None
-                                        patient['visits_count'] = 0
+                                from datetime import datetime
+                                birth_date = datetime.strptime(patient['birth_date'], '%Y-%m-%d')
+                                today = datetime.now()
+                                age = today.year - birth_date.year
+                                if today.month < birth_date.month or (
+                                        today.month == birth_date.month and today.day < birth_date.day):
+                                    age -= 1
+                                patient['age'] = age
                             except:
-                                patient['last_visit'] = None
-                                patient['visits_count'] = 0
+                                pass
 
-                            # Asignar estado por defecto si no existe
-                            if not patient.get('status'):
-                                patient['status'] = 'active'
+                        # visits_count y last_visit ya vienen calculados por Medical Service
 
-                            enriched_patients.append(patient)
-                        except Exception as e:
-                            print(f"⚠️ Error enriqueciendo paciente {patient.get('id')}: {e}")
-                            enriched_patients.append(patient)
+                        # Asignar estado por defecto si no existe
+                        if not patient.get('status'):
+                            patient['status'] = 'active'
 
-                    return jsonify({
-                        'success': True,
-                        'patients': enriched_patients,
-                        'total_patients': len(enriched_patients)
-                    })
+                        enriched_patients.append(patient)
+                    except Exception as e:
+                        print(f"⚠️ Error enriqueciendo paciente {patient.get('id')}: {e}")
+                        enriched_patients.append(patient)
+
+                return jsonify({
+                    'success': True,
+                    'patients': enriched_patients,
+                    'total_patients': data.get('total', len(enriched_patients)),
+                    'pagination': data.get('pagination') if single_page else None
+                })
         except Exception as e:
             print(f"⚠️ Error en método 1: {e}")
 
         # MÉTODO 2: Obtener desde registros médicos del veterinario
         try:
             records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/veterinarian/{user['id']}"
-            records_response = requests.get(records_url, headers=headers, timeout=15)
+            records_response = upstream.get(records_url, headers=headers, timeout=15)
 
             if records_response.status_code == 200:
                 records_data = records_response.json()
@@ -10730,7 +10552,7 @@ def api_veterinarian_patients():
 
                             # Obtener datos completos de la mascota
                             try:
-                                pet_response = requests.get(
+                                pet_response = upstream.get(
                                     f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}",
                                     headers=headers, timeout=5
                                 )
@@ -10739,23 +10561,6 @@ def api_veterinarian_patients():
                                     if pet_data.get('success'):
                                         pet = pet_data['pet']
 
-                                        # Obtener información del propietario
-                                        try:
-                                            owner_response = requests.get(
-                                                f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{pet['owner_id']}",
-                                                headers=headers, timeout=3
-                                            )
-                                            if owner_response.status_code == 200:
-                                                owner_data = owner_response.json()
-                                                if owner_data.get('success'):
-                                                    owner = owner_data['user']
-                                                    pet[
-                                                        'owner_name'] = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip()
-                                                    pet['owner_phone'] = owner.get('phone', '')
-                                                    pet['owner_email'] = owner.get('email', '')
-                                        except:
-                                            pet['owner_name'] = 'Propietario desconocido'
-
                                         # Contar visitas del veterinario
                                         vet_records = [r for r in records if r.get('pet_id') == pet_id]
                                         pet['visits_count'] = len(vet_records)
@@ -10770,6 +10575,17 @@ def api_veterinarian_patients():
                             except:
                                 continue
 
+                    # Información de todos los propietarios en una sola llamada
+                    owners = get_users_by_ids([pet.get('owner_id') for pet in patients], headers, OWNER_FIELDS)
+                    for pet in patients:
+                        owner = owners.get(pet.get('owner_id'))
+                        if owner:
+                            pet['owner_name'] = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip()
+                            pet['owner_phone'] = owner.get('phone', '')
+                            pet['owner_email'] = owner.get('email', '')
+                        else:
+                            pet['owner_name'] = 'Propietario desconocido'
+
                     return jsonify({
                         'success': True,
                         'patients': patients,
@@ -10778,25 +10594,17 @@ def api_veterinarian_patients():
         except Exception as e:
             print(f"⚠️ Error en método 2: {e}")
 
-        # MÉTODO 3: Fallback con datos de ejemplo
-        example_patients = get_example_vet_patients()
-        return jsonify({
-            'success': True,
-            'patients': example_patients,
-            'total_patients': len(example_patients),
-            'message': 'Usando datos de ejemplo - Servicio no disponible'
-        })
+        # Ningún método respondió: se sirve la última respuesta buena (last_known_good)
+        raise UpstreamUnavailable('Medical Service no disponible')
 
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error en api_veterinarian_patients: {e}")
-        # Último fallback
-        example_patients = get_example_vet_patients()
         return jsonify({
-            'success': True,
-            'patients': example_patients,
-            'total_patients': len(example_patients),
-            'message': 'Error del servidor - usando datos de ejemplo'
-        })
+            'success': False,
+            'message': str(e)
+        }), 500
 
 
 @frontend_bp.route('/api/veterinarian/patients/search', methods=['POST'])
@@ -10804,61 +10612,18 @@ def api_veterinarian_patients():
 def api_veterinarian_patients_search():
     """API para buscar pacientes con criterios específicos"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
         criteria = request.get_json()
 
         print(f"🔍 Búsqueda de pacientes para veterinario: {user['id']} con criterios: {criteria}")
 
-        # Primero obtener todos los pacientes del veterinario
-        all_patients_response = requests.get(f"/api/veterinarian/patients", headers=headers)
-
-        if not all_patients_response or all_patients_response.status_code != 200:
-            # Fallback: obtener pacientes desde registros médicos
-            try:
-                records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/veterinarian/{user['id']}"
-                records_response = requests.get(records_url, headers=headers, timeout=15)
-
-                all_patients = []
-                if records_response.status_code == 200:
-                    records_data = records_response.json()
-                    if records_data.get('success'):
-                        records = records_data.get('medical_records', [])
-                        seen_pets = set()
-
-                        for record in records:
-                            pet_id = record.get('pet_id')
-                            if pet_id and pet_id not in seen_pets:
-                                seen_pets.add(pet_id)
-                                try:
-                                    pet_response = requests.get(
-                                        f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}",
-                                        headers=headers, timeout=5
-                                    )
-                                    if pet_response.status_code == 200:
-                                        pet_data = pet_response.json()
-                                        if pet_data.get('success'):
-                                            pet = pet_data['pet']
-                                            # Enriquecer con información básica
-                                            pet['visits_count'] = len([r for r in records if r.get('pet_id') == pet_id])
-                                            vet_records = [r for r in records if r.get('pet_id') == pet_id]
-                                            if vet_records:
-                                                latest = max(vet_records, key=lambda x: x.get('created_at', ''))
-                                                pet['last_visit'] = latest.get('created_at', '').split('T')[0]
-                                            pet['status'] = pet.get('status', 'active')
-                                            all_patients.append(pet)
-                                except:
-                                    continue
-            except:
-                all_patients = get_example_vet_patients()
-        else:
-            # Usar respuesta de API interna
-            internal_response = api_veterinarian_patients()
-            if hasattr(internal_response, 'get_json'):
-                data = internal_response.get_json()
-                all_patients = data.get('patients', [])
-            else:
-                all_patients = get_example_vet_patients()
+        # Pacientes del veterinario (misma fuente y última respuesta buena que /api/veterinarian/patients)
+        internal_response = api_veterinarian_patients()
+        if isinstance(internal_response, tuple):
+            internal_response = internal_response[0]
+        patients_data = internal_response.get_json(silent=True) or {}
+        all_patients = patients_data.get('patients', [])
 
         # Aplicar filtros según el tipo de búsqueda
         filtered_patients = []
@@ -10982,7 +10747,8 @@ def api_veterinarian_patients_search():
             'success': True,
             'patients': filtered_patients,
             'total_results': len(filtered_patients),
-            'search_criteria': criteria
+            'search_criteria': criteria,
+            'stale': patients_data.get('stale', False)
         })
 
     except Exception as e:
@@ -11000,13 +10766,13 @@ def api_veterinarian_patients_search():
 def api_veterinarian_patient_details(patient_id):
     """API para obtener detalles completos de un paciente específico"""
     try:
-        user = session.get('user', {})
-        headers = {'Authorization': f"Bearer {session.get('token')}"}
+        user = current_auth_user() or {}
+        headers = {'Authorization': f"Bearer {current_auth_token()}"}
 
         print(f"📋 Obteniendo detalles del paciente {patient_id} para veterinario {user['id']}")
 
         # Obtener información básica de la mascota
-        pet_response = requests.get(
+        pet_response = upstream.get(
             f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{patient_id}",
             headers=headers, timeout=10
         )
@@ -11031,7 +10797,7 @@ def api_veterinarian_patient_details(patient_id):
 
         try:
             # Obtener registros médicos del paciente
-            records_response = requests.get(
+            records_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{patient_id}",
                 headers=headers, timeout=10
             )
@@ -11088,7 +10854,7 @@ def api_veterinarian_patient_details(patient_id):
         vet_notes = "Sin notas adicionales"
         try:
             # Buscar registros médicos del veterinario actual
-            vet_records_response = requests.get(
+            vet_records_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{patient_id}/veterinarian/{user['id']}",
                 headers=headers, timeout=5
             )
@@ -11127,7 +10893,7 @@ def get_patients_from_medical_records(vet_id, headers):
     """Obtener pacientes desde los registros médicos del veterinario"""
     try:
         records_url = f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/veterinarian/{vet_id}"
-        records_response = requests.get(records_url, headers=headers, timeout=15)
+        records_response = upstream.get(records_url, headers=headers, timeout=15)
 
         if records_response.status_code == 200:
             records_data = records_response.json()
@@ -11136,7 +10902,7 @@ def get_patients_from_medical_records(vet_id, headers):
 
                 # Extraer pacientes únicos de los registros
                 seen_pets = set()
-                patients = []
+                pets = []
 
                 for record in records:
                     pet_id = record.get('pet_id')
@@ -11145,31 +10911,36 @@ def get_patients_from_medical_records(vet_id, headers):
 
                         # Obtener datos completos de la mascota
                         try:
-                            pet_response = requests.get(
+                            pet_response = upstream.get(
                                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/pets/{pet_id}",
                                 headers=headers, timeout=5
                             )
                             if pet_response.status_code == 200:
                                 pet_data = pet_response.json()
                                 if pet_data.get('success'):
-                                    pet = pet_data['pet']
+                                    pets.append(pet_data['pet'])
+                        except:
+                            continue
 
-                                    # Enriquecer con información del propietario
-                                    pet = enrich_patient_data(pet, headers)
+                # Información de todos los propietarios en una sola llamada
+                owners = get_users_by_ids([pet.get('owner_id') for pet in pets], headers, OWNER_FIELDS)
 
-                                    # Contar visitas del veterinario
-                                    vet_records = [r for r in records if r.get('pet_id') == pet_id]
-                                    pet['visits_count'] = len(vet_records)
+                patients = []
+                for pet in pets:
+                    # Enriquecer con información del propietario
+                    pet = enrich_patient_data(pet, headers, owners)
 
-                                    # Última visita
-                                    if vet_records:
-                                        latest = max(vet_records, key=lambda x: x.get('created_at', ''))
-                                        pet['last_visit'] = latest.get('created_at', '').split('T')[0]
+                    # Contar visitas del veterinario
+                    vet_records = [r for r in records if r.get('pet_id') == pet['id']]
+                    pet['visits_count'] = len(vet_records)
 
-                                    pet['status'] = pet.get('status', 'active')
-                                    patients.append(pet)
-                        except:
-                            continue
+                    # Última visita
+                    if vet_records:
+                        latest = max(vet_records, key=lambda x: x.get('created_at', ''))
+                        pet['last_visit'] = latest.get('created_at', '').split('T')[0]
+
+                    pet['status'] = pet.get('status', 'active')
+                    patients.append(pet)
 
                 return patients
         return []
@@ -11304,7 +11075,7 @@ def get_patient_medical_info(patient_id, headers):
 
     try:
         # Obtener registros médicos del paciente
-        records_response = requests.get(
+        records_response = upstream.get(
             f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{patient_id}",
             headers=headers, timeout=10
         )
@@ -11364,7 +11135,7 @@ def get_vet_notes_for_patient(patient_id, vet_id, headers):
     """Obtener notas del veterinario para un paciente específico"""
     try:
         # Buscar registros médicos del veterinario actual
-        vet_records_response = requests.get(
+        vet_records_response = upstream.get(
             f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{patient_id}/veterinarian/{vet_id}",
             headers=headers, timeout=5
         )
@@ -11427,22 +11198,88 @@ def validate_search_criteria(criteria):
 
     return True, None
 
-def enrich_patient_data(patient, headers):
-    """Enriquecer datos del paciente con información adicional"""
+USERS_BATCH_MAX_IDS = 1000  # límite de /auth/users/batch
+
+
+def get_users_by_ids(user_ids, headers, fields=None):
+    """
+    Obtener varios usuarios con /auth/users/batch (dict id -> usuario), en lotes de
+    como mucho USERS_BATCH_MAX_IDS IDs
+    """
+    user_ids = list({str(user_id) for user_id in user_ids if user_id})
+    users = {}
+
+    for start in range(0, len(user_ids), USERS_BATCH_MAX_IDS):
+        try:
+            payload = {'ids': user_ids[start:start + USERS_BATCH_MAX_IDS]}
+            if fields:
+                payload['fields'] = fields
+
+            response = upstream.post(
+                f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/batch",
+                json=payload, headers=headers, timeout=5
+            )
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success'):
+                    users.update({user['id']: user for user in data.get('users', [])})
+            else:
+                print(f"⚠️ /auth/users/batch respondió {response.status_code}")
+        except Exception as e:
+            print(f"⚠️ Error obteniendo usuarios por lotes: {e}")
+
+    return users
+
+
+PRESCRIPTIONS_BATCH_MAX_IDS = 1000  # límite de /medical/prescriptions/by-records
+
+
+def get_prescriptions_by_records(record_ids, headers):
+    """
+    Obtener prescripciones de varias historias clínicas con /medical/prescriptions/by-records
+    (dict medical_record_id -> lista), en lotes de como mucho PRESCRIPTIONS_BATCH_MAX_IDS IDs
+    """
+    record_ids = list({str(record_id) for record_id in record_ids if record_id})
+    prescriptions = {}
+
+    for start in range(0, len(record_ids), PRESCRIPTIONS_BATCH_MAX_IDS):
+        try:
+            response = upstream.post(
+                f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/prescriptions/by-records",
+                json={'record_ids': record_ids[start:start + PRESCRIPTIONS_BATCH_MAX_IDS]},
+                headers=headers, timeout=5
+            )
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success'):
+                    prescriptions.update(data.get('prescriptions', {}))
+            else:
+                print(f"⚠️ /medical/prescriptions/by-records respondió {response.status_code}")
+        except Exception as e:
+            print(f"⚠️ Error obteniendo prescripciones por lotes: {e}")
+
+    return prescriptions
+
+
+OWNER_FIELDS = ['first_name', 'last_name', 'phone', 'email', 'address']
+
+
+def enrich_patient_data(patient, headers, owners=None):
+    """Enriquecer datos del paciente con información adicional
+
+    owners: dict id -> usuario ya obtenido con get_users_by_ids (evita una llamada por paciente)
+    """
     try:
         # Obtener información del propietario
-        owner_response = requests.get(
-            f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/{patient['owner_id']}",
-            headers=headers, timeout=5
-        )
-        if owner_response.status_code == 200:
-            owner_data = owner_response.json()
-            if owner_data.get('success'):
-                owner = owner_data['user']
-                patient['owner_name'] = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip()
-                patient['owner_phone'] = owner.get('phone', '')
-                patient['owner_email'] = owner.get('email', '')
-                patient['owner_address'] = owner.get('address', '')
+        if owners is None:
+            owners = get_users_by_ids([patient.get('owner_id')], headers, OWNER_FIELDS)
+
+        owner = owners.get(patient.get('owner_id'))
+        if owner:
+            patient['owner_name'] = f"{owner.get('first_name', '')} {owner.get('last_name', '')}".strip()
+            patient['owner_phone'] = owner.get('phone', '')
+            patient['owner_email'] = owner.get('email', '')
+            patient['owner_address'] = owner.get('address', '')
 
         # Calcular edad si hay fecha de nacimiento
         if patient.get('birth_date'):
@@ -11460,7 +11297,7 @@ def enrich_patient_data(patient, headers):
 
         # Obtener última visita desde registros médicos
         try:
-            records_response = requests.get(
+            records_response = upstream.get(
                 f"{current_app.config['MEDICAL_SERVICE_URL']}/medical/records/pet/{patient['id']}/recent",
                 headers=headers, timeout=5
             )
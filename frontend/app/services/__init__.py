@@ -1,4 +1,22 @@
 # frontend/app/services/__init__.py
-from .api_client import APIClient
+from .api_client import APIClient, AsyncAPIClient
+from .db_pool import ConnectionPool, PoolTimeout
+from .event_stream import EventBroker
+from .fan_out import FanOutDeadlineExceeded, fan_out
+from .invoice_export import ExportJobs, write_invoices_xlsx
+from .invoice_pdf import InvoicePdfCache, render_invoice_pdf
+from .photo_index import PhotoIndex, get_photo_index
+from utils.photo_pipeline import schedule_derivatives, select_variant
+from .photo_replication import PhotoReplication
+from .response_cache import ResponseCache, UpstreamUnavailable, get_response_cache, last_known_good
+from .static_assets import StaticAssets
+from .user_directory import UserDirectory, get_user_directory
 
-__all__ = ['APIClient']
\ No newline at end of file
+__all__ = [
+    'APIClient', 'AsyncAPIClient', 'ConnectionPool', 'PoolTimeout', 'EventBroker', 'fan_out',
+    'FanOutDeadlineExceeded',
+    'ExportJobs', 'write_invoices_xlsx', 'InvoicePdfCache', 'render_invoice_pdf',
+    'PhotoIndex', 'get_photo_index', 'schedule_derivatives', 'select_variant', 'PhotoReplication',
+    'ResponseCache', 'UpstreamUnavailable', 'get_response_cache', 'last_known_good', 'StaticAssets',
+    'UserDirectory', 'get_user_directory'
+]
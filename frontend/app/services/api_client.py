@@ -1,28 +1,171 @@
 # frontend/app/services/api_client.py
-import requests
-from flask import current_app, session
+import asyncio
+import copy
 import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .fan_out import FanOutDeadlineExceeded, remaining_fan_out_time
+
+try:
+    import brotli  # urllib3 descomprime 'br' solo si está instalado
+    ACCEPT_ENCODING = 'br, gzip'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip'
 
 
 class APIClient:
+    """
+    Cliente HTTP único hacia los microservicios.
+
+    Mantiene una requests.Session con su propio pool de conexiones keep-alive por
+    cada URL base (AUTH_SERVICE_URL, MEDICAL_SERVICE_URL, ...), de modo que las
+    llamadas reutilizan conexiones abiertas en lugar de abrir una por petición.
+    """
+
     def __init__(self):
-        self.session = requests.Session()
         self.logger = logging.getLogger(__name__)
+        self.pool_maxsize = 32
+        self.connect_retries = 1
+        self.default_timeout = 10
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        # Validadores (ETag) de respuestas GET: url -> (etag, respuesta)
+        self.validator_cache_size = 256
+        self._validators = OrderedDict()
+        self._validators_lock = threading.Lock()
 
     def init_app(self, app):
         """Inicializar el cliente API con la aplicación Flask"""
         self.app = app
-        # Configurar headers por defecto
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        })
+        self.pool_maxsize = app.config.get('HTTP_POOL_MAXSIZE', 32)
+        self.connect_retries = app.config.get('HTTP_CONNECT_RETRIES', 1)
+        self.default_timeout = app.config.get('REQUEST_TIMEOUT', 10)
+        self.validator_cache_size = app.config.get('HTTP_VALIDATOR_CACHE_SIZE', 256)
+
+        # Abrir de antemano un pool por cada microservicio configurado
+        for key, value in app.config.items():
+            if key.endswith('_SERVICE_URL') and value:
+                self._session_for(value)
+
+    def _session_for(self, url):
+        """Obtener (o crear) la sesión con pool de conexiones para la URL base de url"""
+        parts = urlsplit(url)
+        base_url = f"{parts.scheme}://{parts.netloc}"
+
+        http_session = self._sessions.get(base_url)
+        if http_session is None:
+            with self._sessions_lock:
+                http_session = self._sessions.get(base_url)
+                if http_session is None:
+                    http_session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=Retry(connect=self.connect_retries, read=0, status=0, backoff_factor=0.1)
+                    )
+                    http_session.mount(f"{base_url}/", adapter)
+                    # Los servicios comprimen las respuestas grandes; urllib3 las descomprime
+                    http_session.headers.update({'Accept': 'application/json', 'Accept-Encoding': ACCEPT_ENCODING})
+                    # La sesión se comparte entre usuarios: nunca guardar cookies de los servicios
+                    http_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                    self._sessions[base_url] = http_session
+        return http_session
+
+    def request(self, method, url, **kwargs):
+        """Petición HTTP a cualquier URL de microservicio usando su pool de conexiones"""
+        kwargs['timeout'] = self._bounded_timeout(kwargs.get('timeout', self.default_timeout))
+        return self._session_for(url).request(method.upper(), url, **kwargs)
+
+    @staticmethod
+    def _bounded_timeout(timeout):
+        """Dentro de un fan_out, el timeout no pasa del tiempo que le queda a la tarea"""
+        remaining = remaining_fan_out_time()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise FanOutDeadlineExceeded('plazo del fan-out agotado')
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def get(self, url, **kwargs):
+        """
+        GET condicional: si ya se tiene un ETag para la URL se envía If-None-Match y,
+        ante un 304, se devuelve una copia de la última respuesta en lugar de descargarla.
+        Solo se guardan respuestas con ETag, que los servicios emiten en listados
+        iguales para cualquier usuario autorizado.
+        """
+        if kwargs.get('stream') or not self.validator_cache_size:
+            return self.request('GET', url, **kwargs)
+
+        try:
+            # URL final tal como la construye requests: params puede ser dict, lista de tuplas o cadena
+            prepared = requests.PreparedRequest()
+            prepared.prepare_url(url, kwargs.get('params'))
+            key = prepared.url
+        except Exception:
+            return self.request('GET', url, **kwargs)
+        with self._validators_lock:
+            cached = self._validators.get(key)
+            if cached:
+                self._validators.move_to_end(key)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached and 'If-None-Match' not in headers:
+            headers['If-None-Match'] = cached[0]
+
+        response = self.request('GET', url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached:
+            return copy.copy(cached[1])
+
+        etag = response.headers.get('ETag')
+        if response.status_code == 200 and etag:
+            response.content  # Leer el cuerpo para poder reutilizarlo
+            with self._validators_lock:
+                self._validators[key] = (etag, response)
+                self._validators.move_to_end(key)
+                while len(self._validators) > self.validator_cache_size:
+                    self._validators.popitem(last=False)
+        elif cached and response.status_code != 304:
+            with self._validators_lock:
+                self._validators.pop(key, None)
+
+        return response
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        """Cerrar todos los pools de conexiones"""
+        with self._sessions_lock:
+            for http_session in self._sessions.values():
+                http_session.close()
+            self._sessions = {}
 
     def get_headers(self, include_auth=True):
         """Obtener headers con autenticación si está disponible"""
+        from frontend.config import current_auth_token
+
         headers = {}
-        if include_auth and 'token' in session:
-            headers['Authorization'] = f"Bearer {session['token']}"
+        token = current_auth_token() if include_auth else None
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
         return headers
 
     def make_request(self, method, service_url, endpoint, data=None, include_auth=True, timeout=10):
@@ -33,14 +176,10 @@ class APIClient:
 
             self.logger.info(f"Making {method} request to {url}")
 
-            if method.upper() == 'GET':
-                response = self.session.get(url, headers=headers, timeout=timeout)
-            elif method.upper() == 'POST':
-                response = self.session.post(url, json=data, headers=headers, timeout=timeout)
-            elif method.upper() == 'PUT':
-                response = self.session.put(url, json=data, headers=headers, timeout=timeout)
-            elif method.upper() == 'DELETE':
-                response = self.session.delete(url, headers=headers, timeout=timeout)
+            if method.upper() in ('GET', 'DELETE'):
+                response = self.request(method, url, headers=headers, timeout=timeout)
+            elif method.upper() in ('POST', 'PUT'):
+                response = self.request(method, url, json=data, headers=headers, timeout=timeout)
             else:
                 raise ValueError(f"Método HTTP no soportado: {method}")
 
@@ -182,4 +321,43 @@ class APIClient:
             'appointment_details': appointment_details,
             'email': email,
             'phone': phone
-        })
\ No newline at end of file
+        })
+
+
+class AsyncAPIClient:
+    """
+    Variante asyncio del APIClient para lanzar llamadas concurrentes con await/gather.
+
+    Las peticiones se ejecutan en un pool de hilos sobre los mismos pools de
+    conexiones del APIClient, así que comparten las conexiones keep-alive.
+    """
+
+    def __init__(self, api_client, executor=None):
+        self.api_client = api_client
+        self.executor = executor
+
+    async def request(self, method, url, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(self.api_client.request, method, url, **kwargs))
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request('PUT', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request('DELETE', url, **kwargs)
+
+    async def gather(self, *requests_args, return_exceptions=True):
+        """
+        Ejecutar varias peticiones a la vez.
+        requests_args: tuplas (method, url, kwargs); devuelve las respuestas en el mismo orden
+        """
+        return await asyncio.gather(
+            *(self.request(method, url, **(kwargs or {})) for method, url, kwargs in requests_args),
+            return_exceptions=return_exceptions
+        )
@@ -0,0 +1,134 @@
+# frontend/app/services/auth_claims.py
+import base64
+import hashlib
+import json
+import time
+
+from flask import current_app, g, request, session
+
+
+class AuthClaims:
+    """
+    Modo de sesión 'claims' (SESSION_MODE = 'claims').
+
+    Los datos necesarios para autorizar y llamar a los microservicios (id, rol, nombre,
+    token y su caducidad) viajan en una cookie compacta firmada y cifrada (Fernet), de
+    modo que role_required / login_required y las cabeceras Authorization no consultan
+    el almacén de sesiones. La sesión del servidor se mantiene para el resto del estado.
+
+    La cookie se reescribe cuando cambia la sesión (login, actualización de perfil) y
+    se borra al cerrar sesión; un cambio de rol hecho por otro usuario se aplica cuando
+    caduca el token.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.cookie_name = 'vet_auth'
+        self._fernet = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SESSION_MODE', 'server') == 'claims'
+        self.cookie_name = app.config.get('AUTH_CLAIMS_COOKIE_NAME', 'vet_auth')
+        self.lifetime = int(app.permanent_session_lifetime.total_seconds())
+        app.extensions['auth_claims'] = self
+
+        if self.enabled:
+            from cryptography.fernet import Fernet
+
+            # Clave propia derivada de SECRET_KEY (no se reutiliza la de firma de sesiones)
+            digest = hashlib.sha256(f"auth-claims:{app.secret_key}".encode()).digest()
+            self._fernet = Fernet(base64.urlsafe_b64encode(digest))
+            app.after_request(self._sync_cookie)
+
+    # =============== LECTURA ===============
+
+    def current_user(self):
+        """
+        Usuario para comprobar permisos: dict con al menos 'id' y 'role', o None.
+        En modo 'claims' se lee de la cookie; si no hay cookie válida se usa la sesión
+        (y se emite la cookie en la respuesta).
+        """
+        if not self.enabled:
+            return session.get('user')
+
+        claims = self._read_cookie()
+        if claims is not None:
+            return claims
+
+        user = session.get('user')
+        if user:
+            g.auth_claims_refresh = True
+        return user
+
+    def current_token(self):
+        """Token del Auth Service del usuario: de la cookie en modo 'claims', si no de la sesión"""
+        if self.enabled and self._read_cookie() is not None and g.get('auth_claims_token'):
+            return g.auth_claims_token
+
+        token = session.get('token')
+        if self.enabled and token:
+            g.auth_claims_refresh = True  # cookie anterior sin token: reemitirla
+        return token
+
+    def _read_cookie(self):
+        if 'auth_claims' in g:
+            return g.auth_claims
+
+        claims = None
+        g.auth_claims_token = None
+        value = request.cookies.get(self.cookie_name)
+        if value:
+            from cryptography.fernet import InvalidToken
+
+            try:
+                data = json.loads(self._fernet.decrypt(value.encode(), ttl=self.lifetime))
+                if data.get('e', 0) > time.time():
+                    claims = {'id': data['i'], 'role': data['r'], 'name': data['n'], 'token_expires_at': data['e']}
+                    g.auth_claims_token = data.get('t')
+            except (InvalidToken, ValueError, KeyError):
+                claims = None
+
+        g.auth_claims = claims
+        return claims
+
+    # =============== ESCRITURA ===============
+
+    def _token_expiration(self, token):
+        """'exp' del JWT del Auth Service (sin verificar: solo para no sobrevivir al token)"""
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            return int(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+        except Exception:
+            return int(time.time()) + self.lifetime
+
+    def _sync_cookie(self, response):
+        # Solo si la sesión cambió (o faltaba la cookie): no obliga a leer el almacén
+        if not getattr(session, 'modified', False) and not g.get('auth_claims_refresh'):
+            return response
+
+        user = session.get('user')
+        token = session.get('token')
+        if user and token:
+            claims = {
+                'i': user.get('id'),
+                'r': user.get('role'),
+                'n': f"{user.get('first_name', '')} {user.get('last_name', '')}".strip(),
+                't': token,
+                'e': self._token_expiration(token)
+            }
+            value = self._fernet.encrypt(json.dumps(claims, separators=(',', ':')).encode()).decode()
+            response.set_cookie(
+                self.cookie_name, value,
+                max_age=max(int(claims['e'] - time.time()), 0),
+                httponly=True,
+                secure=current_app.config.get('SESSION_COOKIE_SECURE', False),
+                samesite='Lax'
+            )
+        elif request.cookies.get(self.cookie_name):
+            response.delete_cookie(self.cookie_name)
+
+        return response
+
@@ -0,0 +1,188 @@
+# frontend/app/services/db_pool.py
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions as pg_extensions
+from flask import g
+
+
+class PoolTimeout(Exception):
+    """No quedó ninguna conexión libre dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones PostgreSQL para la facturación del frontend.
+
+    Cada petición toma como mucho una conexión (connection()) que se devuelve sola al
+    terminar, con rollback si quedó una transacción abierta. Las conexiones que llevan
+    más de DB_POOL_HEALTH_CHECK_INTERVAL segundos sin usarse se comprueban con SELECT 1
+    antes de entregarlas y las que superan DB_POOL_MAX_LIFETIME se reemplazan. Con las
+    DB_POOL_MAX_SIZE conexiones ocupadas se espera hasta DB_POOL_CHECKOUT_TIMEOUT.
+    """
+
+    def __init__(self, app=None):
+        self._idle = deque()   # (conexión, creada_en, usada_en); la última es la más reciente
+        self._in_use = {}      # id(conexión) -> creada_en
+        self._size = 0         # abiertas: libres + en uso + conectándose
+        self._cond = threading.Condition()
+        self.metrics = {
+            'checkouts': 0,
+            'reused': 0,
+            'created': 0,
+            'closed': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connect_errors': 0,
+            'failed_health_checks': 0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.connect_kwargs = {
+            'host': app.config.get('POSTGRES_HOST', 'localhost'),
+            'port': app.config.get('POSTGRES_PORT', '5432'),
+            'database': app.config.get('POSTGRES_DB', 'veterinary-system'),
+            'user': app.config.get('POSTGRES_USER', 'postgres'),
+            'password': app.config.get('POSTGRES_PASSWORD'),
+            'connect_timeout': app.config.get('DB_CONNECT_TIMEOUT', 10)
+        }
+        self.max_size = app.config.get('DB_POOL_MAX_SIZE', 10)
+        self.checkout_timeout = app.config.get('DB_POOL_CHECKOUT_TIMEOUT', 5)
+        self.health_check_interval = app.config.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)
+        self.max_lifetime = app.config.get('DB_POOL_MAX_LIFETIME', 1800)
+
+        app.extensions['db_pool'] = self
+        app.teardown_appcontext(self._release_request_connection)
+
+    # =============== CONEXIÓN DE LA PETICIÓN ===============
+
+    def connection(self):
+        """Conexión de la petición actual (la misma en toda la petición)"""
+        if 'db_pool_connection' not in g:
+            g.db_pool_connection = self.acquire()
+        return g.db_pool_connection
+
+    def _release_request_connection(self, exception=None):
+        conn = g.pop('db_pool_connection', None)
+        if conn is not None:
+            self.release(conn)
+
+    # =============== CHECKOUT / DEVOLUCIÓN ===============
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        with self._cond:
+            self.metrics['checkouts'] += 1
+
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics['timeouts'] += 1
+                        raise PoolTimeout(f"Las {self.max_size} conexiones a PostgreSQL están ocupadas")
+                    if not waited:
+                        self.metrics['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                else:
+                    self._size += 1
+                    conn = None
+
+            if conn is None:
+                return self._open()
+
+            if self._healthy(conn, created_at, last_used):
+                with self._cond:
+                    self.metrics['reused'] += 1
+                    self._in_use[id(conn)] = created_at
+                return conn
+
+            self._discard(conn)
+
+    def release(self, conn, discard=False):
+        """Devolver una conexión al pool (con rollback si quedó una transacción abierta)"""
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), time.time())
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != pg_extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed or time.time() - created_at > self.max_lifetime:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.time()))
+            self._cond.notify()
+
+    def _open(self):
+        try:
+            conn = psycopg2.connect(**self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self.metrics['connect_errors'] += 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.metrics['created'] += 1
+            self._in_use[id(conn)] = time.time()
+        return conn
+
+    def _healthy(self, conn, created_at, last_used):
+        if conn.closed or time.time() - created_at > self.max_lifetime:
+            return False
+        if time.time() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self.metrics['failed_health_checks'] += 1
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.metrics['closed'] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Cerrar las conexiones libres (las que están en uso se cierran al devolverlas)"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    # =============== MÉTRICAS ===============
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                **self.metrics
+            }
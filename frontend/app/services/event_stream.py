@@ -0,0 +1,169 @@
+# frontend/app/services/event_stream.py
+import json
+import logging
+import queue
+import threading
+import time
+
+from utils.events import EVENTS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_MAX_DELAY = 30
+
+
+def format_sse(event_type, data):
+    """Mensaje Server-Sent Events: 'event: tipo' + 'data: json' + línea en blanco"""
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class Subscription:
+    """Conexión SSE abierta: usuario, rol y la cola de eventos pendientes de enviar"""
+
+    def __init__(self, user_id, role):
+        self.user_id = str(user_id) if user_id else None
+        self.role = role
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, message):
+        users = message.get('users') or []
+        roles = message.get('roles') or []
+        if not users and not roles:
+            return True
+        return self.user_id in users or self.role in roles
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Cliente demasiado lento: descartar lo pendiente y pedirle que recargue todo
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait({'type': 'resync', 'data': {}})
+
+
+class EventBroker:
+    """
+    Canal de eventos en tiempo real para los dashboards (sustituye a los setInterval).
+
+    Un único hilo por proceso escucha el canal de Redis en el que publican los
+    microservicios (utils/events.py) y reparte cada evento a las conexiones SSE abiertas
+    cuyo usuario o rol esté entre los destinatarios. Cuando Redis se cae o vuelve se avisa
+    a los navegadores con un evento 'status' para que pasen a consultar periódicamente
+    o vuelvan a recargar sus datos una vez.
+    """
+
+    def __init__(self, app=None):
+        self.connected = False
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EVENTS_ENABLED', True)
+        self.redis_url = app.config.get('EVENTS_REDIS_URL') or app.config.get('REDIS_URL')
+        self.heartbeat = app.config.get('EVENTS_HEARTBEAT', 15)
+        self.max_stream_seconds = app.config.get('EVENTS_MAX_STREAM_SECONDS', 600)
+        app.extensions['event_broker'] = self
+
+    # =============== SUSCRIPCIONES ===============
+
+    def subscribe(self, user_id, role):
+        subscription = Subscription(user_id, role)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(message):
+                subscription.push(message)
+
+    def stream(self, user_id, role):
+        """Generador SSE para una conexión; se cierra tras EVENTS_MAX_STREAM_SECONDS"""
+        subscription = self.subscribe(user_id, role)
+
+        def generate():
+            try:
+                yield 'retry: 5000\n\n'
+                yield format_sse('ready', {'live': self.connected})
+                deadline = time.monotonic() + self.max_stream_seconds
+                while time.monotonic() < deadline:
+                    try:
+                        message = subscription.queue.get(timeout=self.heartbeat)
+                    except queue.Empty:
+                        # Comentario SSE: mantiene viva la conexión a través de proxies
+                        yield ': ping\n\n'
+                        continue
+                    yield format_sse(message['type'], message.get('data') or {})
+            finally:
+                self.unsubscribe(subscription)
+
+        return generate()
+
+    # =============== LISTENER DE REDIS ===============
+
+    def start(self):
+        """Arrancar el hilo del listener con la primera suscripción del proceso"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen, name='event-broker', daemon=True)
+            self._thread.start()
+
+    def _set_connected(self, connected):
+        if connected == self.connected:
+            return
+        self.connected = connected
+        self.dispatch({'type': 'status', 'data': {'live': connected}})
+
+    def _listen(self):
+        try:
+            import redis
+        except ImportError:
+            logger.warning("redis no está instalado: los dashboards consultarán periódicamente")
+            return
+
+        delay = 1
+        while True:
+            pubsub = None
+            try:
+                client = redis.Redis.from_url(self.redis_url, socket_connect_timeout=2, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                self._set_connected(True)
+                delay = 1
+                while True:
+                    raw = pubsub.get_message(timeout=1.0)
+                    if raw is None:
+                        continue
+                    try:
+                        self.dispatch(json.loads(raw['data']))
+                    except (TypeError, ValueError, KeyError) as e:
+                        logger.warning(f"Evento inválido en {EVENTS_CHANNEL}: {e}")
+            except Exception as e:
+                logger.warning(f"Canal de eventos desconectado ({e}); reintento en {delay}s")
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            self._set_connected(False)
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
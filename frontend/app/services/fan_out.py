@@ -0,0 +1,103 @@
+# frontend/app/services/fan_out.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app, copy_current_request_context, has_request_context
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_task_deadline = threading.local()
+
+
+class FanOutDeadlineExceeded(Exception):
+    """La tarea empezó (o siguió) cuando el plazo del fan-out ya había vencido"""
+
+
+def remaining_fan_out_time():
+    """Segundos que le quedan a la tarea de fan-out del hilo actual (None fuera de un fan-out)"""
+    deadline_at = getattr(_task_deadline, 'at', None)
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def get_fan_out_executor():
+    """
+    Obtener el pool de hilos compartido (acotado) para llamadas a microservicios.
+
+    future.cancel() no detiene una tarea en marcha, así que APIClient recorta el timeout
+    de cada petición al tiempo que le queda a la tarea (remaining_fan_out_time) y las
+    tareas que salen de la cola con el plazo vencido no llegan a ejecutarse. Con un
+    microservicio lento cada hilo queda libre en unos FAN_OUT_DEADLINE segundos, por lo
+    que el pool absorbe como mucho FAN_OUT_MAX_WORKERS llamadas lentas por plazo.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = current_app.config.get('FAN_OUT_MAX_WORKERS', 16)
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fan-out')
+    return _executor
+
+
+def fan_out(calls, deadline=None, defaults=None):
+    """
+    Ejecutar en paralelo llamadas independientes a microservicios.
+
+    calls: dict nombre -> función sin argumentos que hace la llamada y devuelve el dato ya procesado
+    deadline: segundos máximos para todas las llamadas de la página (FAN_OUT_DEADLINE por defecto)
+    defaults: dict nombre -> valor a usar si la llamada falla o no termina a tiempo
+
+    Devuelve un dict nombre -> resultado, de modo que la página tarda lo que el
+    microservicio más lento y no la suma de todos.
+    """
+    defaults = defaults or {}
+    if deadline is None:
+        deadline = current_app.config.get('FAN_OUT_DEADLINE', 10)
+
+    executor = get_fan_out_executor()
+    deadline_at = time.monotonic() + deadline
+    futures = {}
+    for name, call in calls.items():
+        call = _bounded(call, deadline_at)
+        # Cada hilo necesita su propia copia del contexto (session, current_app)
+        if has_request_context():
+            call = copy_current_request_context(call)
+        futures[executor.submit(call)] = name
+
+    done, not_done = wait(futures, timeout=deadline)
+
+    results = {}
+    for future, name in futures.items():
+        if future in not_done:
+            future.cancel()
+            logger.warning(f"Llamada '{name}' superó el plazo de {deadline}s")
+            results[name] = defaults.get(name)
+            continue
+
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.warning(f"Error en llamada '{name}': {e}")
+            results[name] = defaults.get(name)
+
+    return results
+
+
+def _bounded(call, deadline_at):
+    """La llamada con el plazo visible para APIClient; si ya venció en la cola, no se ejecuta"""
+
+    def run():
+        if time.monotonic() >= deadline_at:
+            raise FanOutDeadlineExceeded('plazo vencido antes de empezar')
+        _task_deadline.at = deadline_at
+        try:
+            return call()
+        finally:
+            _task_deadline.at = None
+
+    return run
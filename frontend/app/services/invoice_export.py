@@ -0,0 +1,235 @@
+# frontend/app/services/invoice_export.py
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_CHUNK_SIZE = 2000
+
+HEADER_FONT = Font(bold=True, color='FFFFFF')
+HEADER_FILL = PatternFill('solid', fgColor='52B788')
+
+INVOICE_COLUMNS = [
+    ('ID', 38), ('Fecha', 20), ('Cliente', 30), ('Mascota', 20), ('Subtotal', 14),
+    ('IVA', 12), ('Total', 14), ('Método de Pago', 16), ('Estado', 12)
+]
+ITEM_COLUMNS = [
+    ('Factura', 38), ('Fecha', 20), ('Medicamento/Servicio', 36), ('Presentación', 18),
+    ('Concentración', 16), ('Cantidad', 10), ('Precio Unitario', 16), ('Total', 14)
+]
+
+# Fecha con la que se ordena y filtra: facturas antiguas pueden no tener invoice_date.
+# Debe coincidir con la expresión del índice idx_invoices_sort_key_id (update_database.py)
+INVOICE_SORT_KEY = "COALESCE(i.invoice_date, i.created_at, TIMESTAMP 'epoch')"
+
+# {where} son las condiciones de billing_invoice_filters() sobre el alias i; {sort_key} es INVOICE_SORT_KEY
+INVOICES_QUERY = """
+    SELECT i.id, i.invoice_date,
+           COALESCE(u.first_name || ' ' || u.last_name, 'Cliente desconocido'),
+           COALESCE(p.name, 'Mascota desconocida'),
+           i.subtotal, i.tax_amount, i.total_amount, i.payment_method, i.status
+    FROM invoices i
+    LEFT JOIN users u ON i.client_id::UUID = u.id
+    LEFT JOIN pets p ON i.pet_id::UUID = p.id
+    {where}
+    ORDER BY {sort_key} DESC, i.id DESC
+"""
+ITEMS_QUERY = """
+    SELECT it.invoice_id, i.invoice_date, it.item_name, it.presentation, it.concentration,
+           it.quantity, it.unit_price, it.total_price
+    FROM invoice_items it
+    JOIN invoices i ON i.id = it.invoice_id
+    {where}
+    ORDER BY {sort_key} DESC, i.id DESC, it.created_at
+"""
+
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _append_header(sheet, columns):
+    # En modo write-only los anchos y la fila fija se definen antes de la primera fila
+    for index, (_, width) in enumerate(columns, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+    sheet.freeze_panes = 'A2'
+
+    cells = []
+    for title, _ in columns:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cells.append(cell)
+    sheet.append(cells)
+
+
+def _stream_rows(conn, query, params, chunk_size):
+    """Filas de un cursor con nombre, leídas del servidor por bloques"""
+    cur = conn.cursor(name=f"xlsx_export_{uuid.uuid4().hex}")
+    try:
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+
+def write_invoices_xlsx(conn, where, params, path, include_items=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Escribir las facturas (y opcionalmente sus items en una segunda hoja) en un XLSX.
+
+    El libro es write-only: cada fila pasa del cursor a un archivo temporal de openpyxl,
+    así que la memoria no depende del número de filas. Con items, las dos hojas se leen
+    en una misma transacción REPEATABLE READ para que cuadren entre sí (se descarta
+    cualquier transacción abierta de la conexión). Devuelve (facturas, items) escritos.
+    """
+    if include_items:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+
+    workbook = Workbook(write_only=True)
+    invoices_sheet = workbook.create_sheet('Facturas')
+    _append_header(invoices_sheet, INVOICE_COLUMNS)
+    invoices = 0
+    for row in _stream_rows(conn, INVOICES_QUERY.format(where=where, sort_key=INVOICE_SORT_KEY), params, chunk_size):
+        invoices_sheet.append([str(row[0])] + list(row[1:]))
+        invoices += 1
+
+    items = 0
+    if include_items:
+        items_sheet = workbook.create_sheet('Items')
+        _append_header(items_sheet, ITEM_COLUMNS)
+        for row in _stream_rows(conn, ITEMS_QUERY.format(where=where, sort_key=INVOICE_SORT_KEY), params, chunk_size):
+            items_sheet.append([str(row[0])] + list(row[1:]))
+            items += 1
+
+    workbook.save(path)
+    return invoices, items
+
+
+class ExportJobs:
+    """
+    Exportaciones XLSX grandes en segundo plano.
+
+    Cada trabajo queda en EXPORT_JOBS_DIR como '<id>.json' (estado) y '<id>.xlsx' (resultado),
+    así cualquier proceso del frontend puede consultar el estado o servir la descarga. Los
+    trabajos se ejecutan de EXPORT_JOB_WORKERS en EXPORT_JOB_WORKERS con una conexión propia
+    del pool y se borran EXPORT_JOB_TTL segundos después de crearse.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('EXPORT_JOBS_DIR') or \
+            os.path.join(app.config['UPLOAD_FOLDER'], 'exports')
+        self.max_workers = app.config.get('EXPORT_JOB_WORKERS', 1)
+        self.ttl = app.config.get('EXPORT_JOB_TTL', 3600)
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['export_jobs'] = self
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='export-jobs')
+        return self._executor
+
+    # =============== TRABAJOS ===============
+
+    def submit(self, pool, user_id, where, params, include_items=False, filters=None):
+        """Encolar una exportación; pool es el ConnectionPool de la aplicación"""
+        self.cleanup()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'pending',
+            'user_id': str(user_id) if user_id else None,
+            'include_items': include_items,
+            'filters': filters or {},
+            'invoices': 0,
+            'items': 0,
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        self._save(job)
+        self._get_executor().submit(self._run, pool, dict(job), where, params)
+        return job
+
+    def _run(self, pool, job, where, params):
+        job['status'] = 'running'
+        self._save(job)
+
+        path = self.file_path(job['id'])
+        temp_path = f"{path}.tmp"
+        conn = None
+        try:
+            conn = pool.acquire()
+            invoices, items = write_invoices_xlsx(conn, where, params, temp_path, job['include_items'])
+            os.replace(temp_path, path)
+            job.update(status='done', invoices=invoices, items=items)
+        except Exception as e:
+            logger.warning(f"Exportación {job['id']} fallida: {e}")
+            job.update(status='failed', error=str(e))
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        finally:
+            if conn is not None:
+                pool.release(conn)
+
+        job['finished_at'] = time.time()
+        self._save(job)
+
+    def get(self, job_id):
+        if not JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._meta_path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def file_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.xlsx")
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _save(self, job):
+        # Escritura atómica: otro proceso nunca lee un JSON a medias
+        path = self._meta_path(job['id'])
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, default=str)
+        os.replace(temp_path, path)
+
+    def cleanup(self):
+        """Borrar los trabajos (estado y archivo) con más de EXPORT_JOB_TTL segundos"""
+        limit = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
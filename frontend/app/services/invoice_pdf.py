@@ -0,0 +1,227 @@
+# frontend/app/services/invoice_pdf.py
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Cambiar al modificar el diseño del PDF: invalida todo lo cacheado
+RENDERER_VERSION = '1'
+
+PRIMARY = colors.HexColor('#2D6A4F')
+ACCENT = colors.HexColor('#52B788')
+LIGHT = colors.HexColor('#D8F3DC')
+
+
+def invoice_content_hash(invoice, items):
+    """Hash de todo lo que aparece en el PDF (factura + items + versión del diseño)"""
+    payload = json.dumps({'invoice': invoice, 'items': items, 'version': RENDERER_VERSION},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _money(value):
+    return f"${float(value or 0):,.2f}"
+
+
+def _text(value, default='N/A'):
+    return escape(str(value)) if value not in (None, '') else default
+
+
+def _date(value, fmt):
+    if not value:
+        return 'N/A'
+    return value.strftime(fmt) if hasattr(value, 'strftime') else str(value)
+
+
+def render_invoice_pdf(invoice, items):
+    """PDF de la factura con reportlab; mismo contenido -> mismos bytes (invariant)"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=1,
+                            title=f"Factura {invoice.get('id', '')}",
+                            leftMargin=2 * cm, rightMargin=2 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm)
+
+    styles = getSampleStyleSheet()
+    center = ParagraphStyle('center', parent=styles['Normal'], alignment=TA_CENTER, textColor=ACCENT, fontSize=9)
+    title = ParagraphStyle('title', parent=styles['Title'], textColor=PRIMARY, fontSize=20, spaceAfter=4)
+    subtitle = ParagraphStyle('subtitle', parent=styles['Heading2'], alignment=TA_CENTER, textColor=PRIMARY)
+    section = ParagraphStyle('section', parent=styles['Heading4'], textColor=PRIMARY, spaceAfter=4)
+    normal = ParagraphStyle('normal', parent=styles['Normal'], textColor=PRIMARY, fontSize=9)
+    right = ParagraphStyle('right', parent=normal, alignment=TA_RIGHT)
+
+    story = [
+        Paragraph('CLÍNICA VETERINARIA', title),
+        Paragraph('NIT: 123.456.789-0 | Tel: (601) 234-5678<br/>'
+                  'Dirección: Calle 123 #45-67, Bogotá, Colombia<br/>'
+                  'Email: info@clinicaveterinaria.com', center),
+        Spacer(1, 0.4 * cm),
+        Paragraph('FACTURA DE VENTA', subtitle),
+        Paragraph(f"No. {_text(invoice.get('id'))}", center),
+        Spacer(1, 0.6 * cm)
+    ]
+
+    # Cliente | factura
+    client_info = [
+        Paragraph('INFORMACIÓN DEL CLIENTE', section),
+        Paragraph(f"<b>Nombre:</b> {_text(invoice.get('client_name'), 'Cliente desconocido')}", normal),
+        Paragraph(f"<b>Email:</b> {_text(invoice.get('client_email'))}", normal),
+        Paragraph(f"<b>Teléfono:</b> {_text(invoice.get('client_phone'))}", normal),
+        Paragraph(f"<b>Mascota:</b> {_text(invoice.get('pet_name'))} ({_text(invoice.get('pet_species'), '')})", normal)
+    ]
+    invoice_info = [
+        Paragraph('INFORMACIÓN DE FACTURA', section),
+        Paragraph(f"<b>Fecha:</b> {_date(invoice.get('invoice_date'), '%Y-%m-%d')}", normal),
+        Paragraph(f"<b>Hora:</b> {_date(invoice.get('invoice_date'), '%H:%M')}", normal),
+        Paragraph(f"<b>Método Pago:</b> {_text((invoice.get('payment_method') or '').title())}", normal),
+        Paragraph(f"<b>Estado:</b> {_text((invoice.get('status') or '').title())}", normal)
+    ]
+    details = Table([[client_info, invoice_info]], colWidths=[doc.width / 2] * 2)
+    details.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+    story += [details, Spacer(1, 0.6 * cm)]
+
+    # Medicamentos / servicios
+    rows = [['Medicamento/Servicio', 'Cantidad', 'Precio Unitario', 'Total']]
+    for item in items:
+        rows.append([
+            Paragraph(_text(item.get('item_name'), 'Medicamento'), normal),
+            str(item.get('quantity', 1)),
+            _money(item.get('unit_price')),
+            _money(item.get('total_price'))
+        ])
+    if not items:
+        rows.append(['No hay medicamentos registrados', '', '', ''])
+
+    items_table = Table(rows, colWidths=[doc.width * 0.46, doc.width * 0.14, doc.width * 0.2, doc.width * 0.2],
+                        repeatRows=1)
+    items_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), ACCENT),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 1), (-1, -1), PRIMARY),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, LIGHT]),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.5, ACCENT)
+    ]))
+    story += [items_table, Spacer(1, 0.5 * cm)]
+
+    # Totales
+    subtotal = invoice.get('subtotal')
+    if subtotal is None:
+        subtotal = sum(float(item.get('total_price') or 0) for item in items)
+    totals = Table([
+        ['Subtotal:', _money(subtotal)],
+        ['IVA (19%):', _money(invoice.get('tax_amount'))],
+        ['TOTAL:', _money(invoice.get('total_amount'))]
+    ], colWidths=[doc.width * 0.2, doc.width * 0.2], hAlign='RIGHT')
+    totals.setStyle(TableStyle([
+        ('TEXTCOLOR', (0, 0), (-1, -1), PRIMARY),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 2), (-1, 2), 12),
+        ('LINEABOVE', (0, 2), (-1, 2), 1, PRIMARY)
+    ]))
+    story += [totals, Spacer(1, 0.6 * cm)]
+
+    if invoice.get('observations'):
+        story += [
+            Paragraph('Observaciones:', section),
+            Paragraph(_text(invoice.get('observations')).replace('\n', '<br/>'), normal),
+            Spacer(1, 0.6 * cm)
+        ]
+
+    # Sin datetime.now(): el PDF solo depende de los datos de la factura
+    story += [
+        Paragraph('<b>¡Gracias por confiar en nosotros para el cuidado de tu mascota!</b>', center),
+        Paragraph(f"Factura emitida el {_date(invoice.get('invoice_date'), '%d/%m/%Y %H:%M:%S')}", center),
+        Paragraph('Para consultas sobre esta factura, contáctanos al (601) 234-5678', center)
+    ]
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+class InvoicePdfCache:
+    """
+    PDFs de facturas ya generados, en disco como '<id_factura>.<hash>.pdf'.
+
+    El hash cubre todos los datos impresos, así que una factura modificada produce otro
+    archivo (y otro ETag). Durante INVOICE_PDF_REVALIDATE_SECONDS tras generarlo o
+    comprobarlo, el PDF se sirve sin consultar la base de datos; pasado ese tiempo la
+    siguiente petición recalcula el hash y solo vuelve a generar si cambió.
+    """
+
+    def __init__(self, app=None):
+        self._checked = {}  # id_factura -> (hash, comprobado_en)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache_dir = app.config.get('INVOICE_PDF_CACHE_DIR') or \
+            os.path.join(app.config['UPLOAD_FOLDER'], 'cache', 'invoices')
+        self.revalidate_after = app.config.get('INVOICE_PDF_REVALIDATE_SECONDS', 300)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        app.extensions['invoice_pdf_cache'] = self
+
+    def path_for(self, invoice_id, content_hash):
+        return os.path.join(self.cache_dir, f"{invoice_id}.{content_hash}.pdf")
+
+    def lookup(self, invoice_id):
+        """(hash, ruta) del PDF vigente si se puede servir sin consultar la base de datos"""
+        with self._lock:
+            entry = self._checked.get(invoice_id)
+        if entry is None:
+            # Tras un reinicio: lo que haya en disco vale desde su última modificación
+            for path in glob.glob(os.path.join(glob.escape(self.cache_dir), f"{glob.escape(invoice_id)}.*.pdf")):
+                content_hash = os.path.basename(path)[len(invoice_id) + 1:-len('.pdf')]
+                entry = (content_hash, os.path.getmtime(path))
+                break
+        if entry is None or time.time() - entry[1] > self.revalidate_after:
+            return None
+        path = self.path_for(invoice_id, entry[0])
+        return (entry[0], path) if os.path.exists(path) else None
+
+    def get_or_render(self, invoice_id, invoice, items):
+        """(hash, ruta) del PDF para estos datos, generándolo solo si no existe"""
+        content_hash = invoice_content_hash(invoice, items)
+        path = self.path_for(invoice_id, content_hash)
+        if not os.path.exists(path):
+            data = render_invoice_pdf(invoice, items)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        else:
+            os.utime(path)
+        self._forget_other_versions(invoice_id, content_hash)
+
+        with self._lock:
+            self._checked[invoice_id] = (content_hash, time.time())
+        return content_hash, path
+
+    def invalidate(self, invoice_id):
+        """Borrar los PDFs de una factura (tras modificarla o eliminarla)"""
+        with self._lock:
+            self._checked.pop(invoice_id, None)
+        self._forget_other_versions(invoice_id, None)
+
+    def _forget_other_versions(self, invoice_id, keep_hash):
+        for path in glob.glob(os.path.join(glob.escape(self.cache_dir), f"{glob.escape(invoice_id)}.*.pdf")):
+            if keep_hash is None or not path.endswith(f".{keep_hash}.pdf"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,71 @@
+# frontend/app/services/photo_index.py
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+LOCAL = 'local'
+REMOTE = 'remote'
+ABSENT = 'absent'
+
+
+class PhotoIndex:
+    """
+    Dónde está cada foto de mascota: en el frontend (local), en el Medical Service (remote)
+    o en ningún sitio (absent).
+
+    Las fotos ausentes se recuerdan durante negative_ttl segundos para no volver a
+    preguntar al Medical Service en cada listado; una subida nueva de la mascota las olvida.
+    """
+
+    def __init__(self, negative_ttl=300, max_entries=5000):
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (pet_id, archivo) -> (ubicación, expira_en)
+        self._lock = threading.Lock()
+
+    def get(self, pet_id, filename):
+        """Ubicación conocida de la foto o None si hay que buscarla"""
+        key = (str(pet_id), filename)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            location, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return location
+
+    def mark(self, pet_id, filename, location):
+        expires_at = time.time() + self.negative_ttl if location == ABSENT else None
+        with self._lock:
+            self._entries[(str(pet_id), filename)] = (location, expires_at)
+            self._entries.move_to_end((str(pet_id), filename))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, pet_id):
+        """Olvidar lo que se sabe de las fotos de una mascota (tras subir una nueva)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == str(pet_id)]:
+                del self._entries[key]
+
+
+_photo_index = None
+_photo_index_lock = threading.Lock()
+
+
+def get_photo_index():
+    """Obtener el índice de fotos del proceso (configurado con PHOTO_INDEX_*)"""
+    global _photo_index
+    if _photo_index is None:
+        with _photo_index_lock:
+            if _photo_index is None:
+                _photo_index = PhotoIndex(
+                    negative_ttl=current_app.config.get('PHOTO_INDEX_NEGATIVE_TTL', 300),
+                    max_entries=current_app.config.get('PHOTO_INDEX_MAX_ENTRIES', 5000)
+                )
+    return _photo_index
@@ -0,0 +1,199 @@
+# frontend/app/services/photo_replication.py
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def _write_durable(path, data):
+    """Escribir un archivo completo (tmp + fsync + rename) para que sobreviva a un reinicio"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    _fsync_directory(os.path.dirname(path))
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class PhotoReplication:
+    """
+    Réplica asíncrona de las fotos subidas en el frontend hacia el Medical Service.
+
+    Cada subida deja un trabajo JSON en un directorio de cola (PHOTO_SPOOL_DIR) y la
+    petición responde en cuanto la foto y el trabajo están en disco. Un hilo del proceso
+    vacía la cola con reintentos y espera creciente; los trabajos que agotan los intentos
+    o que el Medical Service rechaza (4xx) pasan a 'failed/' para revisarlos a mano.
+
+    Con varios workers, cada trabajo se reclama renombrándolo a '.working' (solo uno lo
+    consigue); los reclamados por un proceso que murió vuelven a la cola pasados
+    PHOTO_REPLICATION_STALE_CLAIM segundos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.spool_dir = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.spool_dir = app.config.get('PHOTO_SPOOL_DIR') or os.path.join(app.config['UPLOAD_FOLDER'], 'spool', 'photos')
+        self.max_attempts = app.config.get('PHOTO_REPLICATION_MAX_ATTEMPTS', 8)
+        self.backoff = app.config.get('PHOTO_REPLICATION_BACKOFF', 5)
+        self.poll_interval = app.config.get('PHOTO_REPLICATION_POLL_INTERVAL', 10)
+        self.stale_claim_after = app.config.get('PHOTO_REPLICATION_STALE_CLAIM', 600)
+
+        os.makedirs(os.path.join(self.spool_dir, 'failed'), exist_ok=True)
+        app.extensions['photo_replication'] = self
+
+        self._requeue_stale_claims()
+        if app.config.get('PHOTO_REPLICATION_WORKER', True):
+            self.start()
+
+    # =============== COLA ===============
+
+    def enqueue(self, pet_id, photo_path, filename, content_type):
+        """
+        Encolar la réplica de una foto ya guardada localmente. El trabajo no guarda el token
+        del usuario: la réplica se envía con SERVICE_AUTH_TOKEN si está configurado
+        """
+        job_id = f"{time.time():.6f}-{uuid.uuid4().hex[:8]}"
+        job = {
+            'id': job_id,
+            'pet_id': str(pet_id),
+            'path': photo_path,
+            'filename': filename,
+            'content_type': content_type,
+            'attempts': 0,
+            'next_attempt_at': 0,
+            'created_at': time.time()
+        }
+        _write_durable(os.path.join(self.spool_dir, f"{job_id}.json"), job)
+        self._wakeup.set()
+        return job_id
+
+    def pending(self):
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith('.json'))
+
+    def _requeue_stale_claims(self):
+        now = time.time()
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith('.json.working'):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.stale_claim_after:
+                    os.replace(path, path[:-len('.working')])
+            except OSError:
+                continue
+
+    # =============== WORKER ===============
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='photo-replication', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.drain()
+            except Exception as e:
+                logger.warning(f"Error vaciando la cola de réplica de fotos: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def drain(self):
+        """Procesar los trabajos vencidos de la cola; devuelve cuántos se replicaron"""
+        replicated = 0
+        self._requeue_stale_claims()
+        for name in self.pending():
+            path = os.path.join(self.spool_dir, name)
+            claimed = f"{path}.working"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue  # otro proceso lo reclamó
+            try:
+                # rename conserva el mtime del trabajo: el reclamo cuenta desde ahora
+                os.utime(claimed)
+            except OSError:
+                continue
+
+            try:
+                with open(claimed, encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Trabajo de réplica ilegible {name}: {e}")
+                os.replace(claimed, os.path.join(self.spool_dir, 'failed', name))
+                continue
+
+            if job.get('next_attempt_at', 0) > time.time():
+                os.replace(claimed, path)
+                continue
+
+            if self._replicate(job, claimed, path):
+                replicated += 1
+        return replicated
+
+    def _replicate(self, job, claimed, path):
+        url = f"{self.app.config['MEDICAL_SERVICE_URL']}/medical/pets/{job['pet_id']}/photo"
+        service_token = self.app.config.get('SERVICE_AUTH_TOKEN')
+        headers = {'Authorization': f'Bearer {service_token}'} if service_token else {}
+        retryable = True
+
+        try:
+            with open(job['path'], 'rb') as photo:
+                response = self.app.api_client.post(
+                    url,
+                    files={'file': (job['filename'], photo, job.get('content_type') or 'application/octet-stream')},
+                    headers=headers,
+                    timeout=30
+                )
+            if response.status_code == 200:
+                os.remove(claimed)
+                logger.info(f"Foto {job['filename']} replicada en Medical Service (mascota {job['pet_id']})")
+                return True
+            # 4xx (salvo 408/429) no se arregla reintentando
+            retryable = response.status_code >= 500 or response.status_code in (408, 429)
+            error = f"HTTP {response.status_code}"
+        except FileNotFoundError:
+            retryable = False
+            error = 'la foto local ya no existe'
+        except Exception as e:
+            error = str(e)
+
+        job['attempts'] += 1
+        job['last_error'] = error
+        if not retryable or job['attempts'] >= self.max_attempts:
+            logger.error(f"Réplica de {job['filename']} abandonada tras {job['attempts']} intento(s): {error}")
+            _write_durable(claimed, job)
+            os.replace(claimed, os.path.join(self.spool_dir, 'failed', os.path.basename(path)))
+            return False
+
+        job['next_attempt_at'] = time.time() + self.backoff * (2 ** (job['attempts'] - 1))
+        logger.warning(f"Réplica de {job['filename']} fallida (intento {job['attempts']}): {error}")
+        _write_durable(claimed, job)
+        os.replace(claimed, path)
+        return False
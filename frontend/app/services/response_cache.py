@@ -0,0 +1,192 @@
+# frontend/app/services/response_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, copy_current_request_context, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """El microservicio no respondió o respondió con error: usar la última respuesta buena"""
+
+
+class ResponseCache:
+    """
+    Última respuesta buena por clave (usuario + vista + parámetros), compartida por el proceso.
+
+    fresh_ttl: segundos durante los que una respuesta se sirve sin llamar al microservicio
+    max_stale: segundos máximos que se sirve una respuesta antigua si el microservicio falla
+    """
+
+    def __init__(self, fresh_ttl=5, max_stale=3600, max_entries=1000, retries=3, retry_backoff=2):
+        self.fresh_ttl = fresh_ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._entries = OrderedDict()  # clave -> (payload, guardado_en, vigente_hasta)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def get(self, key):
+        """Obtener (payload, guardado_en, vigente) o None si no hay respuesta utilizable"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, stored_at, fresh_until = entry
+            if time.time() - stored_at > self.max_stale:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload, stored_at, time.time() < fresh_until
+
+    def store(self, key, payload):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (payload, now, now + self.fresh_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def expire(self, user_id=None):
+        """
+        Forzar la revalidación en la siguiente lectura (tras una escritura).
+        Las respuestas se conservan como última respuesta buena por si el microservicio falla.
+        """
+        with self._lock:
+            for key, (payload, stored_at, fresh_until) in self._entries.items():
+                if user_id is None or key[0] == user_id:
+                    self._entries[key] = (payload, stored_at, 0)
+
+    def is_refreshing(self, key):
+        return key in self._refreshing
+
+    def refresh_in_background(self, key, fetch):
+        """
+        Reintentar fetch en segundo plano con espera creciente hasta obtener una respuesta buena.
+        fetch devuelve el payload o lanza UpstreamUnavailable.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                for attempt in range(self.retries):
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+                    try:
+                        self.store(key, fetch())
+                        logger.info(f"Respuesta {key[1]} recuperada tras {attempt + 1} reintento(s)")
+                        return
+                    except Exception as e:
+                        logger.warning(f"Reintento {attempt + 1} de {key[1]} fallido: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name='response-cache-refresh', daemon=True).start()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Obtener la caché de respuestas del proceso (configurada con RESPONSE_CACHE_*)"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    fresh_ttl=current_app.config.get('RESPONSE_CACHE_FRESH_TTL', 5),
+                    max_stale=current_app.config.get('RESPONSE_CACHE_MAX_STALE', 3600),
+                    max_entries=current_app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1000),
+                    retries=current_app.config.get('RESPONSE_CACHE_RETRIES', 3)
+                )
+    return _response_cache
+
+
+def _payload_of(response):
+    """Payload JSON de una respuesta de vista si es una respuesta buena (200 y success)"""
+    status = 200
+    if isinstance(response, tuple):
+        response, status = response[0], response[1]
+    if status != 200 or not hasattr(response, 'get_json') or response.status_code != 200:
+        return None
+    payload = response.get_json(silent=True)
+    if not isinstance(payload, dict) or not payload.get('success'):
+        return None
+    return payload
+
+
+def last_known_good(view):
+    """
+    Decorador para APIs que leen de los microservicios.
+
+    - Respuesta vigente en caché: se devuelve sin llamar al microservicio.
+    - La vista responde bien: se guarda como última respuesta buena.
+    - La vista lanza UpstreamUnavailable: se devuelve la última respuesta buena marcada
+      con 'stale': True mientras se reintenta en segundo plano; si no hay, 503.
+    """
+
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        from frontend.config import current_auth_user
+
+        cache = get_response_cache()
+        user = current_auth_user() or {}
+        key = (user.get('id'), view.__name__, request.query_string.decode())
+
+        cached = cache.get(key)
+        if cached and cached[2]:
+            return jsonify(cached[0])
+
+        # Si ya hay un reintento en curso el microservicio está caído: no insistir
+        if cached and cache.is_refreshing(key):
+            return _stale_response(cached)
+
+        try:
+            response = view(*args, **kwargs)
+        except UpstreamUnavailable as e:
+            print(f"⚠️ {view.__name__}: microservicio no disponible ({e})")
+
+            @copy_current_request_context
+            def fetch():
+                payload = _payload_of(view(*args, **kwargs))
+                if payload is None:
+                    raise UpstreamUnavailable('respuesta no válida')
+                return payload
+
+            cache.refresh_in_background(key, fetch)
+
+            if cached:
+                return _stale_response(cached)
+            return jsonify({
+                'success': False,
+                'message': 'Servicio no disponible temporalmente',
+                'stale': False
+            }), 503
+
+        payload = _payload_of(response)
+        if payload is not None:
+            cache.store(key, payload)
+        return response
+
+    return decorated_function
+
+
+def _stale_response(cached):
+    payload, stored_at, _ = cached
+    return jsonify({
+        **payload,
+        'stale': True,
+        'stale_since': datetime.fromtimestamp(stored_at).isoformat(),
+        'message': 'Servicio no disponible - mostrando los últimos datos obtenidos'
+    })
@@ -0,0 +1,234 @@
+# frontend/app/services/session_store.py
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer, want_bytes
+
+
+class ServerSideSession(SessionMixin):
+    """
+    Sesión cuyo contenido vive en el almacén; en la cookie solo viaja el ID firmado.
+    El contenido se lee del almacén la primera vez que se usa (una petición que solo
+    necesita los claims de autenticación no llega a consultarlo).
+    """
+
+    def __init__(self, sid, loader=None, new=False):
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self._loader = loader
+        self._data = None if loader else {}
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._loader()
+            self._loader = None
+            if self._data is None:
+                # La sesión caducó o no existe: nunca reutilizar el ID recibido
+                self._data = {}
+                self.sid = secrets.token_urlsafe(32)
+                self.new = True
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self._data = {}
+        self._loader = None
+        self.modified = True
+
+
+class MemorySessionStore:
+    """Almacén en memoria del proceso (pruebas y desarrollo con un solo worker)"""
+
+    def __init__(self, cleanup_interval=60):
+        self._data = {}  # clave -> (valor, expira_en)
+        self._lock = threading.Lock()
+        self._cleanup_interval = cleanup_interval
+        self._last_cleanup = time.time()
+
+    def _cleanup(self, now):
+        """Eliminar sesiones caducadas (como mucho una vez por cleanup_interval)"""
+        if now - self._last_cleanup < self._cleanup_interval:
+            return
+        self._last_cleanup = now
+        for key in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            self._cleanup(now)
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+
+    def touch(self, key, ttl):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data[key] = (entry[0], time.time() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisSessionStore:
+    """Almacén Redis: la caducidad la aplica Redis (SETEX/EXPIRE), no hace falta limpiar"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(key, ttl, value)
+
+    def touch(self, key, ttl):
+        self.client.expire(key, ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class StoreSessionInterface(SessionInterface):
+    """
+    Sesiones del lado servidor sobre un almacén intercambiable (Redis o memoria).
+
+    Solo se escribe el contenido cuando la sesión cambió; si no, como mucho se
+    renueva la caducidad (EXPIRE en Redis, sin reenviar los datos).
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, key_prefix='session:', use_signer=True):
+        self.store = store
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='flask-session', key_derivation='hmac')
+
+    def _ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and self.use_signer:
+            try:
+                sid = self._signer(app).unsign(want_bytes(sid)).decode('utf-8')
+            except BadSignature:
+                sid = None
+
+        if sid:
+            return ServerSideSession(sid, loader=lambda: self._load(sid))
+
+        return ServerSideSession(secrets.token_urlsafe(32), new=True)
+
+    def _load(self, sid):
+        value = self.store.get(self.key_prefix + sid)
+        if value is None:
+            return None
+        try:
+            return self.serializer.loads(value)
+        except ValueError:
+            return None
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        refresh = app.config.get('SESSION_REFRESH_EACH_REQUEST', True)
+
+        if not session.loaded:
+            # No se leyó en esta petición: solo renovar la caducidad (las sesiones de login son permanentes)
+            if not refresh:
+                return
+            self.store.touch(self.key_prefix + session.sid, self._ttl(app))
+            expires = datetime.now(timezone.utc) + app.permanent_session_lifetime
+        else:
+            key = self.key_prefix + session.sid
+
+            if not session:
+                if session.modified:
+                    self.store.delete(key)
+                    response.delete_cookie(name, domain=domain, path=path)
+                return
+
+            if session.modified:
+                self.store.set(key, self.serializer.dumps(dict(session)), self._ttl(app))
+            elif session.permanent and refresh:
+                self.store.touch(key, self._ttl(app))
+            else:
+                return
+            expires = self.get_expiration_time(app, session)
+
+        sid = session.sid
+        if self.use_signer:
+            sid = self._signer(app).sign(want_bytes(sid)).decode('utf-8')
+
+        response.set_cookie(
+            name, sid,
+            expires=expires,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def init_session(app):
+    """
+    Configurar el almacén de sesiones según SESSION_BACKEND:
+    'redis' (REDIS_URL), 'memory' (pruebas) o 'filesystem' (Flask-Session).
+    """
+    backend = app.config.get('SESSION_BACKEND', 'filesystem')
+    prefix = app.config.get('SESSION_KEY_PREFIX', 'session:')
+    use_signer = app.config.get('SESSION_USE_SIGNER', True)
+
+    if backend == 'redis':
+        import redis
+
+        client = redis.Redis.from_url(app.config['REDIS_URL'])
+        app.session_interface = StoreSessionInterface(RedisSessionStore(client), prefix, use_signer)
+    elif backend == 'memory':
+        app.session_interface = StoreSessionInterface(MemorySessionStore(), prefix, use_signer)
+    else:
+        from flask_session import Session
+
+        Session(app)
+
+    return backend
@@ -0,0 +1,233 @@
+# frontend/app/services/static_assets.py
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import current_app, make_response, request, send_from_directory
+from jinja2.ext import Extension
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se generan variantes gzip
+    brotli = None
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:  # sin minificadores los assets se sirven tal cual (con hash y comprimidos)
+    rcssmin = rjsmin = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2')
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.svg')
+COMPRESS_MIN_SIZE = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# <script> y <style> en línea sin atributos (o solo con type por defecto)
+INLINE_BLOCK = re.compile(
+    r'<script(?:\s+type=["\']text/javascript["\'])?\s*>(?P<script>.*?)</script>'
+    r'|<style(?:\s+type=["\']text/css["\'])?\s*>(?P<style>.*?)</style>',
+    re.S | re.I
+)
+# Los bloques con sintaxis Jinja dependen de la petición: se quedan en la plantilla
+JINJA_SYNTAX = re.compile(r'\{\{|\{%|\{#')
+
+
+def minify(source, extension):
+    if extension == '.js' and rjsmin is not None:
+        return rjsmin.jsmin(source)
+    if extension == '.css' and rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class StaticAssets:
+    """
+    Assets estáticos con huella de contenido para el frontend.
+
+    build() copia js/, css/ e images/ a static/dist/ con el hash del contenido en el nombre
+    (minificando JS/CSS) y genera variantes .gz/.br; también extrae los <script>/<style>
+    en línea de las plantillas que no usan Jinja. url_for('static', filename='js/main.js')
+    devuelve la URL con hash, que se sirve con caché inmutable y la variante comprimida
+    que acepte el navegador.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}   # nombre lógico -> nombre con hash (relativo a dist/)
+        self.encodings = {}  # nombre con hash -> ['br', 'gzip']
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.dist_dir = os.path.join(app.static_folder, DIST_DIR)
+        self.enabled = app.config.get('STATIC_ASSETS_ENABLED', True)
+        app.extensions['static_assets'] = self
+
+        # La plantilla se preprocesa al compilarla (una vez por plantilla, no por render)
+        app.jinja_env.static_assets = self
+        app.jinja_env.add_extension(InlineAssetExtension)
+
+        app.url_defaults(self._hashed_url_defaults)
+        app.view_functions['static'] = self.send_static
+
+        @app.cli.command('build-assets')
+        def build_assets_command():
+            """Generar static/dist (assets con hash, minificados y comprimidos)"""
+            built = self.build(app)
+            print(f"✅ {len(built)} assets generados en {self.dist_dir}")
+
+        self._load_manifest()
+        if self.enabled and app.config.get('STATIC_ASSETS_BUILD_ON_START', True):
+            try:
+                self.build(app)
+            except Exception as e:
+                print(f"⚠️ Error generando assets estáticos: {e}")
+
+    # =============== BUILD ===============
+
+    def build(self, app=None):
+        """Generar todos los assets con hash y el manifiesto; devuelve el manifiesto"""
+        manifest = {}
+        for directory in ('js', 'css', 'images'):
+            source_dir = os.path.join(self.static_folder, directory)
+            if not os.path.isdir(source_dir):
+                continue
+            for root, _, files in os.walk(source_dir):
+                for name in sorted(files):
+                    if not name.lower().endswith(ASSET_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    logical = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    manifest[logical] = self.write_asset(logical, data)
+
+        self.manifest = manifest
+
+        # Compilar las plantillas extrae sus bloques en línea a dist/inline/
+        if app is not None:
+            for name in app.jinja_env.list_templates(extensions=['html']):
+                try:
+                    app.jinja_env.get_template(name)
+                except Exception as e:
+                    print(f"⚠️ No se pudo compilar la plantilla {name}: {e}")
+
+        _write_atomic(os.path.join(self.dist_dir, MANIFEST_NAME),
+                      json.dumps({'assets': self.manifest, 'encodings': self.encodings}, indent=2).encode())
+        return self.manifest
+
+    def write_asset(self, logical, data):
+        """Escribir un asset (minificado) con hash en el nombre y sus variantes comprimidas"""
+        stem, extension = os.path.splitext(logical)
+        extension = extension.lower()
+        if extension in ('.js', '.css'):
+            data = minify(data.decode('utf-8'), extension).encode('utf-8')
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed = f"{stem}.{digest}{extension}"
+        path = os.path.join(self.dist_dir, hashed)
+
+        encodings = []
+        if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= COMPRESS_MIN_SIZE:
+            if brotli is not None:
+                encodings.append('br')
+            encodings.append('gzip')
+
+        # Mismo contenido -> mismo nombre: si ya existe no hay nada que hacer
+        if not os.path.exists(path):
+            if 'br' in encodings:
+                _write_atomic(f"{path}.br", brotli.compress(data, quality=11))
+            if 'gzip' in encodings:
+                _write_atomic(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            _write_atomic(path, data)
+
+        self.encodings[hashed] = encodings
+        return hashed
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                data = json.load(f)
+            self.manifest = data.get('assets', {})
+            self.encodings = data.get('encodings', {})
+        except (OSError, ValueError):
+            self.manifest, self.encodings = {}, {}
+
+    # =============== URLS Y SERVIDO ===============
+
+    def _hashed_url_defaults(self, endpoint, values):
+        """url_for('static', filename='js/main.js') -> /static/dist/js/main.<hash>.js"""
+        if endpoint != 'static' or not self.enabled:
+            return
+        hashed = self.manifest.get(values.get('filename'))
+        if hashed:
+            values['filename'] = f"{DIST_DIR}/{hashed}"
+
+    def send_static(self, filename):
+        """Vista 'static': los assets de dist/ son inmutables y se sirven precomprimidos"""
+        if not filename.startswith(f"{DIST_DIR}/"):
+            return current_app.send_static_file(filename)
+
+        hashed = filename[len(DIST_DIR) + 1:]
+        if request.if_none_match.contains_weak(hashed):
+            response = make_response('', 304)
+        else:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            encoding = next((enc for enc in self.encodings.get(hashed, []) if enc in request.accept_encodings), None)
+            suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+
+            response = send_from_directory(self.static_folder, filename + suffix, mimetype=mimetype,
+                                           etag=False, conditional=False, max_age=IMMUTABLE_MAX_AGE)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+
+        response.set_etag(hashed)
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+
+class InlineAssetExtension(Extension):
+    """
+    Sustituir los <script>/<style> en línea sin Jinja por referencias a archivos con hash,
+    para que el navegador los cachee y cada página solo transfiera el HTML.
+    """
+
+    def preprocess(self, source, name, filename=None):
+        assets = getattr(self.environment, 'static_assets', None)
+        if assets is None or not assets.enabled or not name:
+            return source
+
+        counter = {'n': 0}
+        base = os.path.splitext(name)[0].replace('/', '-')
+
+        def replace(match):
+            kind = 'script' if match.group('script') is not None else 'style'
+            body = match.group(kind)
+            if not body.strip() or JINJA_SYNTAX.search(body):
+                return match.group(0)
+
+            counter['n'] += 1
+            extension = '.js' if kind == 'script' else '.css'
+            hashed = assets.write_asset(f"inline/{base}-{counter['n']}{extension}", body.encode('utf-8'))
+            url = "{{ url_for('static', filename='%s/%s') }}" % (DIST_DIR, hashed)
+            if kind == 'script':
+                return f'<script src="{url}"></script>'
+            return f'<link rel="stylesheet" href="{url}">'
+
+        return INLINE_BLOCK.sub(replace, source)
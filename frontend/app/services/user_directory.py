@@ -0,0 +1,188 @@
+# frontend/app/services/user_directory.py
+import logging
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class UserDirectory:
+    """
+    Directorio id -> usuario compartido por todo el proceso, con TTL y tamaño máximo.
+
+    El directorio completo sale de /auth/users, que es solo para admin: se descarga con
+    SERVICE_AUTH_TOKEN o, sin él, únicamente en peticiones de un admin. En el resto de
+    sesiones get_user() consulta /auth/users/batch solo el ID necesario. Los fallos se
+    recuerdan negative_ttl segundos para no repetir la descarga en cada petición.
+    """
+
+    def __init__(self, ttl=300, max_size=10000, negative_ttl=60):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._users = {}
+        self._loaded_at = None
+        self._failed_at = None
+        self._single = {}  # id -> (usuario o None, consultado_en), fuera del directorio completo
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._generation = 0
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.time() - self._loaded_at < self.ttl
+
+    def _recently_failed(self):
+        return self._failed_at is not None and time.time() - self._failed_at < self.negative_ttl
+
+    def _directory_headers(self, headers):
+        """Headers para /auth/users: credencial de servicio, o los de la sesión si es admin (si no, None)"""
+        service_token = current_app.config.get('SERVICE_AUTH_TOKEN')
+        if service_token:
+            return {'Authorization': f'Bearer {service_token}'}
+
+        from frontend.config import current_auth_user
+        user = current_auth_user() or {}
+        return dict(headers) if user.get('role') == 'admin' else None
+
+    def _fetch(self, api_client, auth_url, headers, timeout=5):
+        """Descargar /auth/users y reemplazar el directorio"""
+        generation = self._generation
+        try:
+            response = api_client.get(f"{auth_url}/auth/users", headers=headers, timeout=timeout)
+            if response.status_code != 200:
+                raise Exception(f"Auth Service respondió {response.status_code}")
+        except Exception:
+            self._failed_at = time.time()
+            raise
+
+        data = response.json()
+        if not data.get('success'):
+            raise Exception(data.get('message', 'Respuesta inválida del Auth Service'))
+
+        users = data.get('users', [])
+        if len(users) > self.max_size:
+            logger.warning(f"Directorio de usuarios truncado a {self.max_size} de {len(users)} usuarios")
+            users = users[:self.max_size]
+
+        with self._lock:
+            # Si se invalidó mientras se descargaba, los datos ya no son válidos
+            if generation != self._generation:
+                return
+            self._users = {user['id']: user for user in users}
+            self._loaded_at = time.time()
+            self._failed_at = None
+            self._single = {}
+
+    def _refresh_in_background(self, api_client, auth_url, headers):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self._fetch(api_client, auth_url, headers)
+            except Exception as e:
+                logger.warning(f"Error refrescando directorio de usuarios: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name='user-directory-refresh', daemon=True).start()
+
+    def get_users_map(self, headers):
+        """
+        Obtener el mapa id -> usuario.
+        Si está vigente se devuelve directamente; si caducó se devuelve el actual y se
+        refresca en segundo plano; si está vacío se carga en el momento.
+        """
+        if self._is_fresh():
+            return self._users
+
+        directory_headers = self._directory_headers(headers)
+        if directory_headers is None or self._recently_failed():
+            return self._users
+
+        api_client = current_app.api_client
+        auth_url = current_app.config['AUTH_SERVICE_URL']
+        if self._loaded_at is not None:
+            self._refresh_in_background(api_client, auth_url, directory_headers)
+            return self._users
+
+        try:
+            self._fetch(api_client, auth_url, directory_headers)
+        except Exception as e:
+            logger.warning(f"Error cargando directorio de usuarios: {e}")
+        return self._users
+
+    def get_user(self, user_id, headers):
+        """Obtener un usuario por ID (None si no se conoce)"""
+        if not user_id:
+            return None
+        user_id = str(user_id)
+        user = self.get_users_map(headers).get(user_id)
+        if user is not None or self._is_fresh():
+            return user
+        return self._lookup_single(user_id, headers)
+
+    def _lookup_single(self, user_id, headers):
+        """Sin directorio completo: pedir solo este usuario a /auth/users/batch (con su propio TTL)"""
+        cached = self._single.get(user_id)
+        if cached is not None:
+            user, fetched_at = cached
+            if time.time() - fetched_at < (self.ttl if user is not None else self.negative_ttl):
+                return user
+
+        user = None
+        try:
+            response = current_app.api_client.post(
+                f"{current_app.config['AUTH_SERVICE_URL']}/auth/users/batch",
+                json={'ids': [user_id], 'fields': ['first_name', 'last_name', 'role']},
+                headers=headers, timeout=5
+            )
+            if response.status_code == 200:
+                users = response.json().get('users', [])
+                user = users[0] if users else None
+        except Exception as e:
+            logger.warning(f"Error consultando el usuario {user_id}: {e}")
+
+        with self._lock:
+            if len(self._single) >= self.max_size:
+                self._single = {}
+            self._single[user_id] = (user, time.time())
+        return user
+
+    def get_full_name(self, user_id, headers, default=''):
+        """Obtener 'Nombre Apellido' de un usuario o el valor por defecto"""
+        user = self.get_user(user_id, headers)
+        if not user:
+            return default
+        return f"{user.get('first_name', '')} {user.get('last_name', '')}".strip() or default
+
+    def invalidate(self):
+        """Descartar el directorio (tras crear, actualizar o eliminar usuarios)"""
+        with self._lock:
+            self._users = {}
+            self._loaded_at = None
+            self._failed_at = None
+            self._single = {}
+            self._generation += 1
+
+
+_user_directory = None
+_user_directory_lock = threading.Lock()
+
+
+def get_user_directory():
+    """Obtener el directorio de usuarios del proceso (configurado con USER_DIRECTORY_*)"""
+    global _user_directory
+    if _user_directory is None:
+        with _user_directory_lock:
+            if _user_directory is None:
+                _user_directory = UserDirectory(
+                    ttl=current_app.config.get('USER_DIRECTORY_TTL', 300),
+                    max_size=current_app.config.get('USER_DIRECTORY_MAX_SIZE', 10000),
+                    negative_ttl=current_app.config.get('USER_DIRECTORY_NEGATIVE_TTL', 60)
+                )
+    return _user_directory
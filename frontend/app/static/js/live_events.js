@@ -0,0 +1,122 @@
+// frontend/app/static/js/live_events.js
+// Actualizaciones en tiempo real (Server-Sent Events) para los dashboards.
+// Cada página se suscribe a los tipos de evento que le interesan ('appointments',
+// 'emergency', 'notifications'); solo se consulta periódicamente mientras el canal
+// no está disponible, y al recuperarlo se recarga todo una vez.
+
+(function (window) {
+    'use strict';
+
+    const STREAM_URL = '/api/events/stream';
+    const DEBOUNCE_MS = 500;
+
+    const handlers = [];
+    const listenedTypes = new Set();
+    let source = null;
+    let live = false;
+    let connectedOnce = false;
+
+    function parseData(event) {
+        try {
+            return JSON.parse(event.data || '{}');
+        } catch (e) {
+            return {};
+        }
+    }
+
+    // Varios eventos seguidos (p. ej. una cita creada y confirmada) -> una sola recarga
+    function runHandler(handler) {
+        clearTimeout(handler.debounceTimer);
+        handler.debounceTimer = setTimeout(() => {
+            try {
+                handler.fn();
+            } catch (e) {
+                console.error('❌ Error actualizando en tiempo real:', e);
+            }
+        }, DEBOUNCE_MS);
+    }
+
+    function startFallback(handler) {
+        if (handler.fallbackTimer || !handler.fallbackInterval) return;
+        handler.fallbackTimer = setInterval(handler.fn, handler.fallbackInterval);
+    }
+
+    function stopFallback(handler) {
+        clearInterval(handler.fallbackTimer);
+        handler.fallbackTimer = null;
+    }
+
+    function setLive(isLive) {
+        if (isLive === live) return;
+        live = isLive;
+
+        if (live) {
+            console.log('🟢 Actualizaciones en tiempo real activas');
+            handlers.forEach(handler => {
+                stopFallback(handler);
+                // Tras una desconexión se pudieron perder eventos: recargar una vez
+                if (connectedOnce) runHandler(handler);
+            });
+            connectedOnce = true;
+        } else {
+            console.log('🟡 Canal en tiempo real no disponible: consultando periódicamente');
+            handlers.forEach(startFallback);
+        }
+    }
+
+    function dispatch(type) {
+        handlers.forEach(handler => {
+            if (type === 'resync' || handler.types.includes(type)) {
+                runHandler(handler);
+            }
+        });
+    }
+
+    function listen(type) {
+        if (!source || listenedTypes.has(type)) return;
+        listenedTypes.add(type);
+        source.addEventListener(type, () => dispatch(type));
+    }
+
+    function connect() {
+        if (source || !window.EventSource) return;
+
+        source = new EventSource(STREAM_URL);
+        listenedTypes.clear();
+
+        source.addEventListener('ready', event => setLive(parseData(event).live === true));
+        source.addEventListener('status', event => setLive(parseData(event).live === true));
+        listen('resync');
+        handlers.forEach(handler => handler.types.forEach(listen));
+
+        source.onerror = () => {
+            setLive(false);
+            // CLOSED: el servidor no ofrece el canal (204) -> quedarse en consulta periódica.
+            // En otro caso EventSource reconecta solo.
+            if (source.readyState === EventSource.CLOSED) {
+                source = null;
+            }
+        };
+    }
+
+    function subscribe(types, fn, fallbackInterval) {
+        const handler = {
+            types: Array.isArray(types) ? types : [types],
+            fn: fn,
+            fallbackInterval: fallbackInterval || 0,
+            debounceTimer: null,
+            fallbackTimer: null
+        };
+        handlers.push(handler);
+
+        if (!live) startFallback(handler);
+        connect();
+        handler.types.forEach(listen);
+        return handler;
+    }
+
+    window.LiveEvents = {
+        subscribe: subscribe,
+        isLive: () => live
+    };
+})(window);
@@ -41,10 +41,13 @@ class VeterinarianDashboard {
     }
 
     setupAutoRefresh() {
-        // Refrescar datos cada 5 minutos
-        setInterval(() => {
-            this.loadDashboardData(false); // false = sin loading indicator
-        }, 5 * 60 * 1000);
+        // Refrescar cuando cambien las citas (cada 5 minutos si no hay canal en tiempo real)
+        const refresh = () => this.loadDashboardData(false); // false = sin loading indicator
+        if (window.LiveEvents) {
+            LiveEvents.subscribe(['appointments', 'emergency'], refresh, 5 * 60 * 1000);
+        } else {
+            setInterval(refresh, 5 * 60 * 1000);
+        }
     }
 
     async loadDashboardData(showLoading = true) {
@@ -226,7 +229,7 @@ class VeterinarianDashboard {
         div.innerHTML = `
             <div class="patient-avatar">
                 ${patient.photo_url ? 
-                    `<img src="${patient.photo_url}" alt="${patient.name}">` : 
+                    `<img src="${patient.photo_url.startsWith('/uploads/pets/') ? `${patient.photo_url}?size=thumb` : patient.photo_url}" alt="${patient.name}">` : 
                     `<div class="patient-initial">${patient.name ? patient.name[0].toUpperCase() : '🐕'}</div>`
                 }
             </div>
@@ -20,6 +20,12 @@ class Config:
 
     # Session Configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-fallback-key'
+    # Almacén de sesiones: 'redis' (varios workers/hosts), 'memory' (pruebas) o 'filesystem'
+    # SESSION_MODE = 'claims': id/rol/nombre/caducidad en cookie cifrada para role_required
+    SESSION_MODE = os.environ.get('SESSION_MODE') or 'server'
+    AUTH_CLAIMS_COOKIE_NAME = 'vet_auth'
+    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/5'
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or ('redis' if os.environ.get('REDIS_URL') else 'filesystem')
     SESSION_TYPE = 'filesystem'
     SESSION_PERMANENT = True
     SESSION_USE_SIGNER = True
@@ -33,9 +39,78 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or './uploads'
 
+    # PostgreSQL (facturación) con pool de conexiones reutilizadas entre peticiones
+    POSTGRES_HOST = os.environ.get('POSTGRES_HOST', 'localhost')
+    POSTGRES_PORT = os.environ.get('POSTGRES_PORT', '5432')
+    POSTGRES_DB = os.environ.get('POSTGRES_DB', 'veterinary-system')
+    POSTGRES_USER = os.environ.get('POSTGRES_USER', 'postgres')
+    POSTGRES_PASSWORD = os.environ.get('POSTGRES_PASSWORD', 'bocato0731')
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 5))
+    DB_POOL_HEALTH_CHECK_INTERVAL = int(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+    DB_POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+
+    # PDFs de facturas cacheados en disco (por defecto <UPLOAD_FOLDER>/cache/invoices)
+    INVOICE_PDF_CACHE_DIR = os.environ.get('INVOICE_PDF_CACHE_DIR')
+    INVOICE_PDF_REVALIDATE_SECONDS = int(os.environ.get('INVOICE_PDF_REVALIDATE_SECONDS', 300))
+
+    # Exportación XLSX: por encima de este número de facturas se hace en segundo plano
+    XLSX_EXPORT_ASYNC_THRESHOLD = int(os.environ.get('XLSX_EXPORT_ASYNC_THRESHOLD', 20000))
+    EXPORT_JOBS_DIR = os.environ.get('EXPORT_JOBS_DIR')  # por defecto <UPLOAD_FOLDER>/exports
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 1))
+    EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', 3600))
+
     # Timeouts para requests
     REQUEST_TIMEOUT = 10
 
+    # Pool de conexiones keep-alive por microservicio (APIClient)
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))
+    HTTP_CONNECT_RETRIES = int(os.environ.get('HTTP_CONNECT_RETRIES', 1))
+    # Respuestas GET con ETag guardadas para revalidar con If-None-Match
+    HTTP_VALIDATOR_CACHE_SIZE = int(os.environ.get('HTTP_VALIDATOR_CACHE_SIZE', 256))
+
+    # Llamadas paralelas a microservicios (dashboards)
+    # Cada llamada recorta su timeout al plazo restante: un hilo no queda ocupado mucho más de
+    # FAN_OUT_DEADLINE, así que el pool sostiene unas FAN_OUT_MAX_WORKERS llamadas lentas por plazo
+    FAN_OUT_MAX_WORKERS = int(os.environ.get('FAN_OUT_MAX_WORKERS', 16))
+    FAN_OUT_DEADLINE = float(os.environ.get('FAN_OUT_DEADLINE', 10))
+
+    # Directorio de usuarios en memoria (nombres de veterinarios, clientes, propietarios)
+    USER_DIRECTORY_TTL = int(os.environ.get('USER_DIRECTORY_TTL', 300))
+    USER_DIRECTORY_MAX_SIZE = int(os.environ.get('USER_DIRECTORY_MAX_SIZE', 10000))
+    USER_DIRECTORY_NEGATIVE_TTL = int(os.environ.get('USER_DIRECTORY_NEGATIVE_TTL', 60))
+
+    # Última respuesta buena de los microservicios (servida si fallan)
+    RESPONSE_CACHE_FRESH_TTL = int(os.environ.get('RESPONSE_CACHE_FRESH_TTL', 5))
+    RESPONSE_CACHE_MAX_STALE = int(os.environ.get('RESPONSE_CACHE_MAX_STALE', 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    RESPONSE_CACHE_RETRIES = int(os.environ.get('RESPONSE_CACHE_RETRIES', 3))
+
+    # Índice de fotos de mascotas (las ausentes se recuerdan PHOTO_INDEX_NEGATIVE_TTL segundos)
+    PHOTO_INDEX_NEGATIVE_TTL = int(os.environ.get('PHOTO_INDEX_NEGATIVE_TTL', 300))
+    PHOTO_INDEX_MAX_ENTRIES = int(os.environ.get('PHOTO_INDEX_MAX_ENTRIES', 5000))
+
+    # Credencial de servicio (JWT de una cuenta técnica) para llamadas en segundo plano que
+    # no deben depender del token de un usuario: réplica de fotos y directorio de usuarios
+    SERVICE_AUTH_TOKEN = os.environ.get('SERVICE_AUTH_TOKEN')
+
+    # Réplica de fotos al Medical Service (cola en disco vaciada por un hilo)
+    PHOTO_SPOOL_DIR = os.environ.get('PHOTO_SPOOL_DIR')  # por defecto <UPLOAD_FOLDER>/spool/photos
+    PHOTO_REPLICATION_MAX_ATTEMPTS = int(os.environ.get('PHOTO_REPLICATION_MAX_ATTEMPTS', 8))
+    PHOTO_REPLICATION_BACKOFF = int(os.environ.get('PHOTO_REPLICATION_BACKOFF', 5))
+    PHOTO_REPLICATION_POLL_INTERVAL = int(os.environ.get('PHOTO_REPLICATION_POLL_INTERVAL', 10))
+
+    # Assets estáticos con hash (static/dist); 'flask build-assets' los genera sin arrancar
+    STATIC_ASSETS_ENABLED = os.environ.get('STATIC_ASSETS_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    STATIC_ASSETS_BUILD_ON_START = os.environ.get('STATIC_ASSETS_BUILD_ON_START', 'true').lower() in ['true', '1', 'yes']
+
+    # Canal de eventos en tiempo real (SSE en /api/events/stream alimentado por Redis pub/sub)
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL')  # por defecto REDIS_URL
+    EVENTS_HEARTBEAT = int(os.environ.get('EVENTS_HEARTBEAT', 15))
+    EVENTS_MAX_STREAM_SECONDS = int(os.environ.get('EVENTS_MAX_STREAM_SECONDS', 600))
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -52,6 +127,9 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     DEBUG = True
+    SESSION_BACKEND = 'memory'
+    PHOTO_REPLICATION_WORKER = False  # las pruebas vacían la cola con drain()
+    EVENTS_ENABLED = False
 
 
 config = {
@@ -62,21 +140,48 @@ config = {
 }
 
 
+def current_auth_user():
+    """
+    Usuario autenticado para comprobar permisos (dict con 'id' y 'role') o None.
+    En SESSION_MODE = 'claims' sale de la cookie cifrada, sin leer el almacén de sesiones.
+    """
+    from flask import current_app, session
+
+    auth_claims = current_app.extensions.get('auth_claims')
+    if auth_claims is not None:
+        return auth_claims.current_user()
+    return session.get('user')
+
+
+def current_auth_token():
+    """
+    Token del Auth Service para las cabeceras Authorization (None si no hay sesión).
+    En SESSION_MODE = 'claims' también sale de la cookie cifrada.
+    """
+    from flask import current_app, session
+
+    auth_claims = current_app.extensions.get('auth_claims')
+    if auth_claims is not None:
+        return auth_claims.current_token()
+    return session.get('token')
+
+
 # Función para verificar roles de usuario
 def role_required(required_roles):
     """Decorador para verificar roles de usuario"""
 
     def decorator(f):
         from functools import wraps
-        from flask import session, redirect, url_for, flash
+        from flask import redirect, url_for, flash
 
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user' not in session:
+            user = current_auth_user()
+            if not user:
                 flash('Debes iniciar sesión para acceder a esta página.', 'warning')
                 return redirect(url_for('frontend.login'))
 
-            user_role = session['user'].get('role')
+            user_role = user.get('role')
             if user_role not in required_roles:
                 flash('No tienes permisos para acceder a esta página.', 'error')
                 return redirect(url_for('frontend.dashboard'))
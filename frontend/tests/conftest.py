@@ -0,0 +1,33 @@
+# frontend/tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Raíz del repositorio en el path: las rutas importan frontend.config y utils.*
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_DIR)
+
+# La configuración se lee al importar frontend.config
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('STATIC_ASSETS_BUILD_ON_START', 'false')
+os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='frontend-tests-'))
+
+
+@pytest.fixture
+def app():
+    from frontend.app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'id': 'a0000000-0000-0000-0000-000000000001', 'role': 'admin'}
+        session['token'] = 'test-token'
+    return client
@@ -0,0 +1,243 @@
+# frontend/tests/test_billing_invoices.py
+import copy
+import json
+
+import psycopg2
+import pytest
+from psycopg2 import extensions as pg_extensions
+
+MED_A = '11111111-1111-1111-1111-111111111111'
+MED_B = '22222222-2222-2222-2222-222222222222'
+MED_UNKNOWN = '99999999-9999-9999-9999-999999999999'
+CLIENT_ID = 'c0000000-0000-0000-0000-000000000001'
+
+
+class FakeDatabase:
+    """
+    Las tablas que toca la creación de facturas, con transacciones: cada conexión
+    trabaja sobre una copia que solo se publica con commit()
+    """
+
+    def __init__(self, stock):
+        self.state = {
+            'stock': dict(stock),
+            'invoices': [],
+            'items': [],
+            'movements': [],
+            'rollups': [],
+            'keys': {}
+        }
+        self.statements = []
+
+
+class FakeConnection:
+    closed = 0
+    encoding = 'UTF8'
+
+    def __init__(self, database):
+        self.database = database
+        self.tx = None
+
+    def view(self):
+        if self.tx is None:
+            self.tx = copy.deepcopy(self.database.state)
+        return self.tx
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        if self.tx is not None:
+            self.database.state = self.tx
+            self.tx = None
+
+    def rollback(self):
+        self.tx = None
+
+    def get_transaction_status(self):
+        if self.tx is None:
+            return pg_extensions.TRANSACTION_STATUS_IDLE
+        return pg_extensions.TRANSACTION_STATUS_INTRANS
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    """Reconoce las sentencias de api_billing_create_invoice por su texto"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._values = []  # filas pasadas por mogrify (VALUES en lote)
+        self._result = []
+
+    def mogrify(self, template, args):
+        self._values.append(tuple(args))
+        return b'(' + b','.join(b'%s' for _ in args) + b')'
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8')
+        self.connection.database.statements.append(sql)
+        view = self.connection.view()
+        result = []
+
+        if 'INSERT INTO invoice_idempotency_keys' in sql:
+            key, request_hash = params[0], params[1]
+            if key not in view['keys']:
+                view['keys'][key] = {'hash': request_hash, 'response': None}
+                result = [(key,)]
+        elif 'SELECT request_hash, response FROM invoice_idempotency_keys' in sql:
+            entry = view['keys'].get(params[0])
+            result = [(entry['hash'], entry['response'])] if entry else []
+        elif 'UPDATE invoice_idempotency_keys SET response' in sql:
+            view['keys'][params[1]]['response'] = json.loads(json.dumps(params[0].adapted))
+        elif 'INSERT INTO invoices' in sql:
+            view['invoices'].append(params[0])
+        elif 'INSERT INTO invoice_items' in sql:
+            view['items'].extend(self._values)
+        elif 'UPDATE medications m' in sql:
+            for medication_id, quantity in self._values:
+                if view['stock'].get(medication_id, -1) >= quantity:
+                    view['stock'][medication_id] -= quantity
+                    view['movements'].append((medication_id, quantity))
+                    result.append((medication_id, view['stock'][medication_id]))
+        elif 'SELECT id FROM medications WHERE id = ANY' in sql:
+            result = [(medication_id,) for medication_id in params[0] if medication_id in view['stock']]
+        elif 'billing_daily_rollups' in sql:
+            view['rollups'].append(('daily', params['day'], params['revenue']))
+        elif 'INSERT INTO billing_medication_rollups' in sql:
+            view['rollups'].extend(('medication',) + values for values in self._values)
+
+        self._values = []
+        self._result = result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase({MED_A: 10, MED_B: 1})
+    monkeypatch.setattr(psycopg2, 'connect', lambda *args, **kwargs: FakeConnection(database))
+    return database
+
+
+def invoice_payload(*medications):
+    return {
+        'client_id': CLIENT_ID,
+        'payment_method': 'cash',
+        'medications': [
+            {'id': medication_id, 'name': 'Medicamento', 'quantity': quantity, 'unit_price': 1000}
+            for medication_id, quantity in medications
+        ]
+    }
+
+
+def create_invoice(client, payload, key=None):
+    headers = {'Idempotency-Key': key} if key else {}
+    return client.post('/api/admin/billing/invoices', json=payload, headers=headers)
+
+
+# =============== CREACIÓN Y STOCK ===============
+
+def test_stock_is_decremented_in_a_single_statement(database, admin_client):
+    response = create_invoice(admin_client, invoice_payload((MED_A, 2), (MED_B, 1), (MED_A, 3)))
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True
+    assert sorted((s['medication_id'], s['new_stock']) for s in body['stock']) == [(MED_A, 5), (MED_B, 0)]
+
+    updates = [sql for sql in database.statements if 'UPDATE medications m' in sql]
+    assert len(updates) == 1
+    state = database.state
+    assert state['stock'] == {MED_A: 5, MED_B: 0}
+    # Las líneas repetidas del mismo medicamento se descuentan sumadas
+    assert sorted(state['movements']) == [(MED_A, 5), (MED_B, 1)]
+    assert len(state['invoices']) == 1
+    assert len(state['items']) == 3
+    assert state['rollups']
+
+
+def test_insufficient_stock_rolls_back_items_and_rollups(database, admin_client):
+    response = create_invoice(admin_client, invoice_payload((MED_A, 2), (MED_B, 5)))
+
+    assert response.status_code == 409
+    assert response.get_json()['medication_ids'] == [MED_B]
+    state = database.state
+    assert state['stock'] == {MED_A: 10, MED_B: 1}
+    assert state['invoices'] == []
+    assert state['items'] == []
+    assert state['movements'] == []
+    assert state['rollups'] == []
+
+
+def test_unknown_medication_is_reported_apart_from_stock(database, admin_client):
+    response = create_invoice(admin_client, invoice_payload((MED_A, 1), (MED_UNKNOWN, 1)))
+
+    assert response.status_code == 400
+    assert response.get_json()['medication_ids'] == [MED_UNKNOWN]
+    assert database.state['invoices'] == []
+    assert database.state['stock'] == {MED_A: 10, MED_B: 1}
+
+
+@pytest.mark.parametrize('quantity', [-1, 0, 1.5, 'abc', None, True])
+def test_invalid_quantity_is_rejected_before_the_transaction(database, admin_client, quantity):
+    response = create_invoice(admin_client, invoice_payload((MED_A, quantity)))
+
+    assert response.status_code == 400
+    assert not any('INSERT INTO invoices' in sql for sql in database.statements)
+    assert database.state['stock'] == {MED_A: 10, MED_B: 1}
+
+
+# =============== IDEMPOTENCIA ===============
+
+def test_idempotent_retry_replays_the_first_invoice(database, admin_client):
+    payload = invoice_payload((MED_A, 2))
+    first = create_invoice(admin_client, payload, key='retry-1')
+    second = create_invoice(admin_client, payload, key='retry-1')
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert second.get_json()['invoice']['id'] == first.get_json()['invoice']['id']
+    assert len(database.state['invoices']) == 1
+    assert database.state['stock'][MED_A] == 8
+
+
+def test_in_flight_key_answers_retryable_409(database, admin_client):
+    from frontend.app.routes.frontend_routes import invoice_request_hash
+
+    payload = invoice_payload((MED_A, 2))
+    # Primer intento aún sin respuesta guardada
+    database.state['keys']['in-flight'] = {'hash': invoice_request_hash(payload), 'response': None}
+
+    response = create_invoice(admin_client, payload, key='in-flight')
+
+    assert response.status_code == 409
+    assert response.get_json()['in_progress'] is True
+    assert response.headers.get('Retry-After') == '1'
+    assert database.state['invoices'] == []
+
+
+def test_key_reused_with_other_data_answers_409(database, admin_client):
+    assert create_invoice(admin_client, invoice_payload((MED_A, 2)), key='reused').status_code == 200
+
+    response = create_invoice(admin_client, invoice_payload((MED_A, 3)), key='reused')
+
+    assert response.status_code == 409
+    assert 'in_progress' not in response.get_json()
+    assert len(database.state['invoices']) == 1
+    assert database.state['stock'][MED_A] == 8
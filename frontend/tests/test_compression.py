@@ -0,0 +1,52 @@
+# frontend/tests/test_compression.py
+import gzip
+
+from flask import Flask, jsonify, request
+
+from utils.compression import CompressionMiddleware
+from utils.etag import not_modified
+
+ETAG = 'abc123'
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route('/listado')
+    def listado():
+        if request.if_none_match.contains_weak(ETAG):
+            return not_modified(ETAG)
+        response = jsonify({'items': ['x' * 50] * 100})
+        response.set_etag(ETAG)
+        return response
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=100)
+    return app
+
+
+def test_compressed_body_gets_a_weak_etag():
+    client = make_app().test_client()
+
+    response = client.get('/listado', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == f'W/"{ETAG}"'
+    assert b'items' in gzip.decompress(response.data)
+
+
+def test_uncompressed_body_keeps_the_strong_etag():
+    client = make_app().test_client()
+
+    response = client.get('/listado', headers={'Accept-Encoding': 'identity'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == f'"{ETAG}"'
+
+
+def test_weak_etag_revalidates():
+    client = make_app().test_client()
+    etag = client.get('/listado', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.get('/listado', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+    assert response.status_code == 304
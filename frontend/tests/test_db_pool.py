@@ -0,0 +1,192 @@
+# frontend/tests/test_db_pool.py
+import psycopg2
+import pytest
+from flask import Flask
+from psycopg2 import extensions as pg_extensions
+
+from frontend.app.services import db_pool
+from frontend.app.services.db_pool import ConnectionPool, PoolTimeout
+
+
+class Clock:
+    """Sustituye al módulo time de db_pool para controlar edades e inactividad"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.fail_health_check = False
+        self.in_transaction = False
+        self.health_checks = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return pg_extensions.TRANSACTION_STATUS_INTRANS
+        return pg_extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql):
+        assert sql == 'SELECT 1'
+        self.connection.health_checks += 1
+        if self.connection.fail_health_check:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db_pool, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(FakeConnection(len(opened) + 1))
+        return opened[-1]
+
+    monkeypatch.setattr(psycopg2, 'connect', connect)
+    return opened
+
+
+@pytest.fixture
+def pool(clock, opened):
+    app = Flask(__name__)
+    app.config.update(
+        DB_POOL_MAX_SIZE=2,
+        DB_POOL_CHECKOUT_TIMEOUT=0,
+        DB_POOL_HEALTH_CHECK_INTERVAL=30,
+        DB_POOL_MAX_LIFETIME=1800
+    )
+    return ConnectionPool(app)
+
+
+def test_released_connection_is_reused(pool, opened):
+    conn = pool.acquire()
+    pool.release(conn)
+
+    assert pool.acquire() is conn
+    assert len(opened) == 1
+    assert pool.stats()['reused'] == 1
+
+
+def test_recently_used_connection_skips_health_check(pool, clock):
+    conn = pool.acquire()
+    pool.release(conn)
+    clock.now += 29
+
+    assert pool.acquire() is conn
+    assert conn.health_checks == 0
+
+
+def test_idle_connection_is_checked_before_reuse(pool, clock):
+    conn = pool.acquire()
+    pool.release(conn)
+    clock.now += 31
+
+    assert pool.acquire() is conn
+    assert conn.health_checks == 1
+
+
+def test_failed_health_check_replaces_the_connection(pool, clock, opened):
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.fail_health_check = True
+    clock.now += 31
+
+    fresh = pool.acquire()
+
+    assert fresh is not conn
+    assert conn.closed
+    assert len(opened) == 2
+    stats = pool.stats()
+    assert stats['failed_health_checks'] == 1
+    assert stats['size'] == 1
+
+
+def test_connection_past_max_lifetime_is_closed_on_release(pool, clock, opened):
+    conn = pool.acquire()
+    clock.now += 1801
+    pool.release(conn)
+
+    assert conn.closed
+    assert pool.stats()['idle'] == 0
+    assert pool.acquire() is not conn
+    assert len(opened) == 2
+
+
+def test_idle_connection_past_max_lifetime_is_not_reused(pool, clock, opened):
+    conn = pool.acquire()
+    clock.now += 1000
+    pool.release(conn)
+    clock.now += 1000
+
+    assert pool.acquire() is not conn
+    assert conn.closed
+    assert conn.health_checks == 0
+
+
+def test_open_transaction_is_rolled_back_on_release(pool):
+    conn = pool.acquire()
+    conn.in_transaction = True
+    pool.release(conn)
+
+    assert conn.rollbacks == 1
+    assert pool.acquire() is conn
+
+
+def test_checkout_times_out_when_pool_is_exhausted(pool):
+    pool.acquire()
+    pool.acquire()
+
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['in_use'] == 2
+
+
+def test_connect_error_frees_the_slot(pool, monkeypatch):
+    def refuse(**kwargs):
+        raise psycopg2.OperationalError('could not connect to server')
+
+    monkeypatch.setattr(psycopg2, 'connect', refuse)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.acquire()
+
+    stats = pool.stats()
+    assert stats['size'] == 0
+    assert stats['connect_errors'] == 1
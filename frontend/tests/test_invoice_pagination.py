@@ -0,0 +1,29 @@
+# frontend/tests/test_invoice_pagination.py
+import uuid
+from datetime import datetime
+
+import pytest
+
+from frontend.app.routes.frontend_routes import decode_invoice_cursor, encode_invoice_cursor
+
+
+@pytest.mark.parametrize('sort_key', [
+    datetime(2024, 3, 1, 12, 30, 45, 123456),
+    datetime(1970, 1, 1),
+])
+def test_invoice_cursor_round_trip(sort_key):
+    invoice_id = uuid.uuid4()
+    cursor = encode_invoice_cursor(sort_key, invoice_id)
+
+    assert '=' not in cursor
+    assert decode_invoice_cursor(cursor) == (sort_key, str(invoice_id))
+
+
+@pytest.mark.parametrize('cursor', [
+    'no es un cursor',
+    'WyIyMDI0LTAzLTAxIiwgIm5vLXV1aWQiXQ',  # ["2024-03-01", "no-uuid"]
+    'WyJheWVyIiwgIjExMTExMTExLTExMTEtMTExMS0xMTExLTExMTExMTExMTExMSJd',  # fecha inválida
+])
+def test_invalid_invoice_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_invoice_cursor(cursor)
@@ -0,0 +1,133 @@
+# frontend/tests/test_session_store.py
+import pytest
+from flask import Flask, session
+
+from frontend.app.services.session_store import MemorySessionStore, StoreSessionInterface
+
+
+class RecordingStore(MemorySessionStore):
+    """Almacén en memoria que anota cada operación"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(('get', key))
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.calls.append(('set', key))
+        super().set(key, value, ttl)
+
+    def touch(self, key, ttl):
+        self.calls.append(('touch', key))
+        super().touch(key, ttl)
+
+    def delete(self, key):
+        self.calls.append(('delete', key))
+        super().delete(key)
+
+
+@pytest.fixture
+def store():
+    return RecordingStore()
+
+
+@pytest.fixture
+def app(store):
+    app = Flask(__name__)
+    app.secret_key = 'test-secret'
+    app.session_interface = StoreSessionInterface(store, key_prefix='session:')
+
+    @app.route('/login')
+    def login():
+        session.permanent = True
+        session['user'] = {'id': 'u1', 'role': 'admin'}
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return (session.get('user') or {}).get('id', '')
+
+    @app.route('/static-page')
+    def static_page():
+        return 'sin sesión'
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return 'bye'
+
+    return app
+
+
+def session_keys(store):
+    return [key for key, _ in store._data.items()]
+
+
+def test_session_content_lives_in_the_store(app, store):
+    client = app.test_client()
+    client.get('/login')
+
+    cookie = client.get_cookie('session')
+    keys = session_keys(store)
+    assert len(keys) == 1
+    sid = keys[0][len('session:'):]
+    # En la cookie solo viaja el ID firmado, nunca el contenido
+    assert cookie.value.startswith(sid + '.')
+    assert 'admin' not in cookie.value
+
+    assert client.get('/whoami').data == b'u1'
+
+
+def test_request_that_ignores_the_session_only_renews_expiry(app, store):
+    client = app.test_client()
+    client.get('/login')
+    store.calls.clear()
+
+    client.get('/static-page')
+
+    assert [op for op, _ in store.calls] == ['touch']
+
+
+def test_unmodified_session_is_not_rewritten(app, store):
+    client = app.test_client()
+    client.get('/login')
+    store.calls.clear()
+
+    client.get('/whoami')
+
+    assert [op for op, _ in store.calls] == ['get', 'touch']
+
+
+def test_tampered_cookie_starts_a_new_session(app, store):
+    client = app.test_client()
+    client.get('/login')
+    sid = client.get_cookie('session').value.split('.')[0]
+    client.set_cookie('session', sid + '.firma-falsa')
+
+    assert client.get('/whoami').data == b''
+
+
+def test_expired_session_id_is_not_reused(app, store):
+    client = app.test_client()
+    client.get('/login')
+    old_cookie = client.get_cookie('session').value
+    store._data.clear()
+
+    assert client.get('/whoami').data == b''
+    client.get('/login')
+
+    assert client.get_cookie('session').value != old_cookie
+    assert client.get('/whoami').data == b'u1'
+
+
+def test_logout_deletes_the_stored_session(app, store):
+    client = app.test_client()
+    client.get('/login')
+
+    client.get('/logout')
+
+    assert session_keys(store) == []
+    assert client.get_cookie('session') is None
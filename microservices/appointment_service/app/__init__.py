@@ -53,6 +53,15 @@ def create_app():
     db.init_app(app)
     CORS(app)
 
+    # Compresión gzip/brotli de las respuestas según Accept-Encoding (utils compartido)
+    from utils.compression import init_compression
+    init_compression(app)
+
+    # Publicar los cambios confirmados en el canal de eventos del frontend (SSE)
+    from utils.events import publish_on_commit
+    from .models.appointment import Appointment
+    publish_on_commit(app, db, Appointment, service='appointment_service')
+
     # Crear tablas dentro del contexto de la aplicación
     with app.app_context():
         try:
@@ -26,6 +26,20 @@ class Appointment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    EMERGENCY_TYPES = ('emergency', 'emergencia', 'urgent', 'urgencia')
+
+    def to_event(self):
+        """Evento en tiempo real para el veterinario, el cliente y los administradores"""
+        event_type = 'emergency' if (self.appointment_type or '').lower() in self.EMERGENCY_TYPES else 'appointments'
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'appointment_type': self.appointment_type,
+            'appointment_date': self.appointment_date.isoformat() if self.appointment_date else None,
+            'appointment_time': self.appointment_time.strftime('%H:%M') if self.appointment_time else None
+        }
+        return event_type, data, [self.veterinarian_id, self.client_id], ['admin']
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -11,6 +11,7 @@ from ..models.appointment import Appointment
 from ..models.schedule import VeterinarianSchedule
 from .. import db
 from ..services.appointment_service import AppointmentService
+from utils.etag import not_modified, table_etag
 import requests
 
 
@@ -1380,6 +1381,10 @@ def get_veterinarian_schedules_grouped():
     try:
         # NO usar @jwt_required() para permitir acceso público
 
+        etag = table_etag(db, VeterinarianSchedule)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
         # Obtener todos los horarios activos
         schedules = VeterinarianSchedule.query.filter_by(is_available=True).all()
 
@@ -1396,12 +1401,14 @@ def get_veterinarian_schedules_grouped():
 
         print(f"📋 Horarios agrupados para {len(veterinarian_schedules)} veterinarios")
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'veterinarian_schedules': veterinarian_schedules,
             'total_veterinarians': len(veterinarian_schedules),
             'total_schedules': len(schedules)
-        }), 200
+        })
+        response.set_etag(etag)
+        return response, 200
 
     except Exception as e:
         print(f"❌ Error obteniendo horarios agrupados: {e}")
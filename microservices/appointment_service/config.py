@@ -14,6 +14,10 @@ class Config:
     NOTIFICATION_SERVICE_URL = os.environ.get('NOTIFICATION_SERVICE_URL') or 'http://localhost:5003'
     MEDICAL_SERVICE_URL = os.environ.get('MEDICAL_SERVICE_URL') or 'http://localhost:5004'
 
+    # Eventos en tiempo real hacia el frontend (Redis pub/sub, canal compartido)
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL')  # por defecto REDIS_URL
+
     # Flask Configuration
     FLASK_ENV = os.environ.get('FLASK_ENV') or 'production'
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() in ['true', '1', 'yes']
@@ -32,6 +36,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    EVENTS_ENABLED = False
 
 
 config = {
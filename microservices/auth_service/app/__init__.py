@@ -54,6 +54,10 @@ def create_app():
     db.init_app(app)
     CORS(app)
 
+    # Compresión gzip/brotli de las respuestas según Accept-Encoding (utils compartido)
+    from utils.compression import init_compression
+    init_compression(app)
+
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
 
@@ -5,6 +5,7 @@ from werkzeug.security import check_password_hash
 from datetime import datetime, timedelta
 from ..models.user import User, db
 from ..services.auth_service import AuthService
+from utils.etag import not_modified, table_etag
 
 auth_bp = Blueprint('auth', __name__)
 auth_service = AuthService()
@@ -254,15 +255,21 @@ def get_all_users():
                 'message': 'Acceso denegado. Solo administradores pueden ver usuarios.'
             }), 403
 
+        etag = table_etag(db, User)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
         # Obtener todos los usuarios
         users = User.query.all()
         users_data = [user.to_dict() for user in users]
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'users': users_data,
             'total': len(users_data)
-        }), 200
+        })
+        response.set_etag(etag)
+        return response, 200
 
     except Exception as e:
         print(f"❌ Error obteniendo usuarios: {e}")
@@ -426,6 +433,84 @@ def toggle_user_status(user_id):
         }), 500
 
 
+# Campos que el personal (no admin) puede ver en /users/batch: datos de contacto solo de
+# clientes (propietarios de mascotas); del resto de usuarios, únicamente el nombre
+STAFF_CLIENT_FIELDS = {'id', 'role', 'first_name', 'last_name', 'email', 'phone', 'address'}
+STAFF_OTHER_USER_FIELDS = {'id', 'role', 'first_name', 'last_name'}
+
+
+def restrict_users_for_staff(users, requested_fields):
+    """Recortar cada usuario a los campos permitidos para personal no administrador"""
+    restricted = []
+    for user in users:
+        allowed = STAFF_CLIENT_FIELDS if user.get('role') == 'client' else STAFF_OTHER_USER_FIELDS
+        restricted.append({
+            field: value for field, value in user.items()
+            if field in allowed and (field in requested_fields or field == 'id')
+        })
+    return restricted
+
+
+@auth_bp.route('/users/batch', methods=['GET', 'POST'])
+def get_users_batch():
+    """Obtener varios usuarios por ID en una sola consulta, con selección de campos"""
+    try:
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        current_user = auth_service.verify_token(token)
+
+        if not current_user:
+            return jsonify({
+                'success': False,
+                'message': 'Token inválido'
+            }), 401
+
+        # IDs y campos: JSON {'ids': [...], 'fields': [...]} o ?ids=a,b&fields=first_name,last_name
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            user_ids = data.get('ids', [])
+            fields = data.get('fields')
+        else:
+            user_ids = [user_id for user_id in request.args.get('ids', '').split(',') if user_id.strip()]
+            fields = [field for field in request.args.get('fields', '').split(',') if field.strip()] or None
+
+        if not isinstance(user_ids, list) or not user_ids:
+            return jsonify({
+                'success': False,
+                'message': 'Se requiere una lista de IDs'
+            }), 400
+
+        if len(user_ids) > 1000:
+            return jsonify({
+                'success': False,
+                'message': 'Máximo 1000 IDs por consulta'
+            }), 400
+
+        # Mismas reglas que /users/<id>: admin ve todo y cada usuario se ve a sí mismo.
+        # El resto del personal solo ve contacto de clientes y el nombre de los demás.
+        if current_user.role == 'admin':
+            users = auth_service.get_users_by_ids(user_ids, fields)
+        elif current_user.role == 'client':
+            user_ids = [user_id for user_id in user_ids if str(user_id) == str(current_user.id)]
+            users = auth_service.get_users_by_ids(user_ids, fields)
+        else:
+            requested_fields = set(fields or STAFF_CLIENT_FIELDS)
+            users = auth_service.get_users_by_ids(user_ids, list(requested_fields | {'role'}))
+            users = restrict_users_for_staff(users, requested_fields)
+
+        return jsonify({
+            'success': True,
+            'users': users,
+            'total': len(users)
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Error en get_users_batch: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
 @auth_bp.route('/users/<user_id>', methods=['GET'])
 def get_user_by_id(user_id):
     """Obtener usuario específico por ID (solo para admin O el propio usuario)"""
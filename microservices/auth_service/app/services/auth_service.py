@@ -3,8 +3,13 @@ import jwt
 import uuid
 from datetime import datetime, timedelta
 from flask import current_app
+from sqlalchemy import text
 from ..models.user import User, db
 
+# Columnas que se pueden pedir en las consultas por lotes (nunca password_hash)
+USER_PUBLIC_FIELDS = ['id', 'email', 'role', 'first_name', 'last_name', 'phone', 'address',
+                      'is_active', 'created_at', 'updated_at']
+
 
 class AuthService:
     def generate_token(self, user):
@@ -127,6 +132,43 @@ class AuthService:
             print(f"❌ Error obteniendo usuario por ID: {e}")
             return None
 
+    def get_users_by_ids(self, user_ids, fields=None):
+        """Obtener varios usuarios por ID en una sola consulta (WHERE id = ANY(...))"""
+        fields = [field for field in (fields or USER_PUBLIC_FIELDS) if field in USER_PUBLIC_FIELDS]
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+
+        # Descartar IDs inválidos o repetidos
+        valid_ids = []
+        for user_id in user_ids:
+            try:
+                valid_id = str(uuid.UUID(str(user_id)))
+            except ValueError:
+                continue
+            if valid_id not in valid_ids:
+                valid_ids.append(valid_id)
+
+        if not valid_ids:
+            return []
+
+        rows = db.session.execute(
+            text(f"SELECT {', '.join(fields)} FROM users WHERE id = ANY(CAST(:ids AS uuid[]))"),
+            {'ids': valid_ids}
+        ).mappings().all()
+
+        users = []
+        for row in rows:
+            user_data = {}
+            for field in fields:
+                value = row[field]
+                if field == 'id':
+                    value = str(value)
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                user_data[field] = value
+            users.append(user_data)
+        return users
+
     def update_user(self, user_id, user_data):
         # Convertir string a UUID si es necesario
         if isinstance(user_id, str):
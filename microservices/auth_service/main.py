@@ -16,48 +16,8 @@ except ImportError:
     import app
     from app import create_app
 
-# Importar utilidades
-try:
-    from utils import create_health_endpoint, setup_logger
-except ImportError:
-    # Si no encuentra utils, crear funciones básicas
-    import logging
-    import time
-    from datetime import datetime
-    from flask import jsonify
-
-
-    def setup_logger(name, level=logging.INFO):
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(formatter)
-        logger = logging.getLogger(name)
-        logger.setLevel(level)
-        logger.addHandler(handler)
-        return logger
-
-
-    def create_health_endpoint(app, service_name, db=None):
-        @app.route('/health', methods=['GET'])
-        def health_check():
-            health_data = {
-                'service': service_name,
-                'status': 'healthy',
-                'timestamp': datetime.utcnow().isoformat()
-            }
-
-            # Check database connection if provided
-            if db:
-                try:
-                    db.session.execute('SELECT 1')
-                    health_data['database'] = 'connected'
-                except Exception as e:
-                    health_data['database'] = 'disconnected'
-                    health_data['database_error'] = str(e)
-                    health_data['status'] = 'unhealthy'
-
-            status_code = 200 if health_data['status'] == 'healthy' else 503
-            return jsonify(health_data), status_code
+# Importar utilidades (utils compartido, copiado en la imagen junto al servicio)
+from utils import create_health_endpoint, setup_logger
 
 
 def fix_password_hashes(app, db):
@@ -63,6 +63,10 @@ def create_app():
     db.init_app(app)
     CORS(app)
 
+    # Compresión gzip/brotli de las respuestas según Accept-Encoding (utils compartido)
+    from utils.compression import init_compression
+    init_compression(app)
+
     # Inicializar servicio de inventario
     inventory_service = InventoryService()
     inventory_service.init_app(app)
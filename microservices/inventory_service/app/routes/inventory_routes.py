@@ -1,10 +1,11 @@
 # microservices/inventory_service/app/routes/inventory_routes.py
 from flask import Blueprint, request, jsonify, make_response
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import csv
 import io
 from ..models.medication import Medication, StockMovement, db
 from ..services.inventory_service import InventoryService
+from utils.etag import not_modified, table_etag
 
 inventory_bp = Blueprint('inventory', __name__)
 inventory_service = InventoryService()
@@ -48,6 +49,11 @@ def get_medications():
         include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
         category = request.args.get('category')
 
+        # days_to_expiration depende del día, por eso la fecha forma parte del ETag
+        etag = table_etag(db, Medication, include_inactive, category, date.today().isoformat())
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
         medications = inventory_service.get_all_medications(include_inactive)
 
         # Filtrar por categoría si se especifica
@@ -56,11 +62,13 @@ def get_medications():
 
         medications_data = [med.to_dict() for med in medications]
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'medications': medications_data,
             'total': len(medications_data)
-        }), 200
+        })
+        response.set_etag(etag)
+        return response, 200
 
     except Exception as e:
         return jsonify({
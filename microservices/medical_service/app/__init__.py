@@ -59,11 +59,16 @@ def create_app():
     os.makedirs(upload_folder, exist_ok=True)
     os.makedirs(os.path.join(upload_folder, 'pets'), exist_ok=True)
     os.makedirs(os.path.join(upload_folder, 'exams'), exist_ok=True)
+    os.makedirs(os.path.join(upload_folder, 'photos'), exist_ok=True)
 
     # Inicializar extensiones
     db.init_app(app)
     CORS(app)
 
+    # Compresión gzip/brotli de las respuestas según Accept-Encoding (utils compartido)
+    from utils.compression import init_compression
+    init_compression(app)
+
     # Registrar blueprints
     app.register_blueprint(medical_bp, url_prefix='/medical')
 
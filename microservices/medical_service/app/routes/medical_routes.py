@@ -1,10 +1,16 @@
 # microservices/medical_service/app/routes/medical_routes.py
-from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime
+import os
+from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from datetime import datetime, date
 from werkzeug.utils import secure_filename
 from ..models.pet import Pet, db
 from ..models.medical_record import MedicalRecord, Prescription, ExamResult
 from ..services.medical_service import MedicalService
+from utils.photo_pipeline import (
+    is_content_addressed, photo_not_modified, schedule_derivatives, select_variant, send_stored_photo
+)
+from utils.etag import not_modified, table_etag
+from werkzeug.exceptions import NotFound
 import uuid
 from sqlalchemy.exc import IntegrityError
 
@@ -192,6 +198,42 @@ def upload_pet_photo(pet_id):
         }), 500
 
 
+@medical_bp.route('/pets/<pet_id>/photo/<filename>', methods=['GET'])
+def get_pet_photo(pet_id, filename):
+    """Servir foto de mascota (original o miniatura con ?size=thumb|medium&format=webp|jpeg)"""
+    upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    filename = secure_filename(filename)
+
+    variant = select_variant(filename, request.args.get('size'), request.args.get('format'),
+                             request.headers.get('Accept', ''))
+
+    try:
+        if is_content_addressed(filename):
+            # El nombre es el hash del contenido: ETag fuerte y caché inmutable
+            cached_response = photo_not_modified(variant[0] if variant else filename)
+            if cached_response:
+                return cached_response
+            return send_stored_photo(upload_folder, filename, variant)
+
+        # Fotos anteriores al almacén por contenido: pets/<pet_id>/<nombre>
+        pets_dir = os.path.join(upload_folder, 'pets', secure_filename(pet_id))
+        if variant:
+            try:
+                response = send_from_directory(pets_dir, variant[0], mimetype=variant[1])
+                response.vary.add('Accept')
+                return response
+            except NotFound:
+                if os.path.exists(os.path.join(pets_dir, filename)):
+                    schedule_derivatives(os.path.join(pets_dir, filename))
+        return send_from_directory(pets_dir, filename)
+
+    except NotFound:
+        return jsonify({
+            'success': False,
+            'message': 'Foto no encontrada'
+        }), 404
+
+
 # =============== MEDICAL RECORDS ROUTES ===============
 
 @medical_bp.route('/records', methods=['POST'])
@@ -504,6 +546,48 @@ def get_medical_records_by_pet(pet_id):
         }), 500
 
 
+@medical_bp.route('/records/by-pets', methods=['GET', 'POST'])
+def get_medical_records_by_pets():
+    """Obtener historias clínicas de varias mascotas (o de todas) en una sola consulta"""
+    try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 100, type=int), 1), 1000)
+
+        # Lista de mascotas: JSON {'pet_ids': [...]} en POST o ?pet_ids=a,b,c en GET
+        pet_ids = None
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            pet_ids = data.get('pet_ids')
+        elif request.args.get('pet_ids'):
+            pet_ids = [pet_id for pet_id in request.args.get('pet_ids').split(',') if pet_id.strip()]
+
+        try:
+            records_data, total = medical_service.get_medical_records_for_pets(pet_ids, page, per_page)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'IDs de mascota inválidos'
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'medical_records': records_data,
+            'total': total,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
 # =============== PRESCRIPTIONS ROUTES ===============
 
 @medical_bp.route('/prescriptions', methods=['POST'])
@@ -536,6 +620,43 @@ def add_prescription():
         }), 500
 
 
+@medical_bp.route('/prescriptions/by-records', methods=['GET', 'POST'])
+def get_prescriptions_by_records():
+    """Obtener prescripciones de varias historias clínicas en una sola consulta"""
+    try:
+        # JSON {'record_ids': [...]} en POST o ?record_ids=a,b,c en GET
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            record_ids = data.get('record_ids') or []
+        else:
+            record_ids = [record_id for record_id in request.args.get('record_ids', '').split(',') if record_id.strip()]
+
+        if len(record_ids) > 1000:
+            return jsonify({
+                'success': False,
+                'message': 'Máximo 1000 historias clínicas por consulta'
+            }), 400
+
+        try:
+            prescriptions = medical_service.get_prescriptions_by_records(record_ids)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'IDs de historia clínica inválidos'
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'prescriptions': prescriptions
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
 # =============== EXAM RESULTS ROUTES ===============
 
 @medical_bp.route('/exam-results', methods=['POST'])
@@ -610,6 +731,11 @@ def get_all_pets():
     """Obtener todas las mascotas (para admin)"""
     try:
         # Aquí podrías agregar verificación de permisos de admin
+        # La edad depende del día, por eso la fecha forma parte del ETag
+        etag = table_etag(db, Pet, date.today().isoformat())
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
         pets = Pet.query.filter_by(is_active=True).order_by(Pet.name).all()
 
         pets_data = []
@@ -618,11 +744,13 @@ def get_all_pets():
             pet_data['age'] = pet.get_age()
             pets_data.append(pet_data)
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'pets': pets_data,
             'total': len(pets_data)
-        }), 200
+        })
+        response.set_etag(etag)
+        return response, 200
 
     except Exception as e:
         return jsonify({
@@ -1483,17 +1611,29 @@ def get_medical_dashboard_summary():
 
 @medical_bp.route('/veterinarian/<vet_id>/patients', methods=['GET'])
 def get_veterinarian_patients(vet_id):
-    """Obtener todos los pacientes de un veterinario"""
+    """Obtener todos los pacientes de un veterinario (mascotas con historias clínicas suyas)"""
     try:
-        # Obtener pacientes que han tenido citas con este veterinario
-        # Necesitarás hacer una consulta JOIN con appointments o usar el appointment service
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+
+        try:
+            patients, total = medical_service.get_veterinarian_patients(vet_id, page, per_page)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'ID de veterinario inválido'
+            }), 400
 
-        # Por ahora, devolver respuesta válida vacía para evitar 404
         return jsonify({
             'success': True,
-            'patients': [],
-            'total': 0,
-            'message': 'Endpoint en desarrollo - usar appointment service para relación veterinario-pacientes'
+            'patients': patients,
+            'total': total,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
+            }
         }), 200
 
     except Exception as e:
@@ -1510,12 +1650,18 @@ def get_veterinarian_recent_patients(vet_id):
     try:
         limit = int(request.args.get('limit', 6))
 
-        # Por ahora, devolver respuesta válida vacía para evitar 404
+        try:
+            patients, total = medical_service.get_veterinarian_patients(vet_id, 1, limit)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'ID de veterinario inválido'
+            }), 400
+
         return jsonify({
             'success': True,
-            'patients': [],
-            'total': 0,
-            'message': 'Endpoint en desarrollo - usar appointment service para relación veterinario-pacientes'
+            'patients': patients,
+            'total': total
         }), 200
 
     except Exception as e:
@@ -7,6 +7,7 @@ from flask import current_app
 import requests
 from ..models.pet import Pet, db
 from ..models.medical_record import MedicalRecord, Prescription, ExamResult
+from utils.photo_pipeline import store_photo
 
 
 class MedicalService:
@@ -70,31 +71,23 @@ class MedicalService:
         return Pet.search_pets(search_term)
 
     def upload_pet_photo(self, pet_id, file):
-        """Subir foto de mascota"""
+        """Subir foto de mascota (guardada por hash de contenido, deduplicada)"""
         if not file or not self.allowed_file(file.filename):
             return None
 
-        # Crear directorio si no existe
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        pet_folder = os.path.join(upload_folder, 'pets', pet_id)
-        os.makedirs(pet_folder, exist_ok=True)
-
-        # Generar nombre único para el archivo
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(pet_folder, unique_filename)
+        pet = Pet.query.get(pet_id)
+        if not pet:
+            return None
 
-        # Guardar archivo
-        file.save(filepath)
+        # Guardar archivo: el nombre es el SHA-256 del contenido y las miniaturas
+        # (thumb/medium, WebP y JPEG) se generan en segundo plano
+        upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+        filename, _ = store_photo(file, upload_folder)
 
         # Actualizar URL en la base de datos
-        pet = Pet.query.get(pet_id)
-        if pet:
-            pet.photo_url = f"/uploads/pets/{pet_id}/{unique_filename}"
-            db.session.commit()
-            return pet.photo_url
-
-        return None
+        pet.photo_url = f"/uploads/pets/{pet_id}/{filename}"
+        db.session.commit()
+        return pet.photo_url
 
     # =============== MEDICAL RECORDS ===============
 
@@ -226,6 +219,69 @@ class MedicalService:
         """Obtener historias clínicas de una mascota"""
         return MedicalRecord.get_by_pet(pet_id)
 
+    def get_medical_records_for_pets(self, pet_ids=None, page=1, per_page=100):
+        """Obtener historias clínicas de varias mascotas (o de todas) en una sola consulta paginada"""
+        query = db.session.query(MedicalRecord, Pet).join(Pet, Pet.id == MedicalRecord.pet_id)
+
+        if pet_ids is not None:
+            pet_ids = [uuid.UUID(str(pet_id)) for pet_id in pet_ids]
+            query = query.filter(MedicalRecord.pet_id.in_(pet_ids))
+        else:
+            query = query.filter(Pet.is_active == True)
+
+        total = query.count()
+        rows = query.order_by(MedicalRecord.created_at.desc(), MedicalRecord.id) \
+            .offset((page - 1) * per_page).limit(per_page).all()
+
+        records_data = []
+        for record, pet in rows:
+            record_data = record.to_dict()
+            record_data.update({
+                'pet_name': pet.name,
+                'pet_species': pet.species,
+                'pet_breed': pet.breed or '',
+                'owner_id': str(pet.owner_id)
+            })
+            records_data.append(record_data)
+
+        return records_data, total
+
+    def get_veterinarian_patients(self, vet_id, page=1, per_page=50):
+        """Obtener los pacientes de un veterinario con número de visitas y última visita (consulta agrupada)"""
+        vet_id = uuid.UUID(str(vet_id))
+
+        visits = db.session.query(
+            MedicalRecord.pet_id.label('pet_id'),
+            db.func.count(MedicalRecord.id).label('visits_count'),
+            db.func.max(MedicalRecord.created_at).label('last_visit')
+        ).filter(MedicalRecord.veterinarian_id == vet_id).group_by(MedicalRecord.pet_id).subquery()
+
+        query = db.session.query(
+            Pet,
+            visits.c.visits_count,
+            visits.c.last_visit,
+            db.func.count().over().label('total_count')
+        ).join(visits, Pet.id == visits.c.pet_id).filter(Pet.is_active == True)
+
+        rows = query.order_by(visits.c.last_visit.desc(), Pet.id) \
+            .offset((page - 1) * per_page).limit(per_page).all()
+
+        if rows:
+            total = rows[0].total_count
+        else:
+            # Página fuera de rango: contar aparte solo en este caso
+            total = query.with_entities(Pet.id).count() if page > 1 else 0
+
+        patients = []
+        for pet, visits_count, last_visit, _ in rows:
+            patient = pet.to_dict()
+            patient['age'] = pet.get_age()
+            patient['visits_count'] = visits_count
+            patient['last_visit'] = last_visit.date().isoformat() if last_visit else None
+            patients.append(patient)
+
+        return patients, total
+
     def update_medical_record(self, record_id, record_data):
         """Actualizar historia clínica"""
         medical_record = MedicalRecord.query.get(record_id)
@@ -346,6 +402,23 @@ class MedicalService:
 
         return f"/uploads/exams/{medical_record_id}/{unique_filename}"
 
+    def get_prescriptions_by_records(self, record_ids):
+        """
+        Obtener las prescripciones de varias historias clínicas con una sola consulta
+        (idx_prescriptions_record), agrupadas por medical_record_id
+        """
+        record_ids = list(dict.fromkeys(uuid.UUID(str(record_id)) for record_id in record_ids))
+
+        prescriptions = {str(record_id): [] for record_id in record_ids}
+        if not record_ids:
+            return prescriptions
+
+        for prescription in Prescription.query.filter(Prescription.medical_record_id.in_(record_ids)) \
+                .order_by(Prescription.medical_record_id).all():
+            prescriptions[str(prescription.medical_record_id)].append(prescription.to_dict())
+
+        return prescriptions
+
     # =============== REPORTS ===============
 
     def get_medical_summary(self, pet_id):
@@ -73,6 +73,15 @@ def create_app():
     db.init_app(app)
     CORS(app)
 
+    # Compresión gzip/brotli de las respuestas según Accept-Encoding (utils compartido)
+    from utils.compression import init_compression
+    init_compression(app)
+
+    # Publicar los cambios confirmados en el canal de eventos del frontend (SSE)
+    from utils.events import publish_on_commit
+    from .models.notification import Notification
+    publish_on_commit(app, db, Notification, service='notification_service')
+
     # Inicializar Flask-Mail
     try:
         mail = Mail(app)
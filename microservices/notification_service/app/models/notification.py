@@ -27,6 +27,10 @@ class Notification(db.Model):
     email_sent_at = db.Column(db.DateTime)
     sms_sent_at = db.Column(db.DateTime)
 
+    def to_event(self):
+        """Evento en tiempo real para el destinatario de la notificación"""
+        return 'notifications', {'id': str(self.id), 'type': self.type, 'is_read': self.is_read}, [self.user_id], []
+
     def to_dict(self):
         return {
             'id': str(self.id),
@@ -28,6 +28,10 @@ class Config:
     MEDICAL_SERVICE_URL = os.environ.get('MEDICAL_SERVICE_URL') or 'http://localhost:5004'
     INVENTORY_SERVICE_URL = os.environ.get('INVENTORY_SERVICE_URL') or 'http://localhost:5005'
 
+    # Eventos en tiempo real hacia el frontend (Redis pub/sub, canal compartido)
+    EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL')  # por defecto REDIS_URL
+
     # Flask Configuration
     FLASK_ENV = os.environ.get('FLASK_ENV') or 'production'
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() in ['true', '1', 'yes']
@@ -50,6 +54,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    EVENTS_ENABLED = False
 
 
 config = {
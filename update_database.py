@@ -136,9 +136,176 @@ def update_appointments_table():
         return False
 
 
+def update_invoices_indexes():
+    """Índices de la facturación: listado paginado por (fecha de orden, id) y filtro por cliente"""
+    try:
+        conn = psycopg2.connect(
+            host=os.environ.get('POSTGRES_HOST', 'localhost'),
+            port=os.environ.get('POSTGRES_PORT', '5432'),
+            database=os.environ.get('POSTGRES_DB', 'veterinary-system'),
+            user=os.environ.get('POSTGRES_USER', 'postgres'),
+            password=os.environ.get('POSTGRES_PASSWORD', 'bocato0731')
+        )
+        # CONCURRENTLY no bloquea las escrituras, pero no puede ir dentro de una transacción
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        print("\n📈 Creando índices de facturación...")
+        indices = [
+            # Misma expresión que INVOICE_SORT_KEY en frontend/app/services/invoice_export.py
+            ("idx_invoices_sort_key_id",
+             "invoices((COALESCE(invoice_date, created_at, TIMESTAMP 'epoch')), id)"),
+            ("idx_invoices_client", "invoices(client_id)")
+        ]
+
+        for idx_name, idx_definition in indices:
+            try:
+                cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {idx_name} ON {idx_definition};")
+                print(f"  ✅ Índice {idx_name} creado")
+            except Exception as e:
+                print(f"  ⚠️ Error creando índice {idx_name}: {e}")
+
+        # Sustituido por idx_invoices_sort_key_id (facturas sin invoice_date)
+        cur.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_invoices_date_id;")
+
+        cur.close()
+        conn.close()
+        return True
+
+    except psycopg2.Error as e:
+        print(f"❌ Error de PostgreSQL: {e}")
+        return False
+
+
+def create_invoice_idempotency_table():
+    """Claves de idempotencia de la creación de facturas (un reintento devuelve la misma factura)"""
+    try:
+        conn = psycopg2.connect(
+            host=os.environ.get('POSTGRES_HOST', 'localhost'),
+            port=os.environ.get('POSTGRES_PORT', '5432'),
+            database=os.environ.get('POSTGRES_DB', 'veterinary-system'),
+            user=os.environ.get('POSTGRES_USER', 'postgres'),
+            password=os.environ.get('POSTGRES_PASSWORD', 'bocato0731')
+        )
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        print("\n🔑 Creando tabla invoice_idempotency_keys...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS invoice_idempotency_keys (
+                idempotency_key VARCHAR(255) PRIMARY KEY,
+                request_hash CHAR(64) NOT NULL,
+                invoice_id UUID NOT NULL,
+                response JSONB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        print("  ✅ Tabla invoice_idempotency_keys lista")
+
+        cur.close()
+        conn.close()
+        return True
+
+    except psycopg2.Error as e:
+        print(f"❌ Error de PostgreSQL: {e}")
+        return False
+
+
+def create_billing_rollup_tables():
+    """
+    Rollups de facturación (por día, por mes y por medicamento/mes) que leen las estadísticas.
+    Se recalculan desde invoices/invoice_items; después la creación de facturas los mantiene.
+    """
+    try:
+        conn = psycopg2.connect(
+            host=os.environ.get('POSTGRES_HOST', 'localhost'),
+            port=os.environ.get('POSTGRES_PORT', '5432'),
+            database=os.environ.get('POSTGRES_DB', 'veterinary-system'),
+            user=os.environ.get('POSTGRES_USER', 'postgres'),
+            password=os.environ.get('POSTGRES_PASSWORD', 'bocato0731')
+        )
+        cur = conn.cursor()
+
+        print("\n📊 Creando tablas de rollups de facturación...")
+        for table, period in (("billing_daily_rollups", "day"), ("billing_monthly_rollups", "month")):
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {period} DATE PRIMARY KEY,
+                    invoice_count INTEGER NOT NULL DEFAULT 0,
+                    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    subtotal DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    tax DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    item_count INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS billing_medication_rollups (
+                month DATE NOT NULL,
+                medication_key VARCHAR(300) NOT NULL,
+                medication_id UUID,
+                item_name VARCHAR(255) NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, medication_key)
+            );
+        """)
+
+        # Recalcular todo en una transacción: las facturas nuevas esperan al bloqueo y
+        # se suman después, sin contarse dos veces. Las facturas antiguas sin invoice_date
+        # cuentan en su created_at, como en el listado (misma expresión que INVOICE_SORT_KEY)
+        print("  🔄 Recalculando rollups desde las facturas existentes...")
+        cur.execute("""
+            LOCK TABLE billing_daily_rollups, billing_monthly_rollups, billing_medication_rollups
+            IN EXCLUSIVE MODE;
+            TRUNCATE billing_daily_rollups, billing_monthly_rollups, billing_medication_rollups;
+
+            WITH items AS (
+                SELECT invoice_id, SUM(quantity) AS item_count
+                FROM invoice_items
+                GROUP BY invoice_id
+            )
+            INSERT INTO billing_daily_rollups (day, invoice_count, revenue, subtotal, tax, item_count)
+            SELECT COALESCE(i.invoice_date, i.created_at, TIMESTAMP 'epoch')::date, COUNT(*),
+                   SUM(COALESCE(i.total_amount, 0)),
+                   SUM(COALESCE(i.subtotal, 0)), SUM(COALESCE(i.tax_amount, 0)),
+                   COALESCE(SUM(items.item_count), 0)
+            FROM invoices i
+            LEFT JOIN items ON items.invoice_id = i.id
+            GROUP BY 1;
+
+            INSERT INTO billing_monthly_rollups (month, invoice_count, revenue, subtotal, tax, item_count)
+            SELECT date_trunc('month', day)::date, SUM(invoice_count), SUM(revenue),
+                   SUM(subtotal), SUM(tax), SUM(item_count)
+            FROM billing_daily_rollups
+            GROUP BY date_trunc('month', day)::date;
+
+            INSERT INTO billing_medication_rollups (month, medication_key, medication_id, item_name, quantity, revenue)
+            SELECT date_trunc('month', COALESCE(i.invoice_date, i.created_at, TIMESTAMP 'epoch'))::date,
+                   COALESCE(it.medication_id::text, 'name:' || lower(trim(it.item_name))),
+                   it.medication_id, MAX(it.item_name), SUM(it.quantity), SUM(it.total_price)
+            FROM invoice_items it
+            JOIN invoices i ON i.id = it.invoice_id
+            GROUP BY 1, 2, 3;
+        """)
+        conn.commit()
+        print("  ✅ Rollups de facturación listos")
+
+        cur.close()
+        conn.close()
+        return True
+
+    except psycopg2.Error as e:
+        print(f"❌ Error de PostgreSQL: {e}")
+        return False
+
+
 if __name__ == "__main__":
     print("🚀 Iniciando actualización de la base de datos...")
     success = update_appointments_table()
+    success = update_invoices_indexes() and success
+    success = create_invoice_idempotency_table() and success
+    success = create_billing_rollup_tables() and success
 
     if success:
         print("\n✅ La base de datos ha sido actualizada correctamente.")
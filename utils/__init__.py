@@ -1,5 +1,8 @@
 # utils/__init__.py
 from .logger import setup_logger, log_request
 from .health_check import create_health_endpoint
+from .compression import CompressionMiddleware, init_compression
+from .etag import table_etag, not_modified
 
-__all__ = ['setup_logger', 'log_request', 'create_health_endpoint']
\ No newline at end of file
+__all__ = ['setup_logger', 'log_request', 'create_health_endpoint', 'CompressionMiddleware', 'init_compression',
+           'table_etag', 'not_modified']
\ No newline at end of file
@@ -0,0 +1,152 @@
+# utils/compression.py - Compresión gzip/brotli de respuestas para todos los servicios
+import gzip
+
+try:
+    import brotli
+except ImportError:  # sin brotli se comprime solo con gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/'
+)
+
+
+def parse_accept_encoding(header):
+    """Codificaciones aceptadas con su calidad: 'br;q=1.0, gzip' -> {'br': 1.0, 'gzip': 1.0}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token] = quality
+    return accepted
+
+
+def weak_etag(value):
+    """
+    ETag débil para un cuerpo comprimido: '"abc"' -> 'W/"abc"'. Los bytes gzip/br no son los
+    del ETag fuerte original; el mismo valor débil sigue validando con If-None-Match
+    (comparación débil) en cualquier codificación.
+    """
+    value = value.strip()
+    return value if value.startswith('W/') else f'W/{value}'
+
+
+class CompressionMiddleware:
+    """
+    Middleware WSGI que comprime las respuestas según Accept-Encoding (brotli si el cliente
+    lo acepta y está instalado, si no gzip).
+
+    Solo se comprimen respuestas completas (con Content-Length) de tipos de texto/JSON que
+    superen min_size; las respuestas en streaming, las ya codificadas (assets precomprimidos)
+    y las marcadas con 'Cache-Control: no-transform' pasan sin tocar. Al comprimir, el ETag
+    de la respuesta pasa a ser débil.
+    """
+
+    def __init__(self, app, min_size=1024, gzip_level=6, brotli_quality=4, mimetypes=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.mimetypes = mimetypes
+
+    def _negotiate(self, header):
+        accepted = parse_accept_encoding(header)
+        wildcard = accepted.get('*', 0.0)
+        candidates = (['br'] if brotli is not None else []) + ['gzip']
+        best, best_quality = None, 0.0
+        for encoding in candidates:
+            quality = accepted.get(encoding, wildcard)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+
+        values = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in values:
+            return False
+        if 'no-transform' in values.get('cache-control', '').lower():
+            return False
+        content_type = values.get('content-type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(self.mimetypes):
+            return False
+        try:
+            # Sin Content-Length es una respuesta en streaming (SSE, exportaciones): no tocarla
+            return int(values['content-length']) >= self.min_size
+        except (KeyError, ValueError):
+            return False
+
+    def compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def __call__(self, environ, start_response):
+        encoding = self._negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            # Una app que llama a start_response al iterar (tarde) no se comprime
+            if captured.get('returned') or not self._should_compress(status, headers):
+                captured['passthrough'] = True
+                return start_response(status, headers, exc_info)
+            captured.update(status=status, headers=headers, exc_info=exc_info, passthrough=False)
+            return captured.setdefault('buffer', []).append
+
+        app_iter = self.app(environ, capture_start_response)
+        if captured.get('passthrough', True):
+            captured['returned'] = True
+            return app_iter
+
+        try:
+            body = b''.join(captured.get('buffer', [])) + b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+        compressed = self.compress(body, encoding)
+        headers = [(name, weak_etag(value) if name.lower() == 'etag' else value)
+                   for name, value in captured['headers']
+                   if name.lower() not in ('content-length', 'vary')]
+        vary = [value for name, value in captured['headers'] if name.lower() == 'vary']
+        if 'accept-encoding' not in ', '.join(vary).lower():
+            vary.append('Accept-Encoding')
+        headers.extend([
+            ('Content-Encoding', encoding),
+            ('Content-Length', str(len(compressed))),
+            ('Vary', ', '.join(vary))
+        ])
+        start_response(captured['status'], headers, captured['exc_info'])
+        return [compressed]
+
+
+def init_compression(app):
+    """Envolver app.wsgi_app con la compresión (COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, ...)"""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return app
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', 1024),
+        gzip_level=app.config.get('COMPRESSION_GZIP_LEVEL', 6),
+        brotli_quality=app.config.get('COMPRESSION_BROTLI_QUALITY', 4)
+    )
+    return app
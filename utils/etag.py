@@ -0,0 +1,19 @@
+# utils/etag.py - ETags de listados y respuestas 304 para todos los servicios
+import hashlib
+
+from flask import make_response
+
+
+def table_etag(db, model, *variant):
+    """ETag de un listado: versión de la tabla (filas + último updated_at) más los parámetros de la consulta"""
+    total, last_updated = db.session.query(db.func.count(), db.func.max(model.updated_at)).select_from(model).one()
+    version = [model.__tablename__, str(total), last_updated.isoformat() if last_updated else '']
+    version.extend(str(value) for value in variant)
+    return hashlib.sha1(':'.join(version).encode()).hexdigest()
+
+
+def not_modified(etag):
+    """Respuesta 304: el cliente ya tiene la versión actual del listado"""
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
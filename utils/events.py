@@ -0,0 +1,92 @@
+# utils/events.py - Eventos en tiempo real entre servicios (Redis pub/sub) para el frontend
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pub/sub de Redis no depende de la base de datos (/0, /1, ...): todos los servicios
+# publican en el mismo canal aunque cada uno use su propia REDIS_URL
+EVENTS_CHANNEL = 'veterinary:events'
+RETRY_AFTER_FAILURE = 30
+
+_clients = {}
+_down_until = {}
+_lock = threading.Lock()
+
+
+def _redis_client(url):
+    client = _clients.get(url)
+    if client is None:
+        import redis
+
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+                _clients[url] = client
+    return client
+
+
+def publish_event(redis_url, event_type, data=None, users=None, roles=None, service=None, channel=EVENTS_CHANNEL):
+    """
+    Publicar un evento para los usuarios (ids) y/o roles indicados; sin destinatarios va a todos.
+    Nunca lanza: si Redis no responde se deja de intentar durante RETRY_AFTER_FAILURE segundos
+    para no ralentizar las peticiones.
+    """
+    if not redis_url or _down_until.get(redis_url, 0) > time.time():
+        return False
+
+    message = {
+        'type': event_type,
+        'data': data or {},
+        'users': [str(user) for user in (users or []) if user],
+        'roles': list(roles or []),
+        'service': service,
+        'timestamp': time.time()
+    }
+    try:
+        _redis_client(redis_url).publish(channel, json.dumps(message, default=str))
+        return True
+    except Exception as e:
+        _down_until[redis_url] = time.time() + RETRY_AFTER_FAILURE
+        logger.warning(f"No se pudo publicar el evento {event_type}: {e}")
+        return False
+
+
+def publish_on_commit(app, db, model, service=None):
+    """
+    Publicar model.to_event() por cada instancia insertada o modificada, cuando la
+    transacción se confirma (un rollback descarta los eventos pendientes).
+    to_event() devuelve (tipo, datos, usuarios, roles) o None para no publicar.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session, object_session
+
+    if not app.config.get('EVENTS_ENABLED', True):
+        return
+    redis_url = app.config.get('EVENTS_REDIS_URL') or app.config.get('REDIS_URL')
+    service = service or app.name
+
+    def remember(mapper, connection, target):
+        session = object_session(target)
+        built = target.to_event()
+        if session is not None and built is not None:
+            session.info.setdefault('pending_events', []).append(built)
+
+    event.listen(model, 'after_insert', remember)
+    event.listen(model, 'after_update', remember)
+
+    if getattr(db, '_events_commit_hooks', False):
+        return
+    db._events_commit_hooks = True
+
+    @event.listens_for(Session, 'after_commit')
+    def publish_pending(session):
+        for event_type, data, users, roles in session.info.pop('pending_events', []):
+            publish_event(redis_url, event_type, data, users, roles, service=service)
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def discard_pending(session, previous_transaction):
+        session.info.pop('pending_events', None)
@@ -0,0 +1,270 @@
+# utils/photo_pipeline.py - Fotos de mascotas por hash de contenido y sus miniaturas (frontend y Medical Service)
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import make_response, request, send_from_directory
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor (px) de cada derivado; el original se conserva sin metadatos (strip_metadata)
+DERIVATIVE_SIZES = {
+    'thumb': 160,
+    'medium': 640
+}
+
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True})
+}
+
+# Fotos guardadas por hash de contenido: '<sha256>.<ext>' y sus derivados '<sha256>.<tamaño>.<formato>'
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9.]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PENDING_VARIANT_MAX_AGE = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='photo-pipeline')
+    return _executor
+
+
+def derivative_filename(filename, size, fmt):
+    """Nombre del derivado: '<original sin extensión>.<tamaño>.<formato>'"""
+    stem = os.path.splitext(filename)[0]
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return f"{stem}.{size}.{extension}"
+
+
+def generate_derivatives(original_path):
+    """
+    Generar las miniaturas (thumb/medium) en WebP y JPEG junto al original.
+    La orientación EXIF se aplica a los píxeles y los metadatos (EXIF, GPS) no se copian.
+    """
+    from PIL import Image, ImageOps
+
+    directory, filename = os.path.split(original_path)
+    created = []
+
+    with Image.open(original_path) as source:
+        source.seek(0)  # GIF animado: primer fotograma
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for size, max_side in DERIVATIVE_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            for fmt, (pil_format, _, options) in DERIVATIVE_FORMATS.items():
+                output = resized
+                if pil_format == 'JPEG' and has_alpha:
+                    # JPEG no admite transparencia: fondo blanco
+                    output = Image.new('RGB', resized.size, (255, 255, 255))
+                    output.paste(resized, mask=resized.getchannel('A'))
+
+                target = os.path.join(directory, derivative_filename(filename, size, fmt))
+                temp_path = f"{target}.tmp"
+                output.save(temp_path, pil_format, **options)
+                os.replace(temp_path, target)  # nunca se sirve un derivado a medio escribir
+                created.append(target)
+
+    return created
+
+
+def schedule_derivatives(original_path):
+    """
+    Encolar la generación de derivados fuera del hilo de la petición.
+    Devuelve el Future, o None si ya hay una generación pendiente para ese archivo.
+    """
+    with _executor_lock:
+        if original_path in _pending:
+            return None
+        _pending.add(original_path)
+
+    def run():
+        try:
+            created = generate_derivatives(original_path)
+            logger.info(f"Derivados generados para {os.path.basename(original_path)}: {len(created)}")
+        except Exception as e:
+            logger.warning(f"No se pudieron generar derivados de {original_path}: {e}")
+        finally:
+            with _executor_lock:
+                _pending.discard(original_path)
+
+    return _get_executor().submit(run)
+
+
+def select_variant(filename, size, fmt=None, accept=''):
+    """
+    Elegir el archivo a servir para ?size=thumb|medium (&format=webp|jpeg).
+    Sin formato explícito se usa WebP si el navegador lo acepta.
+    Devuelve (nombre_derivado, mimetype) o None si no se pidió un derivado válido.
+    """
+    if size not in DERIVATIVE_SIZES:
+        return None
+    if fmt not in DERIVATIVE_FORMATS:
+        fmt = 'webp' if 'image/webp' in (accept or '') else 'jpeg'
+    return derivative_filename(filename, size, fmt), DERIVATIVE_FORMATS[fmt][1]
+
+
+# =============== ALMACÉN POR CONTENIDO ===============
+
+# Formatos cuyo original puede llevar EXIF/GPS y se reescriben sin metadatos al guardarlos
+METADATA_FORMATS = {'JPEG': 'JPEG', 'MPO': 'JPEG', 'PNG': 'PNG', 'WEBP': 'WEBP'}
+
+def is_content_addressed(filename):
+    return bool(CONTENT_ADDRESSED_NAME.match(filename))
+
+
+def photo_directory(uploads_dir, filename):
+    """Directorio de una foto por contenido: <uploads>/photos/<2 primeros caracteres del hash>"""
+    return os.path.join(uploads_dir, 'photos', filename[:2])
+
+
+def strip_metadata(path):
+    """
+    Reescribir la imagen sin EXIF (ubicación GPS, cámara, fecha) ni XMP. La orientación
+    EXIF se aplica antes a los píxeles; el perfil de color se conserva. Un JPEG sin
+    rotación se reescribe con sus propias tablas de cuantización (quality='keep').
+    Devuelve True si el archivo se reescribió.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as source:
+        pil_format = METADATA_FORMATS.get(source.format)
+        if pil_format is None:
+            return False
+        exif = source.getexif()
+        if not exif and 'xmp' not in source.info and 'XML:com.adobe.xmp' not in source.info:
+            return False
+
+        options = {}
+        if source.info.get('icc_profile'):
+            options['icc_profile'] = source.info['icc_profile']
+
+        if exif.get(0x0112, 1) != 1:  # Orientation
+            image = ImageOps.exif_transpose(source)
+            if pil_format == 'JPEG':
+                options['quality'] = 95
+        else:
+            image = source
+            if pil_format == 'JPEG':
+                options['quality'] = 'keep'
+        if pil_format == 'WEBP' and source.info.get('lossless'):
+            options['lossless'] = True
+
+        temp_path = f"{path}.clean"
+        try:
+            image.save(temp_path, pil_format, **options)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    os.replace(temp_path, path)
+    return True
+
+
+def store_photo(file, uploads_dir):
+    """
+    Guardar una foto subida con el hash SHA-256 de su contenido como nombre.
+    La foto se guarda sin metadatos (strip_metadata) y el hash es el del archivo ya limpio,
+    así que la misma imagen subida varias veces (o para varias mascotas) ocupa un solo archivo.
+    Devuelve (nombre, ruta); los derivados se generan en segundo plano si la foto es nueva.
+    """
+    extension = os.path.splitext(file.filename or '')[1].lower().lstrip('.')
+    extension = 'jpg' if extension == 'jpeg' else (extension or 'jpg')
+
+    photos_dir = os.path.join(uploads_dir, 'photos')
+    os.makedirs(photos_dir, exist_ok=True)
+
+    file.stream.seek(0)
+    with tempfile.NamedTemporaryFile(dir=photos_dir, suffix='.tmp', delete=False) as temp_file:
+        for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+            temp_file.write(chunk)
+    file.stream.seek(0)
+
+    try:
+        strip_metadata(temp_file.name)
+    except Exception as e:
+        logger.warning(f"No se pudieron quitar los metadatos de {file.filename}: {e}")
+
+    hasher = hashlib.sha256()
+    with open(temp_file.name, 'rb') as stored:
+        for chunk in iter(lambda: stored.read(64 * 1024), b''):
+            hasher.update(chunk)
+        os.fsync(stored.fileno())  # la subida responde cuando la foto ya está en disco
+
+    filename = f"{hasher.hexdigest()}.{extension}"
+    directory = photo_directory(uploads_dir, filename)
+    path = os.path.join(directory, filename)
+
+    if os.path.exists(path):
+        os.remove(temp_file.name)  # ya estaba guardada: deduplicar
+    else:
+        os.makedirs(directory, exist_ok=True)
+        os.replace(temp_file.name, path)
+        schedule_derivatives(path)
+
+    return filename, path
+
+
+def photo_not_modified(served_name):
+    """
+    304 sin tocar el disco: en el almacén por contenido el nombre servido es el ETag fuerte,
+    así que si el navegador ya lo tiene no hace falta comprobar nada más.
+    """
+    if not request.if_none_match.contains(served_name):
+        return None
+    response = make_response('', 304)
+    response.set_etag(served_name)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
+
+def send_stored_photo(uploads_dir, filename, variant=None):
+    """
+    Servir una foto del almacén por contenido (o su derivado) con ETag fuerte y caché inmutable.
+    Si el derivado aún no existe se sirve el original con caché corta y se encola su generación.
+    Lanza NotFound si la foto no está en este almacén.
+    """
+    from werkzeug.exceptions import NotFound
+
+    directory = photo_directory(uploads_dir, filename)
+
+    if variant:
+        variant_name, mimetype = variant
+        try:
+            response = send_from_directory(directory, variant_name, mimetype=mimetype,
+                                           etag=variant_name, max_age=IMMUTABLE_MAX_AGE)
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+            response.vary.add('Accept')
+            return response
+        except NotFound:
+            pass
+
+    response = send_from_directory(directory, filename, etag=filename,
+                                   max_age=PENDING_VARIANT_MAX_AGE if variant else IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    if variant:
+        schedule_derivatives(os.path.join(directory, filename))
+    else:
+        response.cache_control.immutable = True
+    return response